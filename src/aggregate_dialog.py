@@ -1,9 +1,5 @@
 import os
-import tempfile
 
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import \
-    FigureCanvasQTAgg as FigureCanvas
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 from PyQt5.QtWidgets import *
@@ -13,11 +9,44 @@ from qgis.PyQt import uic
 from qgis.utils import iface
 
 from . import processes
+from .chart import SummaryChart
+from .table_model import FeatureTableModel
 
 # uiファイルの定義と同じクラスを継承する
 
 class DialogMain(QDialog):
-    def __init__(
+    """
+    集計結果ウィンドウ
+
+    ウィンドウは1つだけ作成し、集計のたびにrunで表示内容を更新する。
+    集計結果はプロジェクトの集計結果レイヤ（processes.aggregate.update_result_layer）に反映し、
+    「この結果を保存」で現在の集計結果を別のレイヤとして残す。
+    """
+
+    # 集計タスクが完了した（中止・失敗した場合も含む）
+    aggregationFinished = pyqtSignal()
+
+    def __init__(self):
+        super().__init__()
+        self.ui = uic.loadUi(os.path.join(os.path.dirname(
+            __file__), 'aggregate_dialog.ui'), self)
+        self.iface = iface
+        self.aggregated_table_model = FeatureTableModel(self)
+        self.aggregatedLayerTable.setModel(self.aggregated_table_model)
+        self.chart = SummaryChart()
+        self.init_ui()
+
+        self.aggregated_layer = None
+        self.aggregated_summaries = None
+        self.aggregated_summary_layer = None
+        self.aggregated_summary_text = None
+        # 実行中の集計タスク（完了前にPythonのオブジェクトが破棄されないよう保持する）
+        self.tasks = set()
+        # 集計の実行回数（前回までの集計の完了通知を無視するために使用する）
+        self.run_count = 0
+        self.set_export_buttons_enabled(False)
+
+    def run(
             self,
             building_layer,
             tmp_storage_layer,
@@ -26,34 +55,101 @@ class DialogMain(QDialog):
             aggregate_layer,
             aggregate_name_field,
     ):
-        super().__init__()
-        self.ui = uic.loadUi(os.path.join(os.path.dirname(
-            __file__), 'aggregate_dialog.ui'), self)
-        self.iface = iface
+        """
+        集計ポリゴンの選択地物を集計し、完了したら結果を表示する
+
+        前回の集計が実行中の場合も中止せずに続けて実行し、結果は集計結果のキャッシュに追加する
+        （表示するのは最後に開始した集計の結果のみ）。
+
+        Returns:
+            None
+        """
         self.building_layer = building_layer
         self.tmp_storage_layer = tmp_storage_layer
         self.tmp_storage_name_fieldname = tmp_storage_name_fieldname
         self.tmp_storage_area_fieldname = tmp_storage_area_fieldname
         self.aggregate_layer = aggregate_layer
         self.aggregate_name_field = aggregate_name_field
-        self.init_ui()
 
-        # 集計ポリゴンの選択地物で一時ファイルを作成
-        selected_aggregate_feature = processes.aggregate.create_selected_aggregate_feature(
-                                                                self.aggregate_layer,
-                                                                self.aggregate_name_field
-                                                                )
-
-        # 集計処理実行
-        self.aggregated_layer = processes.aggregate.run_aggregate(
-                                                        self.aggregate_layer,
-                                                        selected_aggregate_feature,
-                                                        self.aggregate_name_field,
-                                                        self.tmp_storage_layer,
-                                                        self.tmp_storage_name_fieldname,
-                                                        self.tmp_storage_area_fieldname,
-                                                        self.building_layer
-                                                        )
+        self.run_count += 1
+        run_count = self.run_count
+        self.set_export_buttons_enabled(False)
+        self.aggregatedSummaryLabel.setText("集計中です...")
+
+        # 集計ポリゴンの選択地物を記録して選択を解除する
+        selected_ids = self.aggregate_layer.selectedFeatureIds()
+        self.aggregate_layer.removeSelection()
+
+        # 同じ選択範囲・入力データで集計済みの場合は、キャッシュした集計結果をすぐに表示する
+        result_key = processes.result_cache.result_key(
+            self.building_layer,
+            self.tmp_storage_layer,
+            self.tmp_storage_name_fieldname,
+            self.tmp_storage_area_fieldname,
+            self.aggregate_layer,
+            self.aggregate_name_field,
+            selected_ids,
+        )
+        cached_layer = processes.result_cache.results.get(result_key)
+        if cached_layer is not None:
+            self.show_result(cached_layer)
+            return
+
+        # 集計処理をバックグラウンドで実行し、完了したら結果を表示する
+        task = processes.task.AggregateTask(
+            self.building_layer,
+            self.tmp_storage_layer,
+            self.tmp_storage_name_fieldname,
+            self.tmp_storage_area_fieldname,
+            self.aggregate_layer,
+            self.aggregate_name_field,
+            selected_ids,
+            lambda aggregated_layer: self.store_result(task, aggregated_layer, result_key, run_count)
+        )
+        self.tasks.add(task)
+        QgsApplication.taskManager().addTask(task)
+
+    def store_result(self, task, aggregated_layer, result_key, run_count):
+        """
+        集計処理の完了後に集計結果をキャッシュに追加して表示する
+
+        Args:
+            task(AggregateTask): 完了した集計タスク
+            aggregated_layer(QgsVectorLayer): 集計結果のレイヤ（中止・失敗した場合はNone）
+            result_key(tuple): 集計結果のキャッシュのキー
+            run_count(int): 集計を開始したときの実行回数
+
+        Returns:
+            None
+        """
+        self.tasks.discard(task)
+        self.aggregationFinished.emit()
+        if aggregated_layer is not None:
+            processes.result_cache.results.put(result_key, aggregated_layer)
+        # 後から別の集計を開始した場合は、前回までの集計結果は表示しない
+        if run_count != self.run_count:
+            return
+        self.show_result(aggregated_layer)
+
+    def show_result(self, aggregated_layer):
+        """
+        集計処理の完了後に集計結果を表示する
+
+        集計結果はプロジェクトの集計結果レイヤの地物を置き換えて反映する。
+
+        Args:
+            aggregated_layer(QgsVectorLayer): 集計結果のレイヤ（中止・失敗した場合はNone）
+
+        Returns:
+            None
+        """
+        if aggregated_layer is None:
+            self.aggregatedSummaryLabel.setText("集計を中止しました。")
+            return
+        result_layer = processes.aggregate.update_result_layer(self.aggregate_layer, aggregated_layer)
+        if result_layer is not self.aggregated_layer:
+            result_layer.willBeDeleted.connect(lambda: self.result_layer_removed(result_layer))
+        self.aggregated_layer = result_layer
 
         # 集計レイヤで色塗り
         processes.aggregate.apply_symbology(self.aggregated_layer)
@@ -65,23 +161,87 @@ class DialogMain(QDialog):
 
         # ダイアログにテーブルを追加
         self.set_attributes_table(self.aggregated_layer)
-        self.aggregatedLayerTable.itemClicked.connect(lambda: self.zoom_selected_feature(self.aggregated_layer))
 
-        # ダイアログに集計サマリーを追加
-        self.aggregated_summary_layer, self.aggregated_summary_text = self.create_summary(self.aggregated_layer)
+        # ダイアログに集計サマリーを追加（複数シナリオの場合はシナリオを並べて表示）
+        self.aggregated_summaries, self.aggregated_summary_layer, self.aggregated_summary_text = self.create_summary(
+            self.aggregated_layer)
+
+        # ダイアログのグラフを更新
+        self.plot_graph(self.aggregated_summaries)
+
+        self.set_export_buttons_enabled(True)
+
+    def result_layer_removed(self, layer):
+        """
+        表示中の集計結果レイヤがプロジェクトから削除された場合に、表示をクリアする
 
-        # ダイアログにグラフを追加
-        self.graph_png_path = self.plot_graph(self.aggregated_summary_layer)
+        Args:
+            layer(QgsVectorLayer): 削除される集計結果レイヤ
+
+        Returns:
+            None
+        """
+        if layer is not self.aggregated_layer:
+            return
+        self.aggregated_layer = None
+        self.aggregated_table_model.clear()
+        self.set_export_buttons_enabled(False)
+        self.aggregatedSummaryLabel.setText("集計結果レイヤが削除されました。")
+        self.graphLabel.clear()
+
+    def keep_result(self):
+        """現在の集計結果を、次の集計で上書きされない別のレイヤとしてプロジェクトに残す"""
+        kept = processes.aggregate.keep_result_layer(self.aggregated_layer)
+        iface.messageBar().pushSuccess("災害廃棄物プラグイン", f"集計結果を「{kept.name()}」レイヤとして保存しました。")
+
+    def set_export_buttons_enabled(self, enabled):
+        self.summaryCsvExportButton.setEnabled(enabled)
+        self.aggregatedCsvExportButton.setEnabled(enabled)
+        self.printlayoutExportButton.setEnabled(enabled)
+        self.keepResultButton.setEnabled(enabled)
 
     def init_ui(self):
         # connect signals
         self.closeWindowButton.clicked.connect(lambda: self.hide())
 
-        self.summaryCsvExportButton.clicked.connect(lambda: processes.export_csv(self.aggregated_summary_layer))
-        self.aggregatedCsvExportButton.clicked.connect(lambda: processes.export_csv(self.aggregated_layer))
+        self.summaryCsvExportButton.clicked.connect(
+            lambda: processes.export_results([(self.aggregated_summary_layer, '集計サマリー')], self))
+        self.aggregatedCsvExportButton.clicked.connect(self.export_aggregated)
+        self.keepResultButton.clicked.connect(self.keep_result)
+        self.aggregatedLayerTable.clicked.connect(lambda: self.zoom_selected_feature(self.aggregated_layer))
 
+        # 印刷レイアウトを作成するときだけ、グラフをPNGファイルに書き出す
+        # （レイアウトが参照し続けるため、削除されるキャッシュではなくレイアウト用のフォルダに書き出す）
         self.printlayoutExportButton.clicked.connect(
-            lambda: processes.create_printlayout(self.aggregated_layer, self.aggregated_summary_text, self.graph_png_path))
+            lambda: processes.create_printlayout(
+                self.aggregated_layer, self.aggregated_summary_text,
+                self.chart.save_png(processes.printlayout_image_dir())))
+
+        # グラフは1つのラベルに画像として表示し、集計のたびに画像を差し替える
+        self.graphLabel = QLabel(self)
+        self.graphLabel.setAlignment(Qt.AlignCenter)
+        self.graphLabel.setFixedSize(380, 400)
+        self.ui.graphAreaFrame.layout().addWidget(self.graphLabel)
+
+    def export_aggregated(self):
+        """
+        集計結果をファイルに出力する
+
+        プロジェクトにほかの集計結果のレイヤがある場合は、まとめて出力するか確認する
+        """
+        layers = [self.aggregated_layer]
+        other_layers = [
+            layer for layer in processes.export.result_layers() if layer.id() != self.aggregated_layer.id()
+        ]
+        if other_layers and QMessageBox.Yes == QMessageBox.question(
+            self,
+            "確認",
+            f"プロジェクトにほかの集計結果が{len(other_layers)}件あります。まとめて出力しますか？",
+            QMessageBox.Yes,
+            QMessageBox.No,
+        ):
+            layers += other_layers
+        processes.export_results([(layer, layer.name()) for layer in layers], self)
 
     def set_attributes_table(self, aggregated_layer):
         """
@@ -93,32 +253,12 @@ class DialogMain(QDialog):
         Returns:
             None
         """
-        # ヘッダーの設定
-        aggregate_layer_fieldnames = aggregated_layer.fields().names()
-        self.aggregatedLayerTable.setColumnCount(len(aggregate_layer_fieldnames))
-        self.aggregatedLayerTable.setHorizontalHeaderLabels(aggregate_layer_fieldnames)
-
-        # 属性のセット
-        aggregated_layer_fieldnames = aggregated_layer.fields().names()
-        self.aggregatedLayerTable.setRowCount(0)
-        aggregated_layer_features = aggregated_layer.getFeatures()
-
-        for feature in aggregated_layer_features:
-            row = self.aggregatedLayerTable.rowCount()
-            self.aggregatedLayerTable.insertRow(row)
-
-            for i, filed_name in enumerate(aggregated_layer_fieldnames):
-                value = feature.attribute(filed_name)
-                item = QTableWidgetItem()
-                # intとfloatの場合は右揃え
-                if isinstance(value, (int, float)):
-                    item.setTextAlignment(QtCore.Qt.AlignRight | QtCore.Qt.AlignCenter)
-                # NULLの場合は空白としたいため分岐
-                if not value:
-                    item.setData(Qt.EditRole, value)
-                else:
-                    item.setData(Qt.EditRole, str(value))
-                self.aggregatedLayerTable.setItem(row, i, item)
+        # 属性を列ごとに保持するモデルをセット（表示中の行のみ描画される）
+        request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+        self.aggregated_table_model.set_features(
+            aggregated_layer.fields().names(),
+            aggregated_layer.getFeatures(request)
+        )
 
     def zoom_selected_feature(self, aggregated_layer):
         """
@@ -132,8 +272,10 @@ class DialogMain(QDialog):
         """
         # 選択した行の地物を選択状態にする
         selected_indexes = self.aggregatedLayerTable.selectedIndexes()
-        selected_name = self.aggregatedLayerTable.item(selected_indexes[0].row(), 1).text()
-        aggregated_layer.selectByExpression(f"\"{self.aggregate_name_field}\"='{selected_name}'")
+        if aggregated_layer is None or not selected_indexes:
+            return
+        fid = self.aggregated_table_model.fid(selected_indexes[0].row())
+        aggregated_layer.selectByIds([fid])
         current_scale = self.iface.mapCanvas().scale()
         self.iface.mapCanvas().zoomToSelected()
         self.iface.mapCanvas().zoomScale(current_scale)
@@ -142,186 +284,43 @@ class DialogMain(QDialog):
         """
         集計結果レイヤから集計サマリーを作成する
 
+        集計結果の値をそのまま合計するため、qgis:aggregateによる再集計は行わない。
+        複数シナリオの場合は、シナリオの比較を先頭に表示し、その後に先頭のシナリオの集計サマリーを表示する。
+
         Args:
             aggregated_layer(QgsVectorLayer): 集計レイヤ
 
         Returns:
-            refactor_aggregated_summary(QgsVectorLayer): 集計レイヤをひとつのポリゴンとして再集計したレイヤ
-            aggregated_summary(str): 集計サマリーの文字列
+            aggregated_summaries(list): (シナリオ名, 集計サマリー) のリスト
+            aggregated_summary_layer(QgsVectorLayer): シナリオごとに1行の集計サマリーのレイヤ（CSV出力用）
+            aggregated_summary_text(str): 集計サマリーの文字列
         """
-        aggregated_summary_layer = processes.processing.aggregate(aggregated_layer, [
-            {'aggregate': 'concatenate', 'delimiter': '、', 'input': f'"{self.aggregate_name_field}"', 'length': 0,
-             'name': self.aggregate_name_field, 'precision': 0, 'type': 10},
-            {'aggregate': 'sum', 'delimiter': ',', 'input': '"面積"', 'length': 0, 'name': '範囲内面積', 'precision': 1,
-             'type': 6},
-            {'aggregate': 'sum', 'delimiter': ',', 'input': '"建物棟数（木造）"', 'length': 0, 'name': '建物棟数（木造）',
-             'precision': 1, 'type': 4},
-            {'aggregate': 'sum', 'delimiter': ',', 'input': '"建物棟数（非木造）"', 'length': 0, 'name': '建物棟数（非木造）',
-             'precision': 1, 'type': 4},
-            {'aggregate': 'sum', 'delimiter': ',', 'input': '"建物棟数（合計）"', 'length': 0, 'name': '建物棟数（合計）',
-             'precision': 1, 'type': 4},
-            {'aggregate': 'sum', 'delimiter': ',', 'input': '"建物被害想定（木造：全壊）"', 'length': 0, 'name': '建物被害想定（木造：全壊）',
-             'precision': 1, 'type': 6},
-            {'aggregate': 'sum', 'delimiter': ',', 'input': '"建物被害想定（木造：半壊）"', 'length': 0, 'name': '建物被害想定（木造：半壊）',
-             'precision': 1, 'type': 6},
-            {'aggregate': 'sum', 'delimiter': ',', 'input': '"建物被害想定（木造：焼失）"', 'length': 0, 'name': '建物被害想定（木造：焼失）',
-             'precision': 1, 'type': 6},
-            {'aggregate': 'sum', 'delimiter': ',', 'input': '"建物被害想定（非木造：全壊）"', 'length': 0, 'name': '建物被害想定（非木造：全壊）',
-             'precision': 1, 'type': 6},
-            {'aggregate': 'sum', 'delimiter': ',', 'input': '"建物被害想定（非木造：半壊）"', 'length': 0, 'name': '建物被害想定（非木造：半壊）',
-             'precision': 1, 'type': 6},
-            {'aggregate': 'sum', 'delimiter': ',', 'input': '"建物被害想定（非木造：焼失）"', 'length': 0, 'name': '建物被害想定（非木造：焼失）',
-             'precision': 1, 'type': 6},
-            {'aggregate': 'sum', 'delimiter': ',', 'input': '"建物被害想定（合計：全壊）"', 'length': 0, 'name': '建物被害想定（合計：全壊）',
-             'precision': 1, 'type': 6},
-            {'aggregate': 'sum', 'delimiter': ',', 'input': '"建物被害想定（合計：半壊）"', 'length': 0, 'name': '建物被害想定（合計：半壊）',
-             'precision': 1, 'type': 6},
-            {'aggregate': 'sum', 'delimiter': ',', 'input': '"建物被害想定（合計：焼失）"', 'length': 0, 'name': '建物被害想定（合計：焼失）',
-             'precision': 1, 'type': 6},
-            {'aggregate': 'sum', 'delimiter': ',', 'input': '"災害廃棄物の発生量（可燃系）"', 'length': 0, 'name': '災害廃棄物の発生量（可燃系）',
-             'precision': 1, 'type': 6},
-            {'aggregate': 'sum', 'delimiter': ',', 'input': '"災害廃棄物の発生量（不燃系）"', 'length': 0, 'name': '災害廃棄物の発生量（不燃系）',
-             'precision': 1, 'type': 6},
-            {'aggregate': 'sum', 'delimiter': ',', 'input': '"災害廃棄物の発生量（合計）"', 'length': 0, 'name': '災害廃棄物の発生量（合計）',
-             'precision': 1, 'type': 6},
-            {'aggregate': 'sum', 'delimiter': ',', 'input': '"仮置場必要面積"', 'length': 0, 'name': '仮置場必要面積', 'precision': 1,
-             'type': 6},
-            {'aggregate': 'concatenate', 'delimiter': '、', 'input': ' coalesce("仮置場名称",\'none\')', 'length': 0,
-             'name': '仮置場名称', 'precision': 0, 'type': 10},
-            {'aggregate': 'sum', 'delimiter': ',', 'input': '"仮置場概略有効面積"', 'length': 0, 'name': '仮置場概略有効面積',
-             'precision': 0, 'type': 6}],"NULL"
-             )
-
-        for feature in aggregated_summary_layer.getFeatures():
-            number_of_buildings_total = "{:,}".format(feature["建物棟数（合計）"])
-            number_of_buildings_wooden = "{:,}".format(feature["建物棟数（木造）"])
-            number_of_buildings_non_wooden = "{:,}".format(feature["建物棟数（非木造）"])
-            building_damage_total_cdst = "{:,}".format(round(feature["建物被害想定（合計：全壊）"], 1))
-            building_damage_wooden_cdst = "{:,}".format(round(feature["建物被害想定（木造：全壊）"], 1))
-            building_damage_non_wooden_cdst = "{:,}".format(round(feature["建物被害想定（非木造：全壊）"], 1))
-            building_damage_total_hdst = "{:,}".format(round(feature["建物被害想定（合計：半壊）"], 1))
-            building_damage_wooden_hdst = "{:,}".format(round(feature["建物被害想定（木造：半壊）"], 1))
-            building_damage_non_wooden_hdst = "{:,}".format(round(feature["建物被害想定（非木造：半壊）"], 1))
-            building_damage_total_prob = "{:,}".format(round(feature["建物被害想定（合計：焼失）"], 1))
-            building_damage_wooden_prob = "{:,}".format(round(feature["建物被害想定（木造：焼失）"], 1))
-            building_damage_non_wooden_prob = "{:,}".format(round(feature["建物被害想定（非木造：焼失）"], 1))
-            disaster_wastes_total = "{:,}".format(round(feature["災害廃棄物の発生量（合計）"], 1))
-            disaster_wastes_flam = "{:,}".format(round(feature["災害廃棄物の発生量（可燃系）"], 1))
-            disaster_wastes_no_flam = "{:,}".format(round(feature["災害廃棄物の発生量（不燃系）"], 1))
-            range_area = "{:,}".format(round(feature["範囲内面積"], 1))
-            disaster_waste_required_area = "{:,}".format(round(feature["仮置場必要面積"], 1))
-            tmp_storage_effective_area = "{:,}".format(round(feature["仮置場概略有効面積"], 1))
-
-            # 仮置場名称の文字列を置換する
-            field_idx = aggregated_summary_layer.fields().indexOf('仮置場名称')
-            aggregated_summary_layer.startEditing()
-            tmp_storage_name = feature["仮置場名称"].replace('none、', '').replace('、none', '')
-            if tmp_storage_name == "none":
-                tmp_storage_name = ""
-            aggregated_summary_layer.changeAttributeValue(1, field_idx, tmp_storage_name)
-            aggregated_summary_layer.commitChanges
-
-            # 使用率の計算
-            if feature["仮置場必要面積"] == 0 or feature["仮置場概略有効面積"] == 0:
-                usage_percentage = " - "
-            else:
-                usage_percentage = round(feature["仮置場必要面積"] / feature["仮置場概略有効面積"] * 100)
-            aggregate_polygon_name = feature[self.aggregate_name_field]
-
-        aggregated_summary_text = f"""＜建物棟数＞
-合計：{number_of_buildings_total}棟（木造：{number_of_buildings_wooden}棟、非木造：{number_of_buildings_non_wooden}棟）
-
-＜範囲内面積＞
-{range_area}㎡
-
-＜建物被害想定棟数＞
-全壊：{building_damage_total_cdst}棟（木造：{building_damage_wooden_cdst}棟、非木造：{building_damage_non_wooden_cdst}棟）
-半壊：{building_damage_total_hdst}棟（木造：{building_damage_wooden_hdst}棟、非木造：{building_damage_non_wooden_hdst}棟）
-焼失：{building_damage_total_prob}棟（木棟：{building_damage_wooden_prob}棟、非木造：{building_damage_non_wooden_prob}棟）
-
-＜災害廃棄物発生量＞
-合計： {disaster_wastes_total}t（可燃系：{disaster_wastes_flam}t、不燃系：{disaster_wastes_no_flam}t）
-
-＜仮置場必要面積＞
-{disaster_waste_required_area}㎡
-
-＜仮置場情報＞
-名称：{tmp_storage_name}
-仮置場概略有効面積：{tmp_storage_effective_area}㎡
-使用率：{usage_percentage}％
-
-＜集計ポリゴン名称＞
-{aggregate_polygon_name}"""
+        aggregated_summaries = processes.summary.summarize_scenarios(aggregated_layer, self.aggregate_name_field)
+        aggregated_summary_layer = processes.summary.create_scenario_summary_layer(
+            aggregated_summaries, self.aggregate_name_field)
+        aggregated_summary_text = processes.summary.summaries_text(aggregated_summaries, self.aggregate_name_field)
 
         self.aggregatedSummaryLabel.setText(aggregated_summary_text)
         self.aggregatedSummaryLabel.setFont(QFont('Meiryo UI', 10))
 
-        return aggregated_summary_layer, aggregated_summary_text
+        return aggregated_summaries, aggregated_summary_layer, aggregated_summary_text
 
-    def plot_graph(self, aggregated_summary_layer):
+    def plot_graph(self, aggregated_summaries):
         """
-        集計レイヤの値からグラフを作成する
+        集計サマリーの値からグラフを作成し、ダイアログに表示する
+
+        グラフはメモリ上で描画し、表示中の画像を差し替える（集計結果が0の場合は表示しない）
 
         Args:
-            aggregated_layer(QgsVectorLayer): 集計レイヤ
+            aggregated_summaries(list): (シナリオ名, 集計サマリー) のリスト
 
         Returns:
             None
         """
-        height = []
-        for feature in aggregated_summary_layer.getFeatures():
-            height = [round(feature["仮置場概略有効面積"], 1), round(feature["仮置場必要面積"], 1)]
-        label = ["仮置場概略\n有効面積", "仮置場\n必要面積"]
-
-        # フォントの設定
-        plt.rcParams['font.family'] = 'Meiryo'
-
-        # 集計結果が0の場合はグラフをplotしない
-        if sum(height) == 0:
+        if not self.chart.update(aggregated_summaries):
+            self.graphLabel.clear()
             return
 
-        fig, ax = plt.subplots(figsize=(4.0, 3.8))
-        graph = ax.bar(label, height, width=0.5)
-        
-        # フォントサイズの調整
-        plt.tick_params(axis='x', which='major', labelsize=12)
-        plt.tick_params(axis='y', which='major', labelsize=11)
-
-        # 枠の色の調整
-        ax.spines["right"].set_color("#a9a9a9")
-        ax.spines["bottom"].set_color("#a9a9a9")
-        ax.spines["left"].set_color("#a9a9a9")
-        ax.spines["top"].set_color("#a9a9a9")
-
-        # X軸・Y軸の表示範囲を調整e
-        ax.set_xlim(-0.4, 1.4)
-        ax.set_ylim(0, max(height) * 1.2)
-        # 余白の調整
-        fig.subplots_adjust(left=0.25, bottom=0.2)
-        # Y軸に三桁カンマの設定
-        ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, loc: "{:,}".format(int(x))))
-        # 棒グラフのカラーの設定
-        graph[0].set_color('#87ceeb')
-        graph[1].set_color('#f4a460')
-
-        # 棒グラフの上部に数値を表示する
-        for rect in graph:
-            height = rect.get_height()
-            plt.annotate('{:,}'.format(height) + "㎡",
-                         xy=(rect.get_x() + rect.get_width() / 2, height),
-                         xytext=(0, 3),
-                         size = 11,
-                         textcoords="offset points",
-                         ha='center', va='bottom')
-
-        canvas = FigureCanvas(fig)
-        canvas.setFixedHeight(400)
-        canvas.setFixedWidth(380)
-        self.ui.graphAreaFrame.layout().addWidget(canvas)
-
-        # 一時ディレクトリにグラフをpngで保存
-        temp_dir = tempfile.mkdtemp()
-        graph_png_path = os.path.join(temp_dir, "graph.png")
-        fig.savefig(graph_png_path)
-
-        return graph_png_path
+        pixmap = QPixmap()
+        pixmap.loadFromData(self.chart.png_bytes(), 'PNG')
+        self.graphLabel.setPixmap(pixmap)
@@ -0,0 +1,197 @@
+"""
+QGISの画面を起動せずに仮置場割当て計画を一括集計する
+
+使用例:
+    python -m DisasterWastePlugin.batch \
+        --building tatemono.shp \
+        --tmp-storage kariokibakouhochi.shp --tmp-storage-name-field 名称 --tmp-storage-area-field 面積 \
+        --aggregate machi.shp --aggregate-name-field 町丁目 \
+        --plan plan.json --output-dir result
+
+計画ファイル（JSON）の形式:
+    {
+        "groups": [
+            {
+                "name": "グループ名",
+                "polygons": ["集計ポリゴンの名称", ...],
+                "tmp_storages": ["仮置場名称", ...]
+            }
+        ]
+    }
+
+"tmp_storages" を省略した場合は、集計ポリゴン内にある仮置場を割り当てる。
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+from qgis.core import *
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='災害廃棄物プラグインの一括集計')
+    parser.add_argument('--building', required=True, help='建物ポイントのデータソース')
+    parser.add_argument('--tmp-storage', required=True, help='仮置場候補地ポイントのデータソース')
+    parser.add_argument('--tmp-storage-name-field', required=True, help='仮置場候補地の名称フィールド')
+    parser.add_argument('--tmp-storage-area-field', required=True, help='仮置場候補地の概略有効面積フィールド')
+    parser.add_argument('--aggregate', required=True, help='集計ポリゴンのデータソース')
+    parser.add_argument('--aggregate-name-field', required=True, help='集計ポリゴンの名称フィールド')
+    parser.add_argument('--plan', required=True, help='計画ファイル（JSON）')
+    parser.add_argument('--output-dir', required=True, help='出力先ディレクトリ')
+    parser.add_argument('--encoding', default='cp932', help='集計サマリーCSVの文字コード（既定値：cp932）')
+    return parser.parse_args(argv)
+
+
+def load_layer(uri, name):
+    layer = QgsVectorLayer(uri, name, 'ogr')
+    if not layer.isValid():
+        raise ValueError(f'{name}を読み込めません: {uri}')
+    return layer
+
+
+def find_feature_ids(layer, field_name, values):
+    """
+    名称フィールドの値から地物IDを取得する
+
+    Args:
+        layer(QgsVectorLayer): 対象レイヤ
+        field_name(str): 名称フィールド
+        values(list): 名称のリスト
+
+    Returns:
+        list: 地物ID
+    """
+    values = set(values)
+    request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setSubsetOfAttributes(
+        [field_name], layer.fields())
+    fids = []
+    found = set()
+    for feature in layer.getFeatures(request):
+        if feature[field_name] in values:
+            fids.append(feature.id())
+            found.add(feature[field_name])
+    missing = values - found
+    if missing:
+        raise ValueError(f'{layer.name()}に存在しない名称があります: {"、".join(sorted(missing))}')
+    return fids
+
+
+def assign_tmp_storages(summary, tmp_storage_layer, name_field, area_field, tmp_storage_names):
+    """集計サマリーの仮置場情報を計画ファイルで指定した仮置場に置き換える"""
+    fids = find_feature_ids(tmp_storage_layer, name_field, tmp_storage_names)
+    request = QgsFeatureRequest().setFilterFids(fids).setFlags(QgsFeatureRequest.NoGeometry)
+    area = 0
+    for feature in tmp_storage_layer.getFeatures(request):
+        if feature[area_field] != NULL:
+            area += feature[area_field]
+    summary['仮置場名称'] = '、'.join(tmp_storage_names)
+    summary['仮置場概略有効面積'] = area
+
+
+def run_plan(args):
+    # QGISのProcessingプラグインを読み込めるようにしてからプラグインのモジュールを読み込む
+    sys.path.append(os.path.join(QgsApplication.pkgDataPath(), 'python', 'plugins'))
+    from .processes import aggregate, engine, export, summary
+
+    building_layer = load_layer(args.building, '建物ポイント')
+    tmp_storage_layer = load_layer(args.tmp_storage, '仮置場候補地ポイント')
+    aggregate_layer = load_layer(args.aggregate, '集計ポリゴン')
+
+    with open(args.plan, encoding='utf-8') as f:
+        groups = json.load(f)['groups']
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    gpkg_path = os.path.join(args.output_dir, 'results.gpkg')
+    summary_rows = []
+    summary_header = None
+
+    # グループごとの集計サマリーのファイル名（ファイル名に使用できない文字を置き換え、重複しないようにする）
+    text_filenames = export.unique_names([export.safe_filename(group['name']) for group in groups])
+    for i, group in enumerate(groups):
+        started = time.perf_counter()
+        group_name = group['name']
+
+        fids = find_feature_ids(aggregate_layer, args.aggregate_name_field, group['polygons'])
+        aggregate_layer.selectByIds(fids)
+        selected_aggregate_feature = aggregate.create_selected_aggregate_feature(
+            aggregate_layer,
+            args.aggregate_name_field
+        )
+        aggregated_layer = aggregate.compute_aggregate(
+            aggregate_layer,
+            selected_aggregate_feature,
+            args.aggregate_name_field,
+            tmp_storage_layer,
+            args.tmp_storage_name_field,
+            args.tmp_storage_area_field,
+            building_layer
+        )
+
+        # 建物ポイントに複数シナリオのフィールドがある場合は、シナリオごとに集計サマリーを作成する
+        aggregated_summaries = summary.summarize_scenarios(aggregated_layer, args.aggregate_name_field)
+        if 'tmp_storages' in group:
+            for _, aggregated_summary in aggregated_summaries:
+                assign_tmp_storages(
+                    aggregated_summary,
+                    tmp_storage_layer,
+                    args.tmp_storage_name_field,
+                    args.tmp_storage_area_field,
+                    group['tmp_storages']
+                )
+        aggregated_summary = aggregated_summaries[0][1]
+
+        # 集計結果レイヤをGeoPackageのグループ名のレイヤとして出力
+        # （最初のグループでファイルを作り直し、計画から削除されたグループのレイヤを残さない）
+        try:
+            export.write_features(
+                aggregated_layer, gpkg_path, export.format_by_key('gpkg'), group_name, append=i > 0)
+        except QgsProcessingException as e:
+            raise RuntimeError(f'{group_name}の集計結果を出力できません: {e}')
+
+        # 集計サマリーの文字列をグループごとに出力
+        text = summary.summary_text(aggregated_summary, args.aggregate_name_field)
+        if len(aggregated_summaries) > 1:
+            text = summary.scenario_comparison_text(aggregated_summaries) + '\n\n' + text
+        with open(os.path.join(args.output_dir, text_filenames[i] + '.txt'), 'w', encoding='utf-8') as f:
+            f.write(text)
+
+        # 複数シナリオの場合は、グループ・シナリオごとに1行とする
+        scenario_columns = ['シナリオ'] if len(aggregated_summaries) > 1 else []
+        if summary_header is None:
+            summary_header = ['グループ名'] + scenario_columns + list(aggregated_summary.keys()) + ['使用率']
+        for scenario, scenario_summary in aggregated_summaries:
+            summary_rows.append(
+                [group_name]
+                + [engine.scenario_label(scenario)] * len(scenario_columns)
+                + list(scenario_summary.values())
+                + [summary.usage_percentage(scenario_summary)]
+            )
+
+        print(f'[{i + 1}/{len(groups)}] {group_name}: {time.perf_counter() - started:.2f}秒')
+
+    # 全グループの集計サマリーを1つのCSVに出力
+    with open(os.path.join(args.output_dir, 'summary.csv'), 'w', encoding=args.encoding, newline='') as f:
+        writer = csv.writer(f)
+        if summary_header is not None:
+            writer.writerow(summary_header)
+        writer.writerows(summary_rows)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+
+    if 'QGIS_PREFIX_PATH' in os.environ:
+        QgsApplication.setPrefixPath(os.environ['QGIS_PREFIX_PATH'], True)
+    qgs = QgsApplication([], False)
+    qgs.initQgis()
+    try:
+        run_plan(args)
+    finally:
+        qgs.exitQgis()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+import hashlib
+import io
+import os
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.font_manager import FontProperties
+from matplotlib.ticker import FuncFormatter
+
+from .processes import cache, engine
+
+# 印刷レイアウト用のグラフ画像を保存するキャッシュのサブディレクトリ
+CHART_SUBDIR = 'charts'
+# キャッシュに残すグラフ画像の数（古いものから削除する）
+MAX_CACHED_FILES = 100
+FONT_FAMILY = 'Meiryo'
+FIGURE_SIZE = (4.0, 3.8)
+DPI = 100
+
+
+def chart_values(aggregated_summaries):
+    """
+    集計サマリーからグラフのラベルと値を作成する
+
+    複数シナリオの場合は、仮置場必要面積をシナリオごとに並べる。
+
+    Args:
+        aggregated_summaries(list): (シナリオ名, 集計サマリー) のリスト
+
+    Returns:
+        labels(list): 棒のラベル
+        heights(list): 棒の値
+    """
+    heights = [round(aggregated_summaries[0][1]["仮置場概略有効面積"], 1)] + [
+        round(aggregated_summary["仮置場必要面積"], 1) for _, aggregated_summary in aggregated_summaries
+    ]
+    if len(aggregated_summaries) > 1:
+        labels = ["仮置場概略\n有効面積"] + [
+            f"必要面積\n{engine.scenario_label(scenario)}" for scenario, _ in aggregated_summaries
+        ]
+    else:
+        labels = ["仮置場概略\n有効面積", "仮置場\n必要面積"]
+    return labels, heights
+
+
+class SummaryChart:
+    """
+    集計結果グラフ（仮置場概略有効面積と仮置場必要面積の棒グラフ）
+
+    pyplotを使わずにAggバックエンドのFigureを1つ保持し、集計のたびに同じFigureを描き直す。
+    画面表示用にはメモリ上のPNG、印刷レイアウト用には必要になったときだけ
+    キャッシュディレクトリにPNGファイルを書き出す。
+    フォントはグローバルな設定（rcParams）を変えずに文字ごとに指定するため、
+    インスタンスごとであれば複数のスレッドで同時に描画できる。
+    """
+
+    def __init__(self):
+        self.figure = Figure(figsize=FIGURE_SIZE, dpi=DPI)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot()
+        self.empty = True
+        self._png = None
+
+    def update(self, aggregated_summaries):
+        """
+        集計サマリーの値でグラフを描き直す
+
+        Args:
+            aggregated_summaries(list): (シナリオ名, 集計サマリー) のリスト
+
+        Returns:
+            bool: グラフを描いた場合はTrue（集計結果が0の場合はグラフを描かずFalse）
+        """
+        self._png = None
+        self.ax.clear()
+        labels, heights = chart_values(aggregated_summaries)
+        self.empty = sum(heights) == 0
+        if self.empty:
+            return False
+
+        ax = self.ax
+        positions = list(range(len(heights)))
+        graph = ax.bar(positions, heights, width=0.5)
+
+        # フォントとフォントサイズの調整（日本語を含むラベルと数値にフォントを指定する）
+        ax.set_xticks(positions)
+        ax.set_xticklabels(labels, fontproperties=FontProperties(family=FONT_FAMILY, size=12))
+        ax.tick_params(axis='y', which='major', labelsize=11)
+
+        # 枠の色の調整
+        for spine in ax.spines.values():
+            spine.set_color("#a9a9a9")
+
+        # X軸・Y軸の表示範囲を調整
+        ax.set_xlim(-0.4, len(heights) - 0.6)
+        ax.set_ylim(0, max(heights) * 1.2)
+        # 余白の調整
+        self.figure.subplots_adjust(left=0.25, bottom=0.2)
+        # Y軸に三桁カンマの設定
+        ax.yaxis.set_major_formatter(FuncFormatter(lambda x, loc: "{:,}".format(int(x))))
+        # 棒グラフのカラーの設定
+        graph[0].set_color('#87ceeb')
+        for bar in graph[1:]:
+            bar.set_color('#f4a460')
+
+        # 棒グラフの上部に数値を表示する
+        annotation_font = FontProperties(family=FONT_FAMILY, size=11)
+        for rect in graph:
+            height = rect.get_height()
+            ax.annotate('{:,}'.format(height) + "㎡",
+                        xy=(rect.get_x() + rect.get_width() / 2, height),
+                        xytext=(0, 3),
+                        fontproperties=annotation_font,
+                        textcoords="offset points",
+                        ha='center', va='bottom')
+        self.canvas.draw()
+        return True
+
+    def png_bytes(self):
+        """
+        グラフをメモリ上でPNGに変換して返す（描き直すまでは同じ値を返す）
+
+        Returns:
+            bytes: PNGのデータ（グラフがない場合はNone）
+        """
+        if self.empty:
+            return None
+        if self._png is None:
+            buffer = io.BytesIO()
+            self.canvas.print_png(buffer)
+            self._png = buffer.getvalue()
+        return self._png
+
+    def save_png(self, directory=None):
+        """
+        グラフをPNGファイルとして書き出す
+
+        ファイル名はPNGのデータから決めるため、同じグラフは同じファイルを再利用する。
+        書き出し先を省略した場合はキャッシュディレクトリに書き出し、
+        キャッシュディレクトリのファイルがMAX_CACHED_FILESを超えた場合は更新日時の古いものから削除する
+        （再利用したファイルは更新日時を更新し、削除の対象から外す）。
+        キャッシュのファイルは削除されるため、印刷レイアウトなど後から参照するファイルは書き出し先を指定すること。
+
+        Args:
+            directory(str): 書き出し先のディレクトリ（省略可）
+
+        Returns:
+            str: PNGファイルのパス（グラフがない場合はNone）
+        """
+        png = self.png_bytes()
+        if png is None:
+            return None
+        managed = directory is None
+        if managed:
+            directory = cache.cache_dir(CHART_SUBDIR)
+        path = os.path.join(directory, hashlib.sha1(png).hexdigest() + '.png')
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(png)
+            if managed:
+                prune(directory)
+        elif managed:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        return path
+
+
+def prune(directory, max_files=MAX_CACHED_FILES):
+    """キャッシュディレクトリのグラフ画像を、新しいものからmax_files件だけ残して削除する"""
+    mtimes = {}
+    for name in os.listdir(directory):
+        if not name.endswith('.png'):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            mtimes[path] = os.path.getmtime(path)
+        except OSError:
+            continue
+    for path in sorted(mtimes, key=mtimes.get, reverse=True)[max_files:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -6,21 +6,23 @@ from PyQt5.QtWidgets import *
 from qgis.core import *
 from qgis.gui import *
 
-from .dockwidget_main import DockWidgetMain
+from . import processes
+from .processing_provider.provider import DisasterWasteProvider
 
 PLUGIN_NAME = '災害廃棄物プラグイン'
 
 
 class DisasterWastePlugin:
     def __init__(self, iface):
+        # qgis_processから読み込まれた場合はifaceがNoneとなるため、画面の初期化はinitGuiで行う
         self.iface = iface
-        self.win = self.iface.mainWindow()
         self.plugin_dir = os.path.dirname(__file__)
         self.actions = []
         self.menu = PLUGIN_NAME
-        self.toolbar = self.iface.addToolBar(PLUGIN_NAME)
-        self.toolbar.setObjectName(PLUGIN_NAME)
+        self.toolbar = None
         self.dock_widget_main = None
+        self.provider = None
+        self.atlas_task = None
 
     def add_action(
             self,
@@ -50,23 +52,83 @@ class DisasterWastePlugin:
         self.actions.append(action)
         return action
 
+    def initProcessing(self):
+        # Processingプロバイダを登録する
+        self.provider = DisasterWasteProvider()
+        QgsApplication.processingRegistry().addProvider(self.provider)
+
     def initGui(self):
+        self.initProcessing()
+
+        self.win = self.iface.mainWindow()
+        self.toolbar = self.iface.addToolBar(PLUGIN_NAME)
+        self.toolbar.setObjectName(PLUGIN_NAME)
+
         # メニュー設定
         self.add_action(
             icon_path=None,
             text="災害廃棄物プラグイン",
             callback=self.show_dock_widget_main,
             parent=self.win)
+        self.add_action(
+            icon_path=None,
+            text="割当て結果のPDF一括出力",
+            callback=self.export_atlas,
+            add_to_toolbar=False,
+            parent=self.win)
 
     def unload(self):
+        if self.provider is not None:
+            QgsApplication.processingRegistry().removeProvider(self.provider)
         for action in self.actions:
             self.iface.removePluginMenu(PLUGIN_NAME, action)
             self.iface.removeToolBarIcon(action)
-        del self.toolbar
+        if self.toolbar is not None:
+            del self.toolbar
 
     def show_dock_widget_main(self):
         if self.dock_widget_main is None:
+            # qgis_processではuiファイルやmatplotlibを読み込まないよう、画面を開くときにimportする
+            from .dockwidget_main import DockWidgetMain
             self.dock_widget_main = DockWidgetMain()
             # dockwidgetの×ボタンを無効にする
             self.dock_widget_main.setFeatures(QDockWidget.NoDockWidgetFeatures)
         self.dock_widget_main.show()
+
+    def export_atlas(self):
+        """選択中の集計結果・割当て結果レイヤの、割当て先ごとの地図をPDFに一括出力する"""
+        layer = self.iface.activeLayer()
+        if (
+            not isinstance(layer, QgsVectorLayer)
+            or layer.geometryType() != QgsWkbTypes.PolygonGeometry
+            or '仮置場必要面積' not in layer.fields().names()
+        ):
+            QMessageBox.information(
+                self.win, "確認", "レイヤパネルで「集計結果」または「仮置場割当て結果」のレイヤを選択してください。")
+            return
+
+        answer = QMessageBox.question(
+            self.win,
+            "PDF一括出力",
+            f"「{layer.name()}」の{layer.featureCount()}件の割当て先を出力します。\n"
+            "1つのPDFにまとめますか？（「いいえ」の場合は割当て先ごとにPDFを出力します）",
+            QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel,
+        )
+        if answer == QMessageBox.Cancel:
+            return
+        single_file = answer == QMessageBox.Yes
+        if single_file:
+            output_path, _ = QFileDialog.getSaveFileName(self.win, "PDF出力", "", "PDF Files (*.pdf)")
+        else:
+            output_path = QFileDialog.getExistingDirectory(self.win, "PDFの出力先フォルダ")
+        if not output_path:
+            return
+
+        def on_finished(paths, error):
+            if paths is None:
+                self.iface.messageBar().pushCritical(PLUGIN_NAME, f"PDFを出力できませんでした。{error}")
+                return
+            self.iface.messageBar().pushSuccess(PLUGIN_NAME, f"{len(paths)}件の割当て先のPDFを出力しました。")
+
+        # タスクの完了前に破棄されないよう保持する
+        self.atlas_task = processes.atlas.export_atlas(layer, output_path, single_file, on_finished)
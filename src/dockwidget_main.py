@@ -8,11 +8,16 @@ from qgis.gui import *
 from qgis.PyQt import uic
 from qgis.utils import iface
 
+from . import processes
 from .aggregate_dialog import DialogMain
+from .table_model import FeatureTableModel
 
 
 # uiファイルの定義と同じクラスを継承する
 class DockWidgetMain(QDockWidget):
+    # 選択変更からテーブル更新までの待ち時間（ミリ秒）
+    SELECTION_REFRESH_DELAY_MS = 150
+
     def __init__(self):
         super().__init__()
         self.ui = uic.loadUi(os.path.join(os.path.dirname(
@@ -20,9 +25,19 @@ class DockWidgetMain(QDockWidget):
         self.iface = iface
         self.canvas = iface.mapCanvas()
         self.iface.addDockWidget(Qt.RightDockWidgetArea, self)
+        self.polygon_table_model = FeatureTableModel(self)
+        self.aggregateLayerTable.setModel(self.polygon_table_model)
         self.init_ui()
         self.select_mode = False
         self.aggregate_dialog = None
+        self.selection_totals = None
+
+        # 範囲選択中などに連続して発生する選択変更をまとめてから、テーブルを更新する
+        self.selection_refresh_layer = None
+        self.selection_refresh_timer = QTimer(self)
+        self.selection_refresh_timer.setSingleShot(True)
+        self.selection_refresh_timer.setInterval(self.SELECTION_REFRESH_DELAY_MS)
+        self.selection_refresh_timer.timeout.connect(self.refresh_selection)
         # 「選択をクリア」ボタンと「集計実行」ボタンを無効にする
         self.clearSelectionButton.setEnabled(False)
         self.aggregateRunButton.setEnabled(False)
@@ -36,6 +51,7 @@ class DockWidgetMain(QDockWidget):
         self.buildingLayerComboBox.setFilters(QgsMapLayerProxyModel.PointLayer)
         self.temporaryStrageLayerComboBox.setFilters(QgsMapLayerProxyModel.PointLayer)
         self.aggregateLayerComboBox.setFilters(QgsMapLayerProxyModel.PolygonLayer)
+        self.buildingStoreCheckBox.setChecked(processes.building_store.enabled())
 
         # UIイベント設定
         self.temporaryStrageLayerComboBox.layerChanged.connect(self.set_temporary_strage_layer_fileds)
@@ -45,8 +61,10 @@ class DockWidgetMain(QDockWidget):
         self.selectAggregateRangeButton.clicked.connect(self.run_select_aggregate_range)
         self.aggregateRunButton.clicked.connect(self.run_aggregate)
         self.aggregateCancelButton.clicked.connect(self.close)
+        self.buildingStoreCheckBox.toggled.connect(processes.building_store.set_enabled)
 
     def disconnect_signal(self):
+        self.selection_refresh_timer.stop()
         if self.current_layer_changed_signal:
             self.iface.currentLayerChanged.disconnect(self.current_layer_changed_signal)
             self.current_layer_changed_signal = False
@@ -79,8 +97,8 @@ class DockWidgetMain(QDockWidget):
             self.iface.setActiveLayer(aggregate_layer)
             self.iface.actionSelect().trigger()
 
-            # 地物選択状態が変更されたら、テーブルを更新する
-            self.selection_changed_signal = lambda: self.set_attributes_table(aggregate_layer)
+            # 地物選択状態が変更されたら、テーブルと選択範囲の合計値を更新する
+            self.selection_changed_signal = lambda: self.selection_changed(aggregate_layer)
             self.canvas.selectionChanged.connect(self.selection_changed_signal)
 
             # カレントレイヤが変更されたら、エラーメッセージを出す
@@ -106,47 +124,116 @@ class DockWidgetMain(QDockWidget):
             # 「閉じる」のボタンを有効にする
             self.aggregateCancelButton.setEnabled(True)
 
+            self.liveTotalLabel.setText("")
+            self.nearestSitesLabel.setText("")
             self.selectAggregateRangeButton.setText("選択モードを開始")
 
     def cancel_selection(self):
         self.aggregateLayerComboBox.currentLayer().removeSelection()
-        self.aggregateLayerTable.setRowCount(0)
+        self.polygon_table_model.clear()
         self.selectLabel.setText(f"選択ポリゴン数：0個")
 
     def set_polygon_table(self, aggregate_layer):
         """
         テーブルのヘッダーの設定を行う
         """
-        aggregate_layer_fieldnames = aggregate_layer.fields().names()
-        self.aggregateLayerTable.setColumnCount(len(aggregate_layer_fieldnames))
-        self.aggregateLayerTable.setHorizontalHeaderLabels(aggregate_layer_fieldnames)
+        self.polygon_table_model.set_fieldnames(aggregate_layer.fields().names())
 
     def set_attributes_table(self, aggregate_layer):
         """
         テーブルに選択地物の属性をセットする
+
+        前回から選択に追加・解除された地物の行のみを追加・削除する
         """
-        aggregate_layer_fieldnames = aggregate_layer.fields().names()
-        self.aggregateLayerTable.setRowCount(0)
-        select_features = aggregate_layer.selectedFeatures()
-
-        for select_feature in select_features:
-            row = self.aggregateLayerTable.rowCount()
-            self.aggregateLayerTable.insertRow(row)
-
-            for i, filed_name in enumerate(aggregate_layer_fieldnames):
-                value = select_feature.attribute(filed_name)
-                item = QTableWidgetItem()
-                # intとfloatの場合は右揃え
-                if isinstance(value, (int, float)):
-                    item.setTextAlignment(QtCore.Qt.AlignRight | QtCore.Qt.AlignCenter)
-                # NULLの場合は空白としたいため分岐
-                if not value:
-                    item.setData(Qt.EditRole, value)
-                else:
-                    item.setData(Qt.EditRole, str(value))
-                self.aggregateLayerTable.setItem(row, i, item)
-        
-        self.selectLabel.setText(f"選択ポリゴン数：{len(select_features)}個")
+        fieldnames = aggregate_layer.fields().names()
+        if self.polygon_table_model.fieldnames() != fieldnames:
+            # レイヤが切り替わった場合は列から作り直す
+            self.polygon_table_model.set_fieldnames(fieldnames)
+
+        selected_ids = set(aggregate_layer.selectedFeatureIds())
+        displayed_ids = set(self.polygon_table_model.fids())
+
+        self.polygon_table_model.remove_fids(displayed_ids - selected_ids)
+
+        added_ids = selected_ids - displayed_ids
+        if added_ids:
+            # ジオメトリは取得せず、表示するフィールドのみ取得する
+            request = QgsFeatureRequest().setFilterFids(list(added_ids)).setFlags(QgsFeatureRequest.NoGeometry)
+            request.setSubsetOfAttributes(fieldnames, aggregate_layer.fields())
+            self.polygon_table_model.add_features(list(aggregate_layer.getFeatures(request)))
+
+        self.selectLabel.setText(f"選択ポリゴン数：{len(selected_ids)}個")
+
+    def selection_changed(self, aggregate_layer):
+        self.selection_refresh_layer = aggregate_layer
+        self.selection_refresh_timer.start()
+
+    def refresh_selection(self):
+        if self.selection_refresh_layer is None:
+            return
+        self.set_attributes_table(self.selection_refresh_layer)
+        self.update_live_totals(self.selection_refresh_layer)
+        self.update_nearest_sites(self.selection_refresh_layer)
+
+    def aggregation_finished(self):
+        """
+        集計処理の完了後に、計算中として合計値に含めていなかった選択ポリゴンを反映する
+        """
+        if self.select_mode and self.selection_refresh_layer is not None:
+            self.refresh_selection()
+
+    def update_live_totals(self, aggregate_layer):
+        """
+        選択ポリゴンの仮置場必要面積・災害廃棄物の発生量・仮置場概略有効面積の合計を表示する
+
+        追加・解除されたポリゴンの分だけ差分で合計値を更新する
+        """
+        selection_totals = processes.selection_totals.SelectionTotals(
+            aggregate_layer,
+            self.buildingLayerComboBox.currentLayer(),
+            self.temporaryStrageLayerComboBox.currentLayer(),
+            self.temporaryStrageNameField.currentField(),
+            self.temporaryStrageAreaField.currentField(),
+        )
+        # 入力レイヤ・フィールドが変更された場合は合計値を作り直す
+        if self.selection_totals is None or self.selection_totals.config() != selection_totals.config():
+            self.selection_totals = selection_totals
+
+        required_area, disaster_wastes, effective_area = self.selection_totals.update(
+            aggregate_layer.selectedFeatureIds())
+        text = (
+            f"仮置場必要面積：{round(required_area, 1):,}㎡\n"
+            f"災害廃棄物の発生量：{round(disaster_wastes, 1):,}t\n"
+            f"仮置場概略有効面積：{round(effective_area, 1):,}㎡"
+        )
+        # 集計処理で計算中のポリゴンは完了を待たずに除外し、完了後に反映する
+        if self.selection_totals.pending:
+            text += f"\n（{len(self.selection_totals.pending)}個のポリゴンは計算中）"
+        self.liveTotalLabel.setText(text)
+
+    def update_nearest_sites(self, aggregate_layer):
+        """
+        選択ポリゴンに近い仮置場候補地と余裕面積を表示する
+
+        選択範囲の外にある仮置場も、集計ポリゴンの代表点からの距離が近い順に表示する
+        """
+        tmp_storage_layer = self.temporaryStrageLayerComboBox.currentLayer()
+        tmp_storage_area_field = self.temporaryStrageAreaField.currentField()
+        selected_ids = aggregate_layer.selectedFeatureIds()
+        if tmp_storage_layer is None or not tmp_storage_area_field or not selected_ids:
+            self.nearestSitesLabel.setText("")
+            return
+
+        site_index = processes.site_index.site_index(
+            aggregate_layer,
+            tmp_storage_layer,
+            self.temporaryStrageNameField.currentField(),
+            tmp_storage_area_field,
+        )
+        # 余裕面積は選択範囲の合計値と同じ集計値テーブルから求める
+        statistics = self.selection_totals.statistics if self.selection_totals is not None else None
+        nearest_sites = site_index.nearest_sites(selected_ids, statistics=statistics)
+        self.nearestSitesLabel.setText(processes.site_index.nearest_sites_text(nearest_sites))
 
     def current_layer_changed(self, aggregate_layer):
         # カレントレイヤを集計ポリゴンに戻す時はエラーメッセージを出さないようにする
@@ -156,6 +243,27 @@ class DockWidgetMain(QDockWidget):
         self.iface.setActiveLayer(aggregate_layer)
         QMessageBox.information(None, "確認", "集計範囲を選択中は、カレントレイヤを変更できません。\n変更したい場合は、「選択モードをキャンセル」を押してください。", QMessageBox.Ok)
 
+    def invalid_features_text(self, invalid_features, aggregate_name_field, max_count=10):
+        """
+        不正なジオメトリの地物の一覧を文字列で返す
+
+        Args:
+            invalid_features(list): (地物, エラーメッセージのリスト) のリスト
+            aggregate_name_field(str): 集計ポリゴンの名称フィールド
+            max_count(int): 表示する地物数の上限
+
+        Returns:
+            str: 地物ごとに名称と1件目のエラーを並べた文字列
+        """
+        lines = []
+        for feature, errors in invalid_features[:max_count]:
+            name = feature[aggregate_name_field] if aggregate_name_field else None
+            label = f"ID {feature.id()}" if name is None or name == NULL else f"{name}（ID {feature.id()}）"
+            lines.append(f"・{label}：{errors[0]}")
+        if len(invalid_features) > max_count:
+            lines.append(f"ほか{len(invalid_features) - max_count}件")
+        return "\n".join(lines)
+
     def run_aggregate(self):
         # 集計ダイアログに渡す値を取得する
         building_layer = self.buildingLayerComboBox.currentLayer()
@@ -166,10 +274,8 @@ class DockWidgetMain(QDockWidget):
         aggregate_name_field = self.aggregateNameField.currentField()
 
         # 建物データが集計に必要なフィールドを持っているか検証
-        building_layer_fieldnames = [field.name() for field in building_layer.fields()]
-        is_bldlyr_valid = all(map(lambda x: x in building_layer_fieldnames,
-                                  ["Bld_Str", "Cdst_Dmg", "Hdst_Dmg", "Prob_Burn", "Flam_out", "All_Out","Noflam_out", "T_Area"]))
-        if not is_bldlyr_valid:
+        # （シナリオ別のフィールド「フィールド名__シナリオ名」のみを持つ建物ポイントも集計できる）
+        if not processes.engine.has_building_fields(building_layer):
             QMessageBox.information(
                 self, "確認", f"建物ポイントデータが不正です。\n選択したデータを確認してください。"
             )
@@ -188,30 +294,30 @@ class DockWidgetMain(QDockWidget):
             return
 
         # 集計ポリゴンの選択地物に不正なジオメトリがないか検証
-        for feature in aggregate_selected_features:
-            geom = feature.geometry()
-            validate_geom = geom.validateGeometry(QgsGeometry.ValidatorGeos)
-
-            if validate_geom:
-                # QMessageBox.Yesの場合はジオメトリ修復をした上で集計処理を実行する
-                if QMessageBox.No == QMessageBox.question(
-                    None,
-                    "確認",
-                    '集計ポリゴンに不正なジオメトリが存在します。\nジオメトリの修復を実行した上で集計を実行しますか？',
-                    QMessageBox.Yes,
-                    QMessageBox.No,
-                ):
-                    QMessageBox.information(None, "中止", "集計を中止しました。", QMessageBox.Ok)
-                    return
-                    
-                continue
+        # （検証・修復の結果は地物ごとに保持され、集計時の修復でも再利用される）
+        invalid_features = processes.geometry_repair.invalid_features(aggregate_selected_features)
+        if invalid_features:
+            # QMessageBox.Yesの場合はジオメトリ修復をした上で集計処理を実行する
+            if QMessageBox.No == QMessageBox.question(
+                None,
+                "確認",
+                f'集計ポリゴンに不正なジオメトリが{len(invalid_features)}件存在します。\n'
+                f'{self.invalid_features_text(invalid_features, aggregate_name_field)}\n\n'
+                'ジオメトリの修復を実行した上で集計を実行しますか？',
+                QMessageBox.Yes,
+                QMessageBox.No,
+            ):
+                QMessageBox.information(None, "中止", "集計を中止しました。", QMessageBox.Ok)
+                return
 
         # シグナルを解除
         self.disconnect_signal()
 
         # テーブルとラベルをクリアする
-        self.aggregateLayerTable.setRowCount(0)
+        self.polygon_table_model.clear()
         self.selectLabel.setText(f"選択ポリゴン数：0個")
+        self.liveTotalLabel.setText("")
+        self.nearestSitesLabel.setText("")
 
         # 「選択をクリア」ボタンと「集計実行」ボタンを無効にする
         self.clearSelectionButton.setEnabled(False)
@@ -226,11 +332,12 @@ class DockWidgetMain(QDockWidget):
 
         self.select_mode = False
         
-        # 2回連続で集計した場合、表示されているダイアログを閉じる
-        if self.aggregate_dialog is not None:
-            self.aggregate_dialog.hide()
+        # 集計結果ウィンドウは1つだけ作成し、2回目以降の集計では表示内容を更新する
+        if self.aggregate_dialog is None:
+            self.aggregate_dialog = DialogMain()
+            self.aggregate_dialog.aggregationFinished.connect(self.aggregation_finished)
 
-        self.aggregate_dialog = DialogMain(
+        self.aggregate_dialog.run(
             building_layer,
             temporaryStrage_layer,
             temporaryStrage_name_field,
@@ -1,3 +1,5 @@
+import os
+
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 from PyQt5.QtWidgets import *
@@ -6,24 +8,67 @@ from qgis.gui import *
 from qgis.PyQt import uic
 from qgis.utils import iface
 
-from . import aggregate, processing
+from . import aggregate, allocation, atlas, building_points, building_store, cache, citygml, engine, export, geometry_repair, polygon_stats, processing, result_cache, selection_totals, site_index, summary, task
+
+# 印刷レイアウトに配置するグラフ画像の保存先のサブディレクトリ
+LAYOUT_IMAGE_SUBDIR = 'layout_images'
 
 
-def export_csv(export_layer):
+def export_results(layers, parent=None):
     """
-    対象レイヤのCSVをエクスポート
+    レイヤを選択した形式でファイルに出力する（書き込みはバックグラウンドで行う）
 
     Args:
-        export_layer(QgsVectorLayer): 対象レイヤ
+        layers(list): (レイヤ, 出力するレイヤ名) のリスト
+        parent(QWidget): ダイアログの親（省略可）
 
     Returns:
         None
     """
-    filename = QFileDialog.getSaveFileName(None, "CSV出力", "", "CSV Files (*.csv)")
-    if filename[0] == '':
+    formats = export.available_formats()
+    label, ok = QInputDialog.getItem(
+        parent, "ファイル出力", "出力形式", [export_format.label for export_format in formats], 0, False)
+    if not ok:
+        return
+    export_format = next(export_format for export_format in formats if export_format.label == label)
+
+    # 1つのファイルに出力できない場合は、フォルダにレイヤごとのファイルを出力する
+    if len(layers) > 1 and not export_format.multi_layer:
+        output_path = QFileDialog.getExistingDirectory(parent, f"{export_format.label}出力先フォルダ")
+    else:
+        output_path, _ = QFileDialog.getSaveFileName(
+            parent, f"{export_format.label}出力", "", f"{export_format.label} (*{export_format.extension})")
+    if not output_path:
         return
-    QgsVectorFileWriter.writeAsVectorFormat(export_layer, filename[0], "shift-jis", driverName="CSV")
-    QMessageBox.question(None, "確認", "CSVファイルを出力しました。", QMessageBox.Ok)
+
+    def on_finished(paths, error):
+        if paths is None:
+            QMessageBox.warning(parent, "エラー", f"ファイルを出力できませんでした。\n{error}", QMessageBox.Ok)
+            return
+        iface.messageBar().pushSuccess("災害廃棄物プラグイン", f"{export_format.label}ファイルを出力しました。")
+
+    export.export_layers(layers, output_path, export_format, on_finished)
+
+def printlayout_image_dir():
+    """
+    印刷レイアウトに配置するグラフ画像の保存先を返す
+
+    印刷レイアウトは画像をパスで参照し続けるため、古いものから削除するグラフのキャッシュには保存しない。
+    プロジェクトを保存済みの場合はプロジェクトのフォルダ、未保存の場合や書き込めない場合は
+    キャッシュディレクトリ配下の削除しないサブディレクトリとする。
+
+    Returns:
+        str: ディレクトリのパス
+    """
+    project_dir = QgsProject.instance().absolutePath()
+    if project_dir:
+        path = os.path.join(project_dir, LAYOUT_IMAGE_SUBDIR)
+        try:
+            os.makedirs(path, exist_ok=True)
+            return path
+        except OSError:
+            pass
+    return cache.cache_dir(LAYOUT_IMAGE_SUBDIR)
 
 def create_printlayout(aggregated_layer, aggregated_summary, graph_png_path):
     """
@@ -59,7 +104,27 @@ def create_printlayout(aggregated_layer, aggregated_summary, graph_png_path):
     layout.initializeDefaults()
     layout.setName(printlayout_name)
     manager.addLayout(layout)
+    add_printlayout_items(layout, aggregated_layer, aggregated_summary, graph_png_path, printlayout_name)
 
+    # レイアウトを開く
+    iface.openLayoutDesigner(layout=layout)
+
+def add_printlayout_items(layout, aggregated_layer, aggregated_summary, graph_png_path, title):
+    """
+    印刷レイアウトにマップ・凡例・タイトル・集計サマリー・グラフを配置する
+
+    Args:
+        layout(QgsPrintLayout): 印刷レイアウト
+        aggregated_layer(QgsVectorLayer): 対象レイヤ（プロジェクトに追加済みのレイヤ）
+        aggregated_summary(Str): 集計サマリーテキスト
+        graph_png_path(Str): 集計結果グラフのパス
+        title(Str): タイトル
+
+    Returns:
+        map(QgsLayoutItemMap): マップ
+        map_summary(QgsLayoutItemLabel): 集計サマリーのラベル
+        layoutItemPicture(QgsLayoutItemPicture): グラフの画像
+    """
     # レイアウトをA4縦に設定
     pc = layout.pageCollection()
     pc.page(0).setPageSize('A4', QgsLayoutItemPage.Orientation.Portrait)
@@ -91,7 +156,7 @@ def create_printlayout(aggregated_layer, aggregated_summary, graph_png_path):
 
     # タイトルの追加
     map_label = QgsLayoutItemLabel(layout)
-    map_label.setText(printlayout_name)
+    map_label.setText(title)
     map_label.setFont(QFont('Meiryo UI', 18, QFont.Bold))
     map_label.adjustSizeToText()
     layout.addLayoutItem(map_label)
@@ -137,8 +202,7 @@ def create_printlayout(aggregated_layer, aggregated_summary, graph_png_path):
     layoutItemPicture.attemptResize(QgsLayoutSize(90, 95, QgsUnitTypes.LayoutMillimeters))
     layout.addLayoutItem(layoutItemPicture)
 
-    # レイアウトを開く
-    iface.openLayoutDesigner(layout=layout)
+    return map, map_summary, layoutItemPicture
 
 def get_target_layer_extent(target_layer):
     """
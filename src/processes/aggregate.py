@@ -6,25 +6,28 @@ from qgis.gui import *
 from qgis.PyQt import uic
 from qgis.utils import iface
 
-from . import processing
+from . import engine, geometry_repair, polygon_stats, processing
 
+# 集計のたびに地物を置き換えて再利用する集計結果レイヤに設定するカスタムプロパティ
+MANAGED_RESULT_PROPERTY = 'disaster_waste/managed_result'
 
-def create_selected_aggregate_feature(aggregate_layer, aggregate_name_field):
+
+def create_aggregate_polygon(features, crs, aggregate_name_field):
     """
-    選択した地物で一時レイヤを生成する
+    集計ポリゴンの地物から集計用の一時レイヤを生成する
+
+    ジオメトリは修復し（修復結果はgeometry_repairで地物ごとに保持する）、idには元の地物IDをセットする
 
     Args:
-        aggregate_layer(QgsVectorLayer): 集計対象ポリゴン
+        features(iterable): 集計ポリゴンの地物
+        crs(QgsCoordinateReferenceSystem): 集計ポリゴンの座標参照系
+        aggregate_name_field(str): 集計ポリゴンの名称フィールド
 
     Returns:
-        vlyr(QgsVectorLayer): 選択地物の一時レイヤ
+        vlyr(QgsVectorLayer): 集計用の一時レイヤ
     """
-    # 選択地物のみを対象としてジオメトリの修復を実行する
-    fix_aggregate_layer = processing.fix_selected_geometry(aggregate_layer)
-    aggregate_layer_features = fix_aggregate_layer.getFeatures()
-
     # 空のベクタレイヤを作成
-    aggregate_layer_crs = fix_aggregate_layer.crs().authid()
+    aggregate_layer_crs = crs.authid()
     vlyr = QgsVectorLayer(f'Polygon?crs={aggregate_layer_crs}',
                             '集計結果',
                             'memory')
@@ -39,21 +42,41 @@ def create_selected_aggregate_feature(aggregate_layer, aggregate_name_field):
     vlyr_provider.addAttributes(attribute_name)
     vlyr.updateFields()
 
-    for ftr in aggregate_layer_features:
+    for ftr in features:
+        # 検証済みの地物は修復済みのジオメトリを再利用する
+        geometry = geometry_repair.repaired_geometry(ftr)
         # QgsFeatureを作成
         qgs_feature = QgsFeature()
         # 属性の追加
         attributes = [
             ftr.id(),
             ftr.attribute(aggregate_name_field),
-            ftr.geometry().area()
+            geometry.area()
         ]
         qgs_feature.setAttributes(attributes)
         # ジオメトリを追加
-        qgs_feature.setGeometry(ftr.geometry())
+        qgs_feature.setGeometry(geometry)
         # QgsFeatureを一時レイヤに追加
         vlyr_provider.addFeature(qgs_feature)
 
+    return vlyr
+
+def create_selected_aggregate_feature(aggregate_layer, aggregate_name_field):
+    """
+    選択した地物で一時レイヤを生成する
+
+    Args:
+        aggregate_layer(QgsVectorLayer): 集計対象ポリゴン
+
+    Returns:
+        vlyr(QgsVectorLayer): 選択地物の一時レイヤ
+    """
+    # 選択地物のみを対象としてジオメトリの修復を実行する
+    # （集計値テーブルと対応づけるため、idには集計ポリゴンの地物IDをそのまま使用する）
+    aggregate_layer_features = aggregate_layer.getSelectedFeatures()
+
+    vlyr = create_aggregate_polygon(aggregate_layer_features, aggregate_layer.crs(), aggregate_name_field)
+
     # 集計ポリゴンの選択解除
     aggregate_layer.removeSelection()
 
@@ -69,139 +92,183 @@ def run_aggregate(
         building_layer
         ):
     """
-    集計処理の実行
+    集計処理を実行し、集計結果をプロジェクトの集計結果レイヤに反映する
 
     Args:
         None
 
     Returns:
-        vlayer_join_tmp_storage(QgsVectorLayer): 集計結果のレイヤ
+        QgsVectorLayer: プロジェクトの集計結果レイヤ
     """
-    # 選択ポリゴン内のポイント・必要なフィールドを抽出
-    extracted_building_pnts = processing.intersect(
-        building_layer,
-        ['T_Area', 'Flam_out', 'Noflam_out', 'Bld_Str', 'Cdst_Dmg', 'Hdst_Dmg', 'Prob_Burn', 'All_Out'],
+    vlayer_aggregated = compute_aggregate(
+        aggregate_layer,
         aggregate_polygon,
-        ['id', aggregate_name_field]
-    )
-
-    extracted_tmp_storage_pnts = processing.intersect(
+        aggregate_name_field,
         tmp_storage_layer,
-        [tmp_storage_name_fieldname, tmp_storage_area_fieldname],
-        aggregate_polygon,
-        ['id', aggregate_name_field]
+        tmp_storage_name_fieldname,
+        tmp_storage_area_fieldname,
+        building_layer
     )
 
-    # 町丁目単位で集計
-    aggregated_building_pnts = processing.aggregate(extracted_building_pnts, [
-        {'aggregate': 'sum', 'delimiter': '', 'input': '"Bld_Str"=601', 'length': 20, 'name': '建物棟数（木造）',
-            'precision': 0, 'type': 4},
-        {'aggregate': 'sum', 'delimiter': '', 'input': '"Bld_Str"=610', 'length': 20, 'name': '建物棟数（非木造）',
-            'precision': 0, 'type': 4},
-        {'aggregate': 'sum', 'delimiter': '', 'input': '"Bld_Str">0', 'length': 20, 'name': '建物棟数（合計）',
-            'precision': 0, 'type': 4},
-        {'aggregate': 'sum', 'delimiter': '', 'input': '( "Bld_Str" = 601 ) * "Cdst_Dmg" ', 'length': 20,
-            'name': '建物被害想定（木造：全壊）', 'precision': 1, 'type': 6},
-        {'aggregate': 'sum', 'delimiter': '', 'input': '( "Bld_Str" = 601 ) * "Hdst_Dmg" ', 'length': 20,
-            'name': '建物被害想定（木造：半壊）', 'precision': 1, 'type': 6},
-        {'aggregate': 'sum', 'delimiter': '', 'input': '( "Bld_Str" = 601 ) * "Prob_Burn" ', 'length': 20,
-            'name': '建物被害想定（木造：焼失）', 'precision': 1, 'type': 6},
-        {'aggregate': 'sum', 'delimiter': '', 'input': '( "Bld_Str" = 610 ) * "Cdst_Dmg" ', 'length': 20,
-            'name': '建物被害想定（非木造：全壊）', 'precision': 1, 'type': 6},
-        {'aggregate': 'sum', 'delimiter': '', 'input': '( "Bld_Str" = 610 ) * "Hdst_Dmg" ', 'length': 20,
-            'name': '建物被害想定（非木造：半壊）', 'precision': 1, 'type': 6},
-        {'aggregate': 'sum', 'delimiter': '', 'input': '( "Bld_Str" = 610 ) * "Prob_Burn" ', 'length': 20,
-            'name': '建物被害想定（非木造：焼失）', 'precision': 1, 'type': 6},
-        {'aggregate': 'sum', 'delimiter': '', 'input': '"Cdst_Dmg"', 'length': 20,
-            'name': '建物被害想定（合計：全壊）', 'precision': 1, 'type': 6},
-        {'aggregate': 'sum', 'delimiter': '', 'input': '"Hdst_Dmg"', 'length': 20,
-            'name': '建物被害想定（合計：半壊）', 'precision': 1, 'type': 6},
-        {'aggregate': 'sum', 'delimiter': '', 'input': '"Prob_Burn"', 'length': 20,
-            'name': '建物被害想定（合計：焼失）', 'precision': 1, 'type': 6},
-        {'aggregate': 'sum', 'delimiter': '', 'input': '"Flam_out"', 'length': 20,
-            'name': '災害廃棄物の発生量（可燃系）', 'precision': 1, 'type': 6},
-        {'aggregate': 'sum', 'delimiter': '', 'input': '"Noflam_out"', 'length': 20,
-            'name': '災害廃棄物の発生量（不燃系）', 'precision': 1, 'type': 6},
-        {'aggregate': 'sum', 'delimiter': '', 'input': '"All_Out"', 'length': 20,
-            'name': '災害廃棄物の発生量（合計）', 'precision': 1, 'type': 6},
-        {'aggregate': 'sum', 'delimiter': '', 'input': '"T_Area"', 'length': 20,
-            'name': '仮置場必要面積', 'precision': 1, 'type': 6},
-        {'aggregate': 'first_value', 'delimiter': ',', 'input': 'id', 'length': 20,
-            'name': 'id', 'precision': 0, 'type': 4},
-        {'aggregate': 'first_value', 'delimiter': ',', 'input': f'"{aggregate_name_field}"', 'length': 0,
-            'name': aggregate_name_field, 'precision': 0, 'type': 10}],
-                                                    'id')
-
-    aggregated_tmp_storage_pnts = processing.aggregate(
-        extracted_tmp_storage_pnts,
-        [{'aggregate': 'concatenate', 'delimiter': ',', 'input': f'"{tmp_storage_name_fieldname}"', 'length': 0,
-            'name': '仮置場名称',
-            'precision': 0, 'type': 10},
-            {'aggregate': 'sum', 'delimiter': ',', 'input': f'"{tmp_storage_area_fieldname}"', 'length': 20,
-            'name': '仮置場概略有効面積',
-            'precision': 1, 'type': 6},
-            {'aggregate': 'first_value', 'delimiter': ',', 'input': '"id"', 'length': 20, 'name': 'id',
-            'precision': 0, 'type': 4},
-            {'aggregate': 'first_value', 'delimiter': ',', 'input': f'"{aggregate_name_field}"', 'length': 0,
-            'name': aggregate_name_field,
-            'precision': 0, 'type': 10}],
-        'id')
-
-
-    # idをキーとしてテーブル結合
-    vlayer_join_buildings = processing.table_join(
-        aggregate_polygon,
-        'id',
-        aggregated_building_pnts,
-        'id',
-        ['建物棟数（木造）', '建物棟数（非木造）', '建物棟数（合計）', '建物被害想定（木造：全壊）', '建物被害想定（木造：半壊）', '建物被害想定（木造：焼失）',
-            '建物被害想定（非木造：全壊）', '建物被害想定（非木造：半壊）', '建物被害想定（非木造：焼失）', '建物被害想定（合計：全壊）',
-            '建物被害想定（合計：半壊）', '建物被害想定（合計：焼失）', '災害廃棄物の発生量（可燃系）', '災害廃棄物の発生量（不燃系）',
-            '災害廃棄物の発生量（合計）', '仮置場必要面積'],
-    )
+    return update_result_layer(aggregate_layer, vlayer_aggregated)
+
+def add_result_layer(aggregate_layer, aggregated_layer):
+    """
+    集計結果レイヤを集計ポリゴンの真下に追加する
+
+    Args:
+        aggregate_layer(QgsVectorLayer): 集計ポリゴン
+        aggregated_layer(QgsVectorLayer): 集計結果のレイヤ
 
-    vlayer_join_tmp_storage = processing.table_join(
-        vlayer_join_buildings,
-        'id',
-        aggregated_tmp_storage_pnts,
-        'id',
-        ['仮置場名称', '仮置場概略有効面積']
+    Returns:
+        None
+    """
+    root = QgsProject.instance().layerTreeRoot()
+    QgsProject.instance().addMapLayer(aggregated_layer, False)
+    QgsLayerTreeUtils.insertLayerBelow(root, aggregate_layer, aggregated_layer)
+
+
+def managed_result_layer():
+    """
+    プロジェクト内の、集計のたびに更新する集計結果レイヤを返す
+
+    Returns:
+        QgsVectorLayer: 集計結果レイヤ（ない場合はNone）
+    """
+    for layer in QgsProject.instance().mapLayers().values():
+        if isinstance(layer, QgsVectorLayer) and layer.customProperty(MANAGED_RESULT_PROPERTY):
+            return layer
+    return None
+
+
+def _can_replace_features(layer, aggregated_layer):
+    """集計結果レイヤの地物を、新しい集計結果の地物で置き換えられるか"""
+    return (
+        layer.providerType() == 'memory'
+        and not layer.isEditable()
+        and layer.wkbType() == aggregated_layer.wkbType()
+        and layer.crs() == aggregated_layer.crs()
     )
-  
-    # idカラムの削除
-    vlayer_delete_id_column = processing.delete_column(vlayer_join_tmp_storage,['id'])
 
-    # 属性の端数処理を行う
-    features = vlayer_delete_id_column.getFeatures()
 
-    field_list = ['面積', '建物被害想定（木造：全壊）', '建物被害想定（木造：半壊）', '建物被害想定（木造：焼失）',
-                    '建物被害想定（非木造：全壊）', '建物被害想定（非木造：半壊）', '建物被害想定（非木造：焼失）', '建物被害想定（合計：全壊）',
-                    '建物被害想定（合計：半壊）', '建物被害想定（合計：焼失）', '災害廃棄物の発生量（可燃系）', '災害廃棄物の発生量（不燃系）',
-                    '災害廃棄物の発生量（合計）', '仮置場必要面積', '仮置場概略有効面積']
+def update_result_layer(aggregate_layer, aggregated_layer):
+    """
+    集計結果をプロジェクトの集計結果レイヤに反映する
 
-    vlayer_delete_id_column.startEditing()
-    lyr_fields = vlayer_delete_id_column.fields()
+    集計のたびにレイヤを追加せず、プロジェクトに1つだけ置く集計結果レイヤの地物を置き換える
+    （レイヤパネルの位置・表示状態はそのまま）。
+    集計結果レイヤがない場合は、集計ポリゴンの真下に追加する。
+    集計結果レイヤを編集中の場合や、ジオメトリの種類・座標参照系が異なる場合は、
+    そのレイヤを通常のレイヤとして残し、新しい集計結果レイヤを追加する。
 
-    for feature in features:
-        for field in field_list:
-            field_idx = lyr_fields.indexOf(field)
-            value = feature[field]
-            # 値がNone（QVariant）の場合は処理をスキップ
-            if type(value) == QVariant:
-                continue
-            round_value = round(value, 1)
-            vlayer_delete_id_column.changeAttributeValue(feature.id(), field_idx, round_value)
+    Args:
+        aggregate_layer(QgsVectorLayer): 集計ポリゴン
+        aggregated_layer(QgsVectorLayer): 集計結果のレイヤ
 
-    vlayer_delete_id_column.commitChanges()
+    Returns:
+        QgsVectorLayer: プロジェクトの集計結果レイヤ
+    """
+    layer = managed_result_layer()
+    if layer is not None and not _can_replace_features(layer, aggregated_layer):
+        layer.removeCustomProperty(MANAGED_RESULT_PROPERTY)
+        layer = None
+
+    if layer is None:
+        aggregated_layer.setCustomProperty(MANAGED_RESULT_PROPERTY, True)
+        add_result_layer(aggregate_layer, aggregated_layer)
+        return aggregated_layer
+
+    provider = layer.dataProvider()
+    provider.truncate()
+    # シナリオの数が変わった場合などはフィールドを作り直す
+    if layer.fields().names() != aggregated_layer.fields().names():
+        provider.deleteAttributes(list(range(len(layer.fields()))))
+        provider.addAttributes(aggregated_layer.fields().toList())
+        layer.updateFields()
+    provider.addFeatures(list(aggregated_layer.getFeatures()), QgsFeatureSink.FastInsert)
+    layer.updateExtents()
+
+    scenarios = aggregated_layer.customProperty(engine.SCENARIOS_PROPERTY)
+    if scenarios:
+        layer.setCustomProperty(engine.SCENARIOS_PROPERTY, scenarios)
+    else:
+        layer.removeCustomProperty(engine.SCENARIOS_PROPERTY)
+    layer.setName(aggregated_layer.name())
+    layer.triggerRepaint()
+    return layer
+
+
+def keep_result_layer(layer):
+    """
+    集計結果レイヤの現在の内容を、次の集計で上書きされない別のレイヤとして残す
 
-    vlayer_delete_id_column.setName("集計結果")
+    地物・スタイル・シナリオの情報を複製し、集計結果レイヤの真下に追加する。
 
-    # 集計ポリゴンの真下にレイヤを追加する
-    root = QgsProject.instance().layerTreeRoot()
-    QgsProject.instance().addMapLayer(vlayer_delete_id_column, False)
-    QgsLayerTreeUtils.insertLayerBelow(root, aggregate_layer, vlayer_delete_id_column)
+    Args:
+        layer(QgsVectorLayer): 集計結果レイヤ
+
+    Returns:
+        QgsVectorLayer: 追加したレイヤ
+    """
+    kept = layer.materialize(QgsFeatureRequest())
+    kept.setName(f'{layer.name()}（{QDateTime.currentDateTime().toString("yyyy-MM-dd hh:mm:ss")}）')
+    scenarios = layer.customProperty(engine.SCENARIOS_PROPERTY)
+    if scenarios:
+        kept.setCustomProperty(engine.SCENARIOS_PROPERTY, scenarios)
+    if layer.renderer() is not None:
+        kept.setRenderer(layer.renderer().clone())
+    add_result_layer(layer, kept)
+    return kept
+
+def compute_aggregate(
+        aggregate_layer,
+        aggregate_polygon,
+        aggregate_name_field,
+        tmp_storage_layer,
+        tmp_storage_name_fieldname,
+        tmp_storage_area_fieldname,
+        building_layer,
+        feedback=None,
+        sources=None
+        ):
+    """
+    集計処理の実行（プロジェクトへのレイヤ追加は行わない）
+
+    Args:
+        feedback(QgsProcessingFeedback): 進捗の通知先（省略可）
+        sources(tuple): バックグラウンドで実行する場合のレイヤの読み込み元（PolygonStatistics.ensureを参照）
+
+    Returns:
+        vlayer_aggregated(QgsVectorLayer): 集計結果のレイヤ
+    """
+    # 集計ポリゴンレイヤ全体の集計値テーブルから、選択ポリゴンの集計値を取り出す
+    statistics = polygon_stats.polygon_statistics(
+        aggregate_layer,
+        building_layer,
+        tmp_storage_layer,
+        tmp_storage_name_fieldname,
+        tmp_storage_area_fieldname
+    )
+    statistics.ensure(feedback=feedback, sources=sources)
+    scenario_sums, tmp_storage_sums = statistics.lookup_scenarios(
+        [ftr['id'] for ftr in aggregate_polygon.getFeatures()],
+        feedback,
+        sources
+    )
+
+    # 集計値から集計結果レイヤを作成（端数処理も同時に行う）
+    # 複数シナリオの場合は、2番目以降のシナリオの集計項目を同じ地物に並べる
+    vlayer_aggregated = engine.create_result_layer(
+        aggregate_polygon,
+        aggregate_name_field,
+        scenario_sums[statistics.scenarios[0]],
+        tmp_storage_sums,
+        scenario_sums if len(scenario_sums) > 1 else None
+    )
+
+    vlayer_aggregated.setName("集計結果")
 
-    return vlayer_delete_id_column
+    return vlayer_aggregated
 
 def apply_symbology(aggregated_layer):
     """
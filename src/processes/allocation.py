@@ -0,0 +1,327 @@
+import heapq
+
+from PyQt5.QtCore import *
+from qgis.core import *
+
+from . import engine
+
+# 割当ての目的（容量を超える場合に、距離と使用率のどちらを優先して割り当てるか）
+OBJECTIVE_DISTANCE = 'distance'
+OBJECTIVE_OVERFLOW = 'overflow'
+OBJECTIVES = [OBJECTIVE_DISTANCE, OBJECTIVE_OVERFLOW]
+
+RESULT_LAYER_NAME = '仮置場割当て結果'
+REQUIRED_AREA = engine.measure_index('仮置場必要面積')
+
+
+class Depot:
+    """
+    割当て先の仮置場（同じ集計ポリゴンにある仮置場はまとめて1つの割当て先とする）
+
+    seed: 仮置場のある集計ポリゴン（割当ての起点）
+    names: 仮置場名称
+    capacity: 概略有効面積の合計
+    load: 割り当てた集計ポリゴンの仮置場必要面積の合計
+    """
+
+    def __init__(self, seed):
+        self.seed = seed
+        self.names = []
+        self.capacity = 0.0
+        self.load = 0.0
+        self._points = []
+
+    def add_site(self, name, capacity, point):
+        self.names.append(name)
+        self.capacity += capacity
+        self._points.append(point)
+        n = len(self._points)
+        self.location = QgsPointXY(
+            sum(point.x() for point in self._points) / n,
+            sum(point.y() for point in self._points) / n,
+        )
+
+    def usage(self, extra=0.0):
+        """extraを加えた場合の使用率（概略有効面積が0の場合は無限大）"""
+        if self.capacity <= 0:
+            return float('inf') if self.load + extra > 0 else 0.0
+        return (self.load + extra) / self.capacity
+
+
+def read_sites(tmp_storage_layer, name_field, area_field, crs):
+    """
+    仮置場候補地ポイントを読み込む
+
+    Returns:
+        list: (仮置場名称, 概略有効面積, 座標（crsの座標系）) のリスト
+    """
+    request = QgsFeatureRequest()
+    request.setDestinationCrs(crs, QgsProject.instance().transformContext())
+    request.setSubsetOfAttributes([name_field, area_field], tmp_storage_layer.fields())
+    sites = []
+    for feature in tmp_storage_layer.getFeatures(request):
+        geometry = feature.geometry()
+        if geometry.isEmpty():
+            continue
+        name = feature[name_field]
+        area = feature[area_field]
+        sites.append((
+            '' if name is None or name == NULL else str(name),
+            0.0 if area is None or area == NULL else float(area),
+            geometry.centroid().asPoint(),
+        ))
+    return sites
+
+
+def adjacency(geometries):
+    """
+    集計ポリゴンの隣接関係を求める（境界を共有するポリゴンを隣接とする）
+
+    Returns:
+        list: ポリゴンごとの隣接ポリゴンの添字のset
+        index(QgsSpatialIndex): ポリゴンの外接矩形の空間インデックス
+        engines(list): ポリゴンの準備済みジオメトリ
+    """
+    index = QgsSpatialIndex()
+    engines = []
+    for i, geometry in enumerate(geometries):
+        geometry_engine = QgsGeometry.createGeometryEngine(geometry.constGet())
+        geometry_engine.prepareGeometry()
+        engines.append(geometry_engine)
+        index.addFeature(i, geometry.boundingBox())
+
+    neighbors = [set() for _ in geometries]
+    for i, geometry in enumerate(geometries):
+        for j in index.intersects(geometry.boundingBox()):
+            if j <= i or j in neighbors[i]:
+                continue
+            if engines[i].intersects(geometries[j].constGet()):
+                neighbors[i].add(j)
+                neighbors[j].add(i)
+    return neighbors, index, engines
+
+
+def _seed_polygon(point, geometries, index, engines):
+    """仮置場を含む集計ポリゴン（含むポリゴンがない場合は最も近いポリゴン）の添字を返す"""
+    point_geometry = QgsGeometry.fromPointXY(point)
+    for i in index.intersects(point_geometry.boundingBox()):
+        if engines[i].intersects(point_geometry.constGet()):
+            return i
+    nearest = index.nearestNeighbor(point, 1)
+    return nearest[0] if nearest else None
+
+
+def allocate(geometries, demands, sites, objective=OBJECTIVE_DISTANCE, feedback=None):
+    """
+    集計ポリゴンを、容量（概略有効面積）の制約のもとで仮置場に割り当てる
+
+    1. 仮置場のある集計ポリゴンを起点に、隣接するポリゴンを仮置場からの距離の近い順にたどり、
+       容量に収まる範囲で割り当てる（複数の仮置場から同時に広げるため、各仮置場の割当ては連続した
+       ポリゴンのまとまりになる）。
+    2. 容量が不足して残ったポリゴンは、割当て済みの隣接ポリゴンの仮置場のうち、objectiveが
+       OBJECTIVE_DISTANCEの場合は最も近い仮置場、OBJECTIVE_OVERFLOWの場合は使用率が最も低くなる
+       仮置場に割り当てる。
+    3. 仮置場のない島等、隣接関係でたどれないポリゴンは、2と同じ基準で全仮置場から選んで割り当てる。
+
+    Args:
+        geometries(list): 集計ポリゴンのジオメトリ
+        demands(list): 集計ポリゴンごとの仮置場必要面積
+        sites(list): read_sitesの戻り値（集計ポリゴンと同じ座標系）
+        objective(str): OBJECTIVES
+        feedback(QgsFeedback): 進捗の通知先（省略可）
+
+    Returns:
+        assignment(list): 集計ポリゴンごとの割当て先（depotsの添字、仮置場がない場合はNone）
+        depots(list): Depot
+    """
+    count = len(geometries)
+    neighbors, index, engines = adjacency(geometries)
+    centroids = [geometry.centroid().asPoint() for geometry in geometries]
+    if feedback is not None:
+        feedback.setProgress(30)
+
+    depots = []
+    depot_of_polygon = {}
+    for name, capacity, point in sites:
+        polygon = _seed_polygon(point, geometries, index, engines)
+        if polygon is None:
+            continue
+        if polygon not in depot_of_polygon:
+            depot_of_polygon[polygon] = len(depots)
+            depots.append(Depot(polygon))
+        depots[depot_of_polygon[polygon]].add_site(name, capacity, point)
+
+    assignment = [None] * count
+    if not depots:
+        return assignment, depots
+
+    def distance(d, p):
+        return depots[d].location.distance(centroids[p])
+
+    def assign(p, d):
+        assignment[p] = d
+        depots[d].load += demands[p]
+
+    def choose(p, candidates):
+        if objective == OBJECTIVE_OVERFLOW:
+            return min(candidates, key=lambda d: (depots[d].usage(demands[p]), distance(d, p)))
+        return min(candidates, key=lambda d: distance(d, p))
+
+    # 1. 容量に収まる範囲で、仮置場から近い順に隣接ポリゴンへ広げる
+    heap = [(0.0, depot.seed, d) for d, depot in enumerate(depots)]
+    heapq.heapify(heap)
+    while heap:
+        _, p, d = heapq.heappop(heap)
+        if assignment[p] is not None:
+            continue
+        # 仮置場のあるポリゴンは、容量を超える場合も必ずその仮置場に割り当てる
+        if p != depots[d].seed and depots[d].load + demands[p] > depots[d].capacity:
+            continue
+        assign(p, d)
+        for n in neighbors[p]:
+            if assignment[n] is None:
+                heapq.heappush(heap, (distance(d, n), n, d))
+    if feedback is not None:
+        feedback.setProgress(60)
+
+    # 2. 残ったポリゴンを、割当て済みの隣接ポリゴンの仮置場に割り当てる
+    heap = []
+    for p in range(count):
+        if assignment[p] is None:
+            candidates = {assignment[n] for n in neighbors[p] if assignment[n] is not None}
+            if candidates:
+                heap.append((min(distance(d, p) for d in candidates), p))
+    heapq.heapify(heap)
+    while heap:
+        _, p = heapq.heappop(heap)
+        if assignment[p] is not None:
+            continue
+        candidates = {assignment[n] for n in neighbors[p] if assignment[n] is not None}
+        d = choose(p, candidates)
+        assign(p, d)
+        for n in neighbors[p]:
+            if assignment[n] is None:
+                heapq.heappush(heap, (distance(d, n), n))
+    if feedback is not None:
+        feedback.setProgress(90)
+
+    # 3. 隣接関係でたどれないポリゴンを割り当てる
+    for p in range(count):
+        if assignment[p] is None:
+            assign(p, choose(p, range(len(depots))))
+    if feedback is not None:
+        feedback.setProgress(100)
+    return assignment, depots
+
+
+def _sum_values(rows):
+    """集計値のリストを項目ごとに合計する（NULLを除く）"""
+    totals = None
+    for row in rows:
+        if totals is None:
+            totals = [0] * len(row)
+        for i, value in enumerate(row):
+            if value is not None and value != NULL:
+                totals[i] += value
+    return totals
+
+
+def create_allocation_layer(
+        aggregate_layer,
+        aggregate_name_field,
+        building_layer,
+        tmp_storage_layer,
+        tmp_storage_name_fieldname,
+        tmp_storage_area_fieldname,
+        objective=OBJECTIVE_DISTANCE,
+        feedback=None,
+        request=None,
+        ):
+    """
+    集計ポリゴンを仮置場に自動で割り当て、割当て先ごとの集計結果レイヤを作成する
+
+    集計結果レイヤは、仮置場ごとに割り当てた集計ポリゴンを結合した地物とし、
+    「集計結果」と同じフィールド（複数シナリオの場合はシナリオ別の項目を含む）を持つ。
+
+    Args:
+        aggregate_layer(QgsVectorLayer): 集計ポリゴン
+        aggregate_name_field(str): 集計ポリゴンの名称フィールド
+        building_layer(QgsVectorLayer): 建物ポイント
+        tmp_storage_layer(QgsVectorLayer): 仮置場候補地ポイント
+        tmp_storage_name_fieldname(str): 仮置場名称のフィールド名
+        tmp_storage_area_fieldname(str): 概略有効面積のフィールド名
+        objective(str): OBJECTIVES
+        feedback(QgsFeedback): 進捗の通知先（省略可）
+        request(QgsFeatureRequest): 対象とする集計ポリゴンの条件（省略時は全地物）
+
+    Returns:
+        QgsVectorLayer: 割当て結果のレイヤ（キャンセルされた場合はNone）
+    """
+    step_feedback = QgsProcessingMultiStepFeedback(2, feedback) if feedback is not None else None
+
+    # 集計ポリゴンごとの集計値（全シナリオを建物ポイントの1回の走査で求める）
+    locator = engine.PolygonLocator(aggregate_layer, key_field=None, request=request, repair=True)
+    scenarios = engine.building_scenarios(building_layer)
+    scenario_sums = engine.aggregate_building_scenarios(building_layer, locator, scenarios, step_feedback)
+    if feedback is not None and feedback.isCanceled():
+        return None
+
+    if step_feedback is not None:
+        step_feedback.setCurrentStep(1)
+    building_sums = scenario_sums[scenarios[0]]
+    demands = [
+        building_sums[fid][REQUIRED_AREA] if fid in building_sums else 0.0 for fid in locator.keys
+    ]
+    sites = read_sites(tmp_storage_layer, tmp_storage_name_fieldname, tmp_storage_area_fieldname, locator.crs)
+    assignment, depots = allocate(locator.geometries, demands, sites, objective, step_feedback)
+    if not depots:
+        raise QgsProcessingException('集計ポリゴンの範囲に仮置場候補地がありません。')
+
+    name_request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setSubsetOfAttributes(
+        [aggregate_name_field], aggregate_layer.fields())
+    names = {feature.id(): feature[aggregate_name_field] for feature in aggregate_layer.getFeatures(name_request)}
+
+    # 割当て先ごとに集計ポリゴンを結合した地物を作成する（create_aggregate_polygonと同じフィールド）
+    group_polygon = QgsVectorLayer(f'MultiPolygon?crs={locator.crs.authid()}', RESULT_LAYER_NAME, 'memory')
+    group_polygon.dataProvider().addAttributes([
+        QgsField("id", QVariant.Int),
+        QgsField(aggregate_name_field, QVariant.String),
+        QgsField("面積", QVariant.Double, prec=1, len=20),
+    ])
+    group_polygon.updateFields()
+    members = [[] for _ in depots]
+    for p, d in enumerate(assignment):
+        members[d].append(p)
+    group_features = []
+    group_building_sums = {scenario: {} for scenario in scenarios}
+    tmp_storage_sums = {}
+    for d, polygons in enumerate(members):
+        if not polygons:
+            continue
+        fids = [locator.keys[p] for p in polygons]
+        geometry = QgsGeometry.unaryUnion([locator.geometries[p] for p in polygons])
+        geometry.convertToMultiType()
+        feature = QgsFeature(group_polygon.fields())
+        feature.setAttributes([
+            d,
+            '、'.join(str(names[fid]) for fid in fids if names.get(fid) not in (None, NULL)),
+            geometry.area(),
+        ])
+        feature.setGeometry(geometry)
+        group_features.append(feature)
+        for scenario in scenarios:
+            totals = _sum_values(scenario_sums[scenario][fid] for fid in fids if fid in scenario_sums[scenario])
+            if totals is not None:
+                group_building_sums[scenario][d] = totals
+        tmp_storage_sums[d] = [','.join(depots[d].names), depots[d].capacity]
+
+    group_polygon.dataProvider().addFeatures(group_features)
+    allocation_layer = engine.create_result_layer(
+        group_polygon,
+        aggregate_name_field,
+        group_building_sums[scenarios[0]],
+        tmp_storage_sums,
+        group_building_sums if len(scenarios) > 1 else None
+    )
+    allocation_layer.setName(RESULT_LAYER_NAME)
+    return allocation_layer
@@ -0,0 +1,295 @@
+import os
+import re
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+from qgis.core import *
+
+from . import cache, engine, summary
+from .task import LayerSnapshot
+
+ATLAS_LAYOUT_NAME = '仮置場割当て結果（一括出力）'
+# アトラスの対象レイヤに追加する、ページごとの集計サマリー・グラフのパス・ファイル名のフィールド
+SUMMARY_FIELD = 'atlas_summary'
+CHART_FIELD = 'atlas_chart'
+FILENAME_FIELD = 'atlas_filename'
+# グラフを並列に作成する数
+MAX_WORKERS = max(1, min(4, os.cpu_count() or 1))
+# 1ファイルずつ出力する場合に、ファイル名に使用できない文字
+INVALID_FILENAME_CHARS = r'[\\/:*?"<>|\s]'
+
+
+def group_label(feature, index):
+    """割当て先（地物）の表示名（仮置場名称、ない場合は連番）"""
+    name = feature['仮置場名称'] if '仮置場名称' in feature.fields().names() else None
+    if name is None or name == NULL or not str(name):
+        return f'{index + 1:03d}'
+    return str(name)
+
+
+def group_filename(feature, index):
+    """割当て先ごとのPDFのファイル名（拡張子なし）"""
+    return f'{index + 1:03d}_{re.sub(INVALID_FILENAME_CHARS, "_", group_label(feature, index))}'
+
+
+class AtlasExportTask(QgsTask):
+    """
+    集計結果・割当て結果の地物（割当て先）ごとに1ページの地図をPDFに出力するタスク
+
+    ページごとの集計サマリーとグラフの画像は、バックグラウンドスレッドで複数のワーカーにより作成する。
+    印刷レイアウトはメインスレッドのオブジェクトのため、ページの描画とPDFの出力はメインスレッドで行うが、
+    1回の呼び出しで全ページを出力せず、QTimerで1ページずつ出力してその間もQGISを操作できるようにする。
+    タスクは全ページの出力が終わるまで完了しないため、進捗の表示と中止はタスクマネージャーから行える。
+    """
+
+    # ページの描画をメインスレッドで開始する（runから発行する）
+    renderRequested = pyqtSignal()
+
+    def __init__(self, result_layer, output_path, single_file, on_finished=None, max_workers=MAX_WORKERS):
+        """
+        Args:
+            result_layer(QgsVectorLayer): 集計結果・割当て結果のレイヤ（プロジェクトに追加済みのレイヤ）
+            output_path(str): 1つのPDFにまとめる場合はPDFのパス、割当て先ごとに出力する場合はフォルダのパス
+            single_file(bool): 1つのPDFにまとめる場合はTrue
+            on_finished(callable): 出力後に出力したファイルのパスのリスト（失敗した場合はNone）と
+                                   エラーメッセージを渡して呼び出す関数（省略可）
+            max_workers(int): グラフを並列に作成する数
+        """
+        super().__init__('割当て結果のPDF一括出力', QgsTask.CanCancel)
+        self.result_layer = result_layer
+        self.output_path = output_path
+        self.single_file = single_file
+        self.on_finished = on_finished
+        self.max_workers = max_workers
+        self.name_field = result_layer.fields()[0].name()
+        self.scenarios = engine.result_scenarios(result_layer)
+        self.source = LayerSnapshot(result_layer)
+        self.chart_dir = cache.cache_dir('atlas', uuid.uuid4().hex)
+        # 地物ID -> (集計サマリーの文字列, グラフのパス)
+        self.pages = {}
+        self.exception = None
+        self.feedback = QgsFeedback()
+
+        # メインスレッドでのページの描画の状態
+        self.rendered = threading.Event()
+        self.render_error = None
+        # アトラスはカバレッジレイヤを弱参照でしか保持しないため、出力が終わるまでここで保持する
+        self.coverage = None
+        self.layout = None
+        self.atlas = None
+        self.exporter = None
+        self.writer = None
+        self.painter = None
+        self.page_index = 0
+        self.paths = []
+        self.renderRequested.connect(self.start_render, Qt.QueuedConnection)
+
+    def _page(self, feature):
+        """1ページ分の集計サマリーとグラフを作成する（ワーカースレッドで実行する）"""
+        # matplotlibはqgis_processでは読み込まないよう、使用するときにimportする
+        from ..chart import SummaryChart
+
+        summaries = summary.feature_summaries(feature, self.name_field, self.scenarios)
+        chart = SummaryChart()
+        chart.update(summaries)
+        return feature.id(), summary.summaries_text(summaries, self.name_field), chart.save_png(self.chart_dir)
+
+    def cancel(self):
+        self.feedback.cancel()
+        super().cancel()
+
+    def run(self):
+        try:
+            request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+            features = list(self.source.getFeatures(request))
+            if not features:
+                return False
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [executor.submit(self._page, feature) for feature in features]
+                for i, future in enumerate(futures):
+                    if self.isCanceled():
+                        for remaining in futures[i:]:
+                            remaining.cancel()
+                        return False
+                    fid, text, chart_path = future.result()
+                    self.pages[fid] = (text, chart_path)
+                    self.setProgress((i + 1) * 50 / len(futures))
+        except Exception as e:
+            self.exception = e
+            return False
+
+        # ページの描画はメインスレッドで行い、全ページの出力が終わるまで待つ
+        self.renderRequested.emit()
+        while not self.rendered.wait(0.1):
+            if self.isCanceled():
+                return False
+        return self.render_error is None and not self.isCanceled()
+
+    def finished(self, result):
+        paths = None
+        error = ''
+        try:
+            if result:
+                paths = self.paths
+            elif self.exception is not None or self.render_error is not None:
+                error = str(self.exception or self.render_error)
+                QgsMessageLog.logMessage(f'PDFの一括出力でエラーが発生しました: {error}', 'DisasterWastePlugin',
+                                         Qgis.Critical)
+        finally:
+            shutil.rmtree(self.chart_dir, ignore_errors=True)
+        if self.on_finished is not None:
+            self.on_finished(paths, error)
+
+    def coverage_layer(self):
+        """
+        アトラスの対象レイヤ（集計結果の複製に、ページごとの集計サマリー・グラフのパス・ファイル名を加えたもの）を
+        作成する
+        """
+        coverage = self.result_layer.materialize(QgsFeatureRequest())
+        coverage.setName(self.result_layer.name())
+        provider = coverage.dataProvider()
+        provider.addAttributes([
+            QgsField(SUMMARY_FIELD, QVariant.String),
+            QgsField(CHART_FIELD, QVariant.String),
+            QgsField(FILENAME_FIELD, QVariant.String),
+        ])
+        coverage.updateFields()
+        summary_index = coverage.fields().indexOf(SUMMARY_FIELD)
+        chart_index = coverage.fields().indexOf(CHART_FIELD)
+        filename_index = coverage.fields().indexOf(FILENAME_FIELD)
+
+        # materializeでは地物IDが変わるため、元のレイヤと同じ順で対応づける
+        request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+        source_fids = [feature.id() for feature in self.result_layer.getFeatures(request)]
+        changes = {}
+        for index, (source_fid, feature) in enumerate(zip(source_fids, coverage.getFeatures(request))):
+            text, chart_path = self.pages.get(source_fid, ('', None))
+            changes[feature.id()] = {
+                summary_index: text,
+                chart_index: chart_path or '',
+                filename_index: group_filename(feature, index),
+            }
+        provider.changeAttributeValues(changes)
+        return coverage
+
+    def start_render(self):
+        """
+        アトラスの印刷レイアウトを作成し、1ページ目の出力を開始する（メインスレッドで実行する）
+        """
+        # 循環importを避けるため、印刷レイアウトの部品は使用するときにimportする
+        from . import add_printlayout_items
+
+        try:
+            project = QgsProject.instance()
+            self.coverage = self.coverage_layer()
+            self.layout = QgsPrintLayout(project)
+            self.layout.initializeDefaults()
+            self.layout.setName(ATLAS_LAYOUT_NAME)
+            map_item, summary_label, picture = add_printlayout_items(
+                self.layout, self.result_layer, '', None, ATLAS_LAYOUT_NAME)
+
+            # ページごとに、地図を割当て先に合わせ、集計サマリーとグラフを差し替える
+            map_item.setAtlasDriven(True)
+            map_item.setAtlasScalingMode(QgsLayoutItemMap.Auto)
+            map_item.setAtlasMargin(0.1)
+            summary_label.setText(f'[% "{SUMMARY_FIELD}" %]')
+            picture.dataDefinedProperties().setProperty(
+                QgsLayoutObject.PictureSource, QgsProperty.fromField(CHART_FIELD))
+            picture.refreshDataDefinedProperty(QgsLayoutObject.PictureSource)
+
+            self.atlas = self.layout.atlas()
+            self.atlas.setCoverageLayer(self.coverage)
+            self.atlas.setFilenameExpression(f'"{FILENAME_FIELD}"')
+            self.atlas.setEnabled(True)
+            self.exporter = QgsLayoutExporter(self.layout)
+            if not self.atlas.beginRender() or self.atlas.count() == 0:
+                raise QgsProcessingException('PDFに出力する割当て先がありません。')
+
+            if self.single_file:
+                self.writer = self.pdf_writer(self.output_path)
+                self.painter = QPainter()
+                if not self.painter.begin(self.writer):
+                    raise QgsProcessingException(f'{self.output_path}を作成できませんでした。')
+            else:
+                os.makedirs(self.output_path, exist_ok=True)
+        except Exception as e:
+            self.end_render(e)
+            return
+        QTimer.singleShot(0, self.render_next_page)
+
+    def pdf_writer(self, path):
+        """1つのPDFに全ページを描画するための、印刷レイアウトのページと同じ大きさのQPdfWriterを作成する"""
+        page = self.layout.pageCollection().page(0)
+        size = self.layout.renderContext().measurementConverter().convert(
+            page.pageSize(), QgsUnitTypes.LayoutMillimeters)
+        writer = QPdfWriter(path)
+        writer.setPageSize(QPageSize(QSizeF(size.width(), size.height()), QPageSize.Millimeter))
+        writer.setPageMargins(QMarginsF(0, 0, 0, 0))
+        writer.setResolution(int(self.layout.renderContext().dpi()))
+        writer.setTitle(ATLAS_LAYOUT_NAME)
+        return writer
+
+    def render_next_page(self):
+        """
+        アトラスの次のページを出力する（メインスレッドで、QTimerから1ページずつ呼び出す）
+        """
+        if self.feedback.isCanceled():
+            self.end_render()
+            return
+        try:
+            if not self.atlas.seekTo(self.page_index):
+                raise QgsProcessingException(f'{self.page_index + 1}ページ目を作成できませんでした。')
+            if self.single_file:
+                if self.page_index > 0:
+                    self.writer.newPage()
+                self.exporter.renderPage(self.painter, 0)
+                if self.page_index == 0:
+                    self.paths.append(self.output_path)
+            else:
+                path = os.path.join(self.output_path, self.atlas.currentFilename() + '.pdf')
+                result = self.exporter.exportToPdf(path, QgsLayoutExporter.PdfExportSettings())
+                if result != QgsLayoutExporter.Success:
+                    raise QgsProcessingException(f'{path}を出力できませんでした。{self.exporter.errorMessage()}')
+                self.paths.append(path)
+        except Exception as e:
+            self.end_render(e)
+            return
+
+        self.page_index += 1
+        count = self.atlas.count()
+        self.setProgress(50 + self.page_index * 50 / count)
+        if self.page_index < count:
+            QTimer.singleShot(0, self.render_next_page)
+        else:
+            self.end_render()
+
+    def end_render(self, error=None):
+        """ページの出力を終了し、待機しているrunに通知する"""
+        self.render_error = error
+        if self.painter is not None and self.painter.isActive():
+            self.painter.end()
+        if self.atlas is not None:
+            self.atlas.endRender()
+        self.painter = None
+        self.writer = None
+        self.coverage = None
+        self.rendered.set()
+
+
+def export_atlas(result_layer, output_path, single_file, on_finished=None):
+    """
+    集計結果・割当て結果の割当て先ごとの地図のPDF出力をバックグラウンドで開始する
+
+    Args:
+        AtlasExportTaskと同じ
+
+    Returns:
+        AtlasExportTask: 開始したタスク
+    """
+    task = AtlasExportTask(result_layer, output_path, single_file, on_finished)
+    QgsApplication.taskManager().addTask(task)
+    return task
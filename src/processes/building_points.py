@@ -0,0 +1,507 @@
+import math
+import posixpath
+import zipfile
+from xml.etree import ElementTree
+
+import numpy as np
+from PyQt5.QtCore import *
+from qgis.core import *
+
+from . import engine, spatial_index
+
+# 3D都市モデル（bldg.gdb）の属性のフィールド名
+BUILDING_ID_FIELD = '建物ID'
+YEAR_FIELD = 'yearOfConstruction'
+STOREYS_FIELD = 'storeysAboveGround'
+FLOOR_AREA_FIELD = 'totalFloorArea'
+STRUCTURE_FIELD = 'buildingStructureType'
+
+# 災害外力の種類（キー, 名称, 既定のフィールド名, 外力データがない場合の値）
+# 値がない場合は算定シートで外力データが空欄の場合と同じ扱いとする
+HAZARDS = [
+    ('intensity', '地震動（計測震度）', '計測震度', 0.0),
+    ('intensity_class', '地震動（震度階）', '震度階', 0.0),
+    ('liquefaction', '液状化危険度', '液状化危険', -1.0),
+    ('slope', '急傾斜地崩壊危険度ランク', '崩壊危険度', None),
+    ('tsunami', '津波浸水深', '浸水深', -1.0),
+    ('fire', '焼失確率', '焼失確率', 0.0),
+]
+
+# 算定条件（災害廃棄物発生量等算定シートのセル -> 既定値）
+# 既定値は doc/worksheet_EstimatingDisasterWaste.xlsx の入力値
+DAMAGE_SHEET = '建物被害想定算定条件'
+WASTE_SHEET = '発生量･必要面積算定条件'
+COEFFICIENT_CELLS = {
+    # 1.地震動被害の平均と標準偏差（全壊率 λ, ζ / 全半壊率 λ, ζ）
+    'quake_wooden_1': ((DAMAGE_SHEET, 'D9'), (DAMAGE_SHEET, 'E9'), (DAMAGE_SHEET, 'F9'), (DAMAGE_SHEET, 'G9')),
+    'quake_wooden_2': ((DAMAGE_SHEET, 'D10'), (DAMAGE_SHEET, 'E10'), (DAMAGE_SHEET, 'F10'), (DAMAGE_SHEET, 'G10')),
+    'quake_wooden_3': ((DAMAGE_SHEET, 'D11'), (DAMAGE_SHEET, 'E11'), (DAMAGE_SHEET, 'F11'), (DAMAGE_SHEET, 'G11')),
+    'quake_non_wooden_1': ((DAMAGE_SHEET, 'D12'), (DAMAGE_SHEET, 'E12'), (DAMAGE_SHEET, 'F12'), (DAMAGE_SHEET, 'G12')),
+    'quake_non_wooden_2': ((DAMAGE_SHEET, 'D13'), (DAMAGE_SHEET, 'E13'), (DAMAGE_SHEET, 'F13'), (DAMAGE_SHEET, 'G13')),
+    'quake_non_wooden_3': ((DAMAGE_SHEET, 'D14'), (DAMAGE_SHEET, 'E14'), (DAMAGE_SHEET, 'F14'), (DAMAGE_SHEET, 'G14')),
+    # 年代区分（区分2の開始年, 終了年）
+    'wooden_periods': ((DAMAGE_SHEET, 'B10'), (DAMAGE_SHEET, 'C10')),
+    'non_wooden_periods': ((DAMAGE_SHEET, 'B13'), (DAMAGE_SHEET, 'C13')),
+    # 2.液状化面積率（液状化危険度 0, 1, 2, 3）
+    'liquefaction_area_ratio': ((DAMAGE_SHEET, 'B26'), (DAMAGE_SHEET, 'B25'), (DAMAGE_SHEET, 'B24'),
+                                (DAMAGE_SHEET, 'B23')),
+    # 3.液状化による建物被害率（全壊, 大規模半壊, 半壊）
+    'liquefaction_damage_ratio': ((DAMAGE_SHEET, 'B33'), (DAMAGE_SHEET, 'B34'), (DAMAGE_SHEET, 'B35')),
+    # 4.液状化により被害を受けると想定する建物の条件（建築年, 階数）
+    'liquefaction_condition': ((DAMAGE_SHEET, 'B42'), (DAMAGE_SHEET, 'B43')),
+    # 5.急傾斜地崩壊箇所の震度別被害率（震度階 1〜6）
+    'slope_full_ratio': tuple((DAMAGE_SHEET, f'{column}51') for column in 'BCDEFG'),
+    'slope_half_ratio': tuple((DAMAGE_SHEET, f'{column}52') for column in 'BCDEFG'),
+    # 6.急傾斜地危険度ランク別の崩壊確率（A, B, C）
+    'slope_collapse_probability': ((DAMAGE_SHEET, 'B59'), (DAMAGE_SHEET, 'B60'), (DAMAGE_SHEET, 'B61')),
+    # 7.浸水深と建物被害の関係（木造全壊の下限, 木造半壊の下限, 木造半壊の上限, 非木造半壊の下限）
+    'tsunami_depth': ((DAMAGE_SHEET, 'B69'), (DAMAGE_SHEET, 'B70'), (DAMAGE_SHEET, 'D70'), (DAMAGE_SHEET, 'E70')),
+    # 1-1.解体ごみの原単位（木造全壊, 非木造全壊, 木造半壊, 非木造半壊, 焼失）
+    'waste_unit': ((WASTE_SHEET, 'B4'), (WASTE_SHEET, 'B5'), (WASTE_SHEET, 'D4'), (WASTE_SHEET, 'D5'),
+                   (WASTE_SHEET, 'B6')),
+    # 1-2.種類別割合（柱角材, 可燃物, 不燃物, コンクリートがら, 金属くず, その他）
+    'composition': tuple((WASTE_SHEET, f'B{row}') for row in range(14, 20)),
+    # 1-3.種類別割合_火災（柱角材, 可燃物, 燃えがら, コンクリートがら, 金属くず）
+    'fire_composition': tuple((WASTE_SHEET, f'B{row}') for row in range(29, 34)),
+    # 1-4.片付けごみ（原単位 t/棟, 可燃系割合, 不燃系割合）
+    'cleanup': ((WASTE_SHEET, 'B45'), (WASTE_SHEET, 'D43'), (WASTE_SHEET, 'D44')),
+    # 2.搬入先の割合（仮置場を経由, 路上廃棄物等, 解体ごみ）
+    'routing': ((WASTE_SHEET, 'B57'), (WASTE_SHEET, 'B64'), (WASTE_SHEET, 'B65')),
+    # 3-2., 4-2.必要面積が最大となる月までの累積搬入割合・累積搬出割合（片付けごみ, 路上廃棄物等, 解体ごみ）
+    'inflow': ((WASTE_SHEET, 'L104'), (WASTE_SHEET, 'M104'), (WASTE_SHEET, 'N104')),
+    'outflow': ((WASTE_SHEET, 'L167'), (WASTE_SHEET, 'M167'), (WASTE_SHEET, 'N167')),
+    # 6.見かけ比重（可燃系, 不燃系）, 積み上げ高さ（可燃系, 不燃系）, 作業スペース割合
+    'storage': ((WASTE_SHEET, 'B253'), (WASTE_SHEET, 'B254'), (WASTE_SHEET, 'B260'), (WASTE_SHEET, 'B261'),
+                (WASTE_SHEET, 'B267')),
+}
+DEFAULT_COEFFICIENTS = {
+    'quake_wooden_1': (6.25, 0.27, 5.91, 0.33),
+    'quake_wooden_2': (6.4, 0.32, 6.01, 0.33),
+    'quake_wooden_3': (6.95, 0.44, 6.57, 0.44),
+    'quake_non_wooden_1': (6.93, 0.5, 6.58, 0.53),
+    'quake_non_wooden_2': (7.05, 0.54, 6.67, 0.54),
+    'quake_non_wooden_3': (7.5, 0.6, 7.1, 0.58),
+    'wooden_periods': (1961, 1980),
+    'non_wooden_periods': (1971, 1980),
+    'liquefaction_area_ratio': (0.0, 0.02, 0.18, 0.65),
+    'liquefaction_damage_ratio': (0.006, 0.0796, 0.1438),
+    'liquefaction_condition': (1959, 4),
+    'slope_full_ratio': (0.0, 0.06, 0.12, 0.18, 0.24, 0.3),
+    'slope_half_ratio': (0.0, 0.14, 0.28, 0.42, 0.56, 0.7),
+    'slope_collapse_probability': (0.1, 0.0, 0.0),
+    'tsunami_depth': (2.0, 0.5, 2.0, 0.5),
+    'waste_unit': (0.6, 1.0, 0.3, 0.5, 0.23),
+    'composition': (0.04, 0.16, 0.3, 0.43, 0.03, 0.04),
+    'fire_composition': (0.023, 0.004, 0.389, 0.543, 0.041),
+    'cleanup': (0.5 * 59761065 / 58789224, 0.8, 0.2),
+    'routing': (1.0, 0.0, 1.0),
+    'inflow': (1.0, 1.0, 0.9),
+    'outflow': (1.0, 1.0, 0.3),
+    'storage': (0.4, 1.1, 5.0, 5.0, 1.0),
+}
+
+# 出力する建物ポイントのフィールド（フィールド名, 型）
+OUTPUT_FIELDS = [
+    ('BuildID', QVariant.String),
+    ('All_Out', QVariant.Double),
+    ('T_Area', QVariant.Double),
+    ('Flam_out', QVariant.Double),
+    ('Noflam_out', QVariant.Double),
+    ('Bld_Str', QVariant.Int),
+    ('Cdst_Dmg', QVariant.Double),
+    ('Hdst_Dmg', QVariant.Double),
+    ('X', QVariant.Double),
+    ('Y', QVariant.Double),
+    ('Prob_Burn', QVariant.Double),
+]
+
+_XLSX_NS = {
+    'm': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main',
+    'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
+    'rel': 'http://schemas.openxmlformats.org/package/2006/relationships',
+}
+
+
+def _xlsx_sheet_paths(book):
+    """シート名 -> ワークシートのXMLのパス"""
+    workbook = ElementTree.fromstring(book.read('xl/workbook.xml'))
+    rels = ElementTree.fromstring(book.read('xl/_rels/workbook.xml.rels'))
+    targets = {rel.get('Id'): rel.get('Target') for rel in rels.findall('rel:Relationship', _XLSX_NS)}
+    paths = {}
+    for sheet in workbook.find('m:sheets', _XLSX_NS):
+        target = targets[sheet.get('{%s}id' % _XLSX_NS['r'])]
+        paths[sheet.get('name')] = posixpath.normpath(posixpath.join('xl', target.lstrip('/')))
+    return paths
+
+
+def _xlsx_values(book, path, cells):
+    """ワークシートから指定したセルの値（数式の場合は計算済みの値）を読み込む"""
+    values = {}
+    for _, element in ElementTree.iterparse(book.open(path)):
+        if element.tag != '{%s}c' % _XLSX_NS['m']:
+            continue
+        if element.get('r') in cells:
+            value = element.find('m:v', _XLSX_NS)
+            if value is not None and element.get('t') not in ('s', 'str', 'inlineStr', 'e'):
+                values[element.get('r')] = float(value.text)
+        element.clear()
+    return values
+
+
+def load_coefficients(path):
+    """
+    災害廃棄物発生量等算定シート（xlsx）から算定条件を読み込む
+
+    算定条件のセルの値を読み込み、値が読み込めないセルは既定値とする。
+    数式のセルは、Excelで保存した時点の計算済みの値を使用する。
+
+    Args:
+        path(str): 算定シートのパス
+
+    Returns:
+        dict: 算定条件
+    """
+    coefficients = {name: list(values) for name, values in DEFAULT_COEFFICIENTS.items()}
+    with zipfile.ZipFile(path) as book:
+        sheet_paths = _xlsx_sheet_paths(book)
+        for sheet in (DAMAGE_SHEET, WASTE_SHEET):
+            if sheet not in sheet_paths:
+                QgsMessageLog.logMessage(f'算定シートに「{sheet}」シートがありません。既定値を使用します。',
+                                         'DisasterWastePlugin', Qgis.Warning)
+                continue
+            cells = {cell for cell_refs in COEFFICIENT_CELLS.values() for name, cell in cell_refs if name == sheet}
+            values = _xlsx_values(book, sheet_paths[sheet], cells)
+            for name, cell_refs in COEFFICIENT_CELLS.items():
+                for i, (cell_sheet, cell) in enumerate(cell_refs):
+                    if cell_sheet == sheet and cell in values:
+                        coefficients[name][i] = values[cell]
+    return {name: tuple(values) for name, values in coefficients.items()}
+
+
+def _normal_cdf(x, mean, sd):
+    """正規分布の累積分布関数（ExcelのNORM.DIST(x, mean, sd, TRUE)）"""
+    if sd <= 0:
+        return (x >= mean).astype(np.float64)
+    z = (x - mean) / (sd * math.sqrt(2.0))
+    # 誤差関数の近似（Abramowitz and Stegun 7.1.26、誤差1.5e-7以下）
+    t = 1.0 / (1.0 + 0.3275911 * np.abs(z))
+    polynomial = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = np.sign(z) * (1.0 - polynomial * np.exp(-z * z))
+    return 0.5 * (1.0 + erf)
+
+
+def _choose(codes, table, default=0.0):
+    """整数のコードに対応する値を表から選ぶ（表にないコードはdefault）"""
+    result = np.full(len(codes), default, dtype=np.float64)
+    for code, value in table.items():
+        result[codes == code] = value
+    return result
+
+
+def read_buildings(
+        building_layer,
+        id_field=BUILDING_ID_FIELD,
+        year_field=YEAR_FIELD,
+        storeys_field=STOREYS_FIELD,
+        floor_area_field=FLOOR_AREA_FIELD,
+        structure_field=STRUCTURE_FIELD,
+        feedback=None,
+        ):
+    """
+    3D都市モデルの建物を1回走査し、代表点の座標と属性を配列で返す
+
+    代表点はジオメトリの重心とする（ポイントの場合はそのまま）。
+    数値の属性がNULLの場合は、算定シートで空欄の場合と同じく0とする。
+
+    Returns:
+        dict: ids(list), x, y, year, storeys, floor_area, structure（numpy.ndarray）
+    """
+    fieldnames = [name for name in (id_field, year_field, storeys_field, floor_area_field, structure_field) if name]
+    request = QgsFeatureRequest().setSubsetOfAttributes(fieldnames, building_layer.fields())
+    total = building_layer.featureCount()
+    ids = []
+    xs = []
+    ys = []
+    numbers = {name: [] for name in (year_field, storeys_field, floor_area_field, structure_field)}
+    for current, feature in enumerate(building_layer.getFeatures(request)):
+        if feedback is not None and current % 1000 == 0:
+            if feedback.isCanceled():
+                return None
+            feedback.setProgress(current * 100.0 / total if total > 0 else 0)
+        geometry = feature.geometry()
+        if geometry.isEmpty():
+            continue
+        point = geometry.centroid().asPoint()
+        ids.append(str(feature[id_field]) if id_field and feature[id_field] != NULL else str(feature.id()))
+        xs.append(point.x())
+        ys.append(point.y())
+        for name, values in numbers.items():
+            value = feature[name]
+            values.append(0 if value is None or value == NULL else value)
+
+    return {
+        'ids': ids,
+        'x': np.asarray(xs, dtype=np.float64),
+        'y': np.asarray(ys, dtype=np.float64),
+        'year': np.asarray(numbers[year_field], dtype=np.float64),
+        'storeys': np.asarray(numbers[storeys_field], dtype=np.float64),
+        'floor_area': np.asarray(numbers[floor_area_field], dtype=np.float64),
+        'structure': np.asarray(numbers[structure_field], dtype=np.int64),
+    }
+
+
+def join_hazard(buildings, crs, hazard_layer, fieldname, default, feedback=None):
+    """
+    建物の代表点を含む災害外力ポリゴンの属性値を、建物ごとの配列で返す
+
+    建物の代表点に格子型空間インデックスを作成し、ポリゴンごとに候補の代表点を絞り込んでから
+    配列演算で内外判定を行う。複数のポリゴンに含まれる場合は後のポリゴンの値とする。
+
+    Args:
+        buildings(dict): read_buildingsの戻り値
+        crs(QgsCoordinateReferenceSystem): 建物の座標参照系
+        hazard_layer(QgsVectorLayer): 災害外力のポリゴン
+        fieldname(str): 属性値のフィールド名
+        default: ポリゴンに含まれない建物の値
+        feedback(QgsFeedback): 進捗の通知先（省略可）
+
+    Returns:
+        numpy.ndarray: 属性値（文字列の属性の場合はobjectの配列）
+    """
+    count = len(buildings['ids'])
+    values = np.full(count, default, dtype=object if default is None else np.float64)
+    index, order = spatial_index.PointIndex.from_points(np.arange(count), buildings['x'], buildings['y'])
+    transform = QgsCoordinateTransform(hazard_layer.crs(), crs, QgsProject.instance())
+    request = QgsFeatureRequest().setSubsetOfAttributes([fieldname], hazard_layer.fields())
+    total = hazard_layer.featureCount()
+    for current, feature in enumerate(hazard_layer.getFeatures(request)):
+        if feedback is not None:
+            if feedback.isCanceled():
+                return values
+            feedback.setProgress(current * 100.0 / total if total > 0 else 0)
+        value = feature[fieldname]
+        if value is None or value == NULL:
+            continue
+        geometry = feature.geometry()
+        if geometry.isEmpty():
+            continue
+        geometry.transform(transform)
+        positions = index.query(geometry.boundingBox())
+        if len(positions) == 0:
+            continue
+        inside = engine.points_in_polygon(index.xs[positions], index.ys[positions], geometry)
+        values[order[positions[inside]]] = value
+    return values
+
+
+def _demolition_waste(full_area, half_area, structure, coefficients):
+    """
+    全壊・半壊の被害床面積から解体ごみの発生量を求める
+
+    Returns:
+        total: 構造別の発生量（木造・非木造以外の建物は0）
+        flammable: 可燃系（可燃物・柱角材）
+        non_flammable: 不燃系（不燃物・コンクリートがら・金属くず・その他）
+    """
+    wooden_full, non_wooden_full, wooden_half, non_wooden_half, _ = coefficients['waste_unit']
+    pillar, combustible, incombustible, concrete, metal, others = coefficients['composition']
+    is_wooden = structure == engine.WOODEN
+    # 種類別の発生量は、算定シートと同じく木造以外の建物を非木造の原単位で求める
+    waste = (full_area * np.where(is_wooden, wooden_full, non_wooden_full)
+             + half_area * np.where(is_wooden, wooden_half, non_wooden_half))
+    total = np.where(is_wooden | (structure == engine.NON_WOODEN), waste, 0.0)
+    return total, waste * (combustible + pillar), waste * (incombustible + concrete + metal + others)
+
+
+def _required_area(flammable, non_flammable, cleanup_rate, coefficients):
+    """
+    災害廃棄物の発生量から一次仮置場の必要面積を求める
+
+    片付けごみ・路上廃棄物等・解体ごみのそれぞれについて、必要面積が最大となる月までの
+    累積搬入量から累積搬出量を除いた保管量を求め、見かけ比重と積み上げ高さで面積に換算する。
+    """
+    cleanup_unit, cleanup_flammable, cleanup_non_flammable = coefficients['cleanup']
+    via_storage, road_ratio, demolition_ratio = coefficients['routing']
+    inflow = coefficients['inflow']
+    outflow = coefficients['outflow']
+    flammable_density, non_flammable_density, flammable_height, non_flammable_height, work_space = (
+        coefficients['storage'])
+
+    areas = []
+    for waste, cleanup_ratio, density, height in (
+            (flammable, cleanup_flammable, flammable_density, flammable_height),
+            (non_flammable, cleanup_non_flammable, non_flammable_density, non_flammable_height),
+    ):
+        cleanup = cleanup_rate * cleanup_unit * cleanup_ratio
+        remaining = np.maximum((waste - cleanup) * via_storage, 0.0)
+        road = remaining * road_ratio
+        demolition = remaining * demolition_ratio
+        stored = sum(
+            amount * (inflow[i] - outflow[i]) for i, amount in enumerate((cleanup, road, demolition))
+        )
+        areas.append(stored / density / height * (1 + work_space))
+    return areas[0] + areas[1]
+
+
+def estimate(buildings, hazards, coefficients=None):
+    """
+    建物ごとの被害率・災害廃棄物発生量・仮置場必要面積を配列演算で求める
+
+    災害廃棄物発生量等算定シートの「地震動」「液状化」「急傾斜」「津波」「火災」「集計」シートと
+    同じ計算を、建物をまとめた配列に対して行う。
+
+    Args:
+        buildings(dict): read_buildingsの戻り値
+        hazards(dict): 災害外力のキー（HAZARDS）をキーとした建物ごとの値の配列
+        coefficients(dict): 算定条件（省略時はDEFAULT_COEFFICIENTS）
+
+    Returns:
+        dict: OUTPUT_FIELDSのフィールド名（BuildID, X, Y, Bld_Strを除く）をキーとした配列
+    """
+    coefficients = coefficients or DEFAULT_COEFFICIENTS
+    count = len(buildings['ids'])
+    floor_area = buildings['floor_area']
+    structure = buildings['structure']
+    year = buildings['year']
+    storeys = buildings['storeys']
+    is_wooden = structure == engine.WOODEN
+    is_non_wooden = structure == engine.NON_WOODEN
+
+    def hazard(key, default):
+        values = hazards.get(key)
+        if values is None:
+            return np.full(count, default, dtype=np.float64)
+        return values
+
+    # 地震動（揺れ）：構造・建築年の区分ごとの被害率曲線
+    intensity = hazard('intensity', 0.0)
+    quake_full = np.zeros(count)
+    quake_full_half = np.zeros(count)
+    for prefix, mask, (period_start, period_end) in (
+            ('quake_wooden', is_wooden, coefficients['wooden_periods']),
+            ('quake_non_wooden', is_non_wooden, coefficients['non_wooden_periods']),
+    ):
+        periods = np.where(year < period_start, 1, np.where(year > period_end, 3, 2))
+        for period in (1, 2, 3):
+            target = mask & (periods == period)
+            if not target.any():
+                continue
+            full_mean, full_sd, full_half_mean, full_half_sd = coefficients[f'{prefix}_{period}']
+            quake_full[target] = _normal_cdf(intensity[target], full_mean, full_sd)
+            quake_full_half[target] = _normal_cdf(intensity[target], full_half_mean, full_half_sd)
+    quake_half = quake_full_half - quake_full
+
+    # 液状化：液状化面積率 × 被害を受けると想定する建物の割合 × 被害率
+    liquefaction_ratio = _choose(hazard('liquefaction', -1.0), dict(enumerate(coefficients['liquefaction_area_ratio'])))
+    condition_year, condition_storeys = coefficients['liquefaction_condition']
+    susceptible = np.where(
+        storeys >= condition_storeys, 0.0,
+        np.where(year <= condition_year, 1.0, 0.8)
+    )
+    liquefaction_full_ratio, liquefaction_large_half_ratio, liquefaction_half_ratio = (
+        coefficients['liquefaction_damage_ratio'])
+    liquefaction_full = liquefaction_ratio * susceptible * liquefaction_full_ratio
+    liquefaction_large_half = liquefaction_ratio * susceptible * liquefaction_large_half_ratio
+    liquefaction_half = liquefaction_ratio * susceptible * liquefaction_half_ratio
+
+    # 急傾斜地崩壊：崩壊確率 × 震度別被害率
+    ranks = hazards.get('slope')
+    collapse = np.zeros(count)
+    if ranks is not None:
+        for rank, probability in zip('ABC', coefficients['slope_collapse_probability']):
+            collapse[ranks == rank] = probability
+    intensity_class = hazard('intensity_class', 0.0)
+    slope_full = collapse * _choose(intensity_class, dict(enumerate(coefficients['slope_full_ratio'], start=1)))
+    slope_half = collapse * _choose(intensity_class, dict(enumerate(coefficients['slope_half_ratio'], start=1)))
+
+    # 津波：構造別の浸水深による全壊・半壊
+    depth = hazard('tsunami', -1.0)
+    wooden_full_depth, wooden_half_min, wooden_half_max, non_wooden_half_min = coefficients['tsunami_depth']
+    tsunami_full = (is_wooden & (depth >= wooden_full_depth)).astype(np.float64)
+    tsunami_half = (
+        (is_wooden & (depth >= wooden_half_min) & (depth < wooden_half_max))
+        | (is_non_wooden & (depth >= non_wooden_half_min))
+    ).astype(np.float64)
+
+    # 火災：焼失確率
+    burn = hazard('fire', 0.0)
+
+    all_out = np.zeros(count)
+    flam_out = np.zeros(count)
+    noflam_out = np.zeros(count)
+    required_area = np.zeros(count)
+    for full_rate, half_rate, cleanup_rate in (
+            (quake_full, quake_half, quake_half),
+            (liquefaction_full, liquefaction_large_half + liquefaction_half,
+             liquefaction_large_half + liquefaction_half),
+            (slope_full, slope_half, slope_half),
+            (tsunami_full, tsunami_half, tsunami_half),
+    ):
+        total, flammable, non_flammable = _demolition_waste(
+            floor_area * full_rate, floor_area * half_rate, structure, coefficients)
+        all_out += total
+        flam_out += flammable
+        noflam_out += non_flammable
+        required_area += _required_area(flammable, non_flammable, cleanup_rate, coefficients)
+
+    # 火災は片付けごみを見込まず、焼失床面積に焼失の原単位と火災の種類別割合を乗じる
+    burnt_waste = floor_area * burn * coefficients['waste_unit'][4]
+    pillar, combustible, cinder, concrete, metal = coefficients['fire_composition']
+    fire_flammable = burnt_waste * (combustible + pillar)
+    fire_non_flammable = burnt_waste * (cinder + concrete + metal)
+    all_out += np.where(is_wooden | is_non_wooden, burnt_waste, 0.0)
+    flam_out += fire_flammable
+    noflam_out += fire_non_flammable
+    required_area += _required_area(fire_flammable, fire_non_flammable, np.zeros(count), coefficients)
+
+    return {
+        'All_Out': all_out,
+        'T_Area': required_area,
+        'Flam_out': flam_out,
+        'Noflam_out': noflam_out,
+        'Cdst_Dmg': quake_full + liquefaction_full + slope_full + tsunami_full,
+        'Hdst_Dmg': quake_half + liquefaction_large_half + liquefaction_half + slope_half + tsunami_half,
+        'Prob_Burn': burn,
+    }
+
+
+def output_fields():
+    """建物ポイントのフィールドを返す"""
+    fields = QgsFields()
+    for name, field_type in OUTPUT_FIELDS:
+        fields.append(QgsField(name, field_type))
+    return fields
+
+
+def building_point_features(buildings, results, fields=None):
+    """
+    建物ごとの計算結果から建物ポイントの地物を順に作成する
+
+    Args:
+        buildings(dict): read_buildingsの戻り値
+        results(dict): estimateの戻り値
+        fields(QgsFields): 建物ポイントのフィールド（省略時はoutput_fields()）
+
+    Returns:
+        generator: QgsFeature
+    """
+    fields = fields or output_fields()
+    columns = [
+        buildings['ids'],
+        results['All_Out'].tolist(),
+        results['T_Area'].tolist(),
+        results['Flam_out'].tolist(),
+        results['Noflam_out'].tolist(),
+        buildings['structure'].tolist(),
+        results['Cdst_Dmg'].tolist(),
+        results['Hdst_Dmg'].tolist(),
+        buildings['x'].tolist(),
+        buildings['y'].tolist(),
+        results['Prob_Burn'].tolist(),
+    ]
+    for attributes in zip(*columns):
+        feature = QgsFeature(fields)
+        feature.setAttributes(list(attributes))
+        feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(attributes[8], attributes[9])))
+        yield feature
+
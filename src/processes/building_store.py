@@ -0,0 +1,212 @@
+import json
+import os
+import shutil
+
+import numpy as np
+from qgis.core import *
+
+from . import cache, spatial_index
+
+STORE_SUBDIR = 'building_store'
+# 建物ポイントのキャッシュを使用するかの設定
+SETTINGS_KEY = 'DisasterWastePlugin/use_building_store'
+META_FILENAME = 'meta.json'
+
+# セッション内で読み込んだキャッシュ（データソース -> BuildingStore）
+_loaded_stores = {}
+# 変更のシグナルを接続済みのレイヤID
+_watched_layers = set()
+
+
+def enabled():
+    """建物ポイントのキャッシュを使用する設定になっているか"""
+    return QgsSettings().value(SETTINGS_KEY, False, type=bool)
+
+
+def set_enabled(value):
+    QgsSettings().setValue(SETTINGS_KEY, bool(value))
+
+
+class BuildingStore:
+    """
+    建物ポイントの座標と集計に使用する属性を、列ごとのNumPy配列で保持するキャッシュ
+
+    地物は空間インデックス（PointIndex）と同じセル番号順に並べ、index.query()で得た位置で
+    各列を参照できるようにしている。属性はすべてfloat64とし、NULLはNaNとする。
+    キャッシュファイルは列ごとの.npyファイルとし、読み込み時はメモリマップで開くため、
+    地物数が多くても読み込みはすぐに終わり、参照した部分のみメモリに読み込まれる。
+    座標はレイヤの座標系のまま保持する。
+    """
+
+    def __init__(self, index, columns, crs):
+        self.index = index
+        self.columns = columns
+        self.crs = crs
+
+    @property
+    def signature(self):
+        return self.index.signature
+
+    @classmethod
+    def build(cls, layer, fieldnames, signature='', feedback=None):
+        """
+        レイヤの全地物を1回走査してキャッシュを作成する
+
+        Args:
+            layer(QgsVectorLayer): 建物ポイント
+            fieldnames(list): 保持するフィールド名
+            signature(str): データソースの識別文字列
+            feedback(QgsFeedback): 進捗の通知先（省略可）
+
+        Returns:
+            BuildingStore: キャンセルされた場合はNone
+        """
+        request = QgsFeatureRequest().setSubsetOfAttributes(fieldnames, layer.fields())
+        total = layer.featureCount()
+        fids = []
+        xs = []
+        ys = []
+        values = {name: [] for name in fieldnames}
+        for current, feature in enumerate(layer.getFeatures(request)):
+            if feedback is not None and current % 1000 == 0:
+                if feedback.isCanceled():
+                    return None
+                feedback.setProgress(current * 100.0 / total if total > 0 else 0)
+            geometry = feature.geometry()
+            if geometry.isEmpty():
+                continue
+            point = geometry.boundingBox().center()
+            fids.append(feature.id())
+            xs.append(point.x())
+            ys.append(point.y())
+            for name in fieldnames:
+                value = feature[name]
+                values[name].append(np.nan if value is None or value == NULL else value)
+
+        index, order = spatial_index.PointIndex.from_points(fids, xs, ys, signature=signature)
+        columns = {name: np.asarray(values[name], dtype=np.float64)[order] for name in fieldnames}
+        return cls(index, columns, layer.crs())
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, META_FILENAME), encoding='utf-8') as f:
+            meta = json.load(f)
+
+        def array(name):
+            return np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+
+        index = spatial_index.PointIndex(
+            array('fids'),
+            array('xs'),
+            array('ys'),
+            array('cells'),
+            tuple(meta['origin']),
+            meta['cell_size'],
+            tuple(meta['shape']),
+            0.0,
+            meta['signature'],
+        )
+        columns = {name: array(f'field_{i}') for i, name in enumerate(meta['fields'])}
+        return cls(index, columns, QgsCoordinateReferenceSystem.fromWkt(meta['crs']))
+
+    def save(self, path):
+        # 書き込み途中のキャッシュを読み込まないよう、一時ディレクトリに保存してから置き換える
+        tmp_path = path + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name in ('fids', 'xs', 'ys', 'cells'):
+            np.save(os.path.join(tmp_path, name + '.npy'), getattr(self.index, name))
+        fieldnames = list(self.columns)
+        for i, name in enumerate(fieldnames):
+            np.save(os.path.join(tmp_path, f'field_{i}.npy'), self.columns[name])
+        meta = {
+            'signature': self.index.signature,
+            'origin': list(self.index.origin),
+            'cell_size': self.index.cell_size,
+            'shape': list(self.index.shape),
+            'fields': fieldnames,
+            'crs': self.crs.toWkt(),
+        }
+        with open(os.path.join(tmp_path, META_FILENAME), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+
+    def query(self, rect):
+        """
+        矩形範囲に含まれる地物の位置を返す
+
+        Args:
+            rect(QgsRectangle): 検索範囲（キャッシュの座標系）
+
+        Returns:
+            numpy.ndarray: 位置（columnsの添字）
+        """
+        return self.index.query(rect)
+
+
+def building_store(layer, fieldnames, feedback=None):
+    """
+    建物ポイントのキャッシュを返す
+
+    セッション内で読み込み済みであればそれを返し、なければキャッシュファイルから読み込む。
+    キャッシュファイルもない場合や、データソースが更新されている場合は作成し直して保存する。
+    データソースを識別できないレイヤ（メモリレイヤや編集中のレイヤ）はNoneを返す。
+
+    Args:
+        layer(QgsVectorLayer): 建物ポイント
+        fieldnames(list): 保持するフィールド名
+        feedback(QgsFeedback): 作成時の進捗の通知先（省略可）
+
+    Returns:
+        BuildingStore
+    """
+    signature = cache.source_signature(layer)
+    if signature is None:
+        return None
+    _watch(layer)
+    loaded_store = _loaded_stores.get(layer.source())
+    if loaded_store is not None and loaded_store.signature == signature and list(loaded_store.columns) == fieldnames:
+        return loaded_store
+
+    # キャッシュはデータソースごとに1つとし、識別文字列が一致しない場合は作り直す
+    path = cache.cache_path(layer.source(), STORE_SUBDIR, '')
+    store = None
+    if os.path.exists(path):
+        try:
+            store = BuildingStore.load(path)
+        except (OSError, KeyError, ValueError):
+            store = None
+    if store is None or store.signature != signature or list(store.columns) != fieldnames:
+        # メモリマップで開いているファイルは置き換えられないため、古いキャッシュを閉じておく
+        store = loaded_store = None
+        _loaded_stores.pop(layer.source(), None)
+        store = BuildingStore.build(layer, fieldnames, signature, feedback)
+        if store is None:
+            return None
+        try:
+            store.save(path)
+        except OSError as e:
+            QgsMessageLog.logMessage(f'建物ポイントのキャッシュを保存できませんでした: {e}', 'DisasterWastePlugin',
+                                     Qgis.Warning)
+
+    _loaded_stores[layer.source()] = store
+    return store
+
+
+def _watch(layer):
+    """
+    レイヤのデータが変更・保存されたら、セッション内で読み込んだキャッシュを破棄する
+
+    次回参照時に識別文字列を確認し、ファイルが更新されていればキャッシュを作り直す。
+    LayerSnapshotは集計のたびに作成され、識別文字列を常に確認するため対象外とする。
+    """
+    if not isinstance(layer, QgsVectorLayer) or layer.id() in _watched_layers:
+        return
+    layer_id = layer.id()
+    source = layer.source()
+    _watched_layers.add(layer_id)
+    layer.dataChanged.connect(lambda source=source: _loaded_stores.pop(source, None))
+    layer.afterCommitChanges.connect(lambda source=source: _loaded_stores.pop(source, None))
+    layer.willBeDeleted.connect(lambda layer_id=layer_id: _watched_layers.discard(layer_id))
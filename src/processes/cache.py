@@ -0,0 +1,139 @@
+import hashlib
+import os
+
+from qgis.core import *
+
+CACHE_DIRNAME = 'disaster_waste_plugin'
+
+# データソースのファイルとともに更新日時を確認する付随ファイルの拡張子（属性のみの変更は.dbfだけが更新される）
+SIDECAR_EXTENSIONS = ('.dbf', '.shx', '.cpg', '.prj')
+
+# レイヤID -> データソースの識別文字列（レイヤのデータが変更されるまで再利用する）
+_signatures = {}
+# 変更のシグナルを接続済みのレイヤID
+_watched_layers = set()
+
+
+def cache_dir(*subdirs):
+    """
+    プラグインのキャッシュディレクトリを返す（存在しない場合は作成する）
+
+    Args:
+        subdirs(str): キャッシュディレクトリ配下のサブディレクトリ
+
+    Returns:
+        str: ディレクトリのパス
+    """
+    path = os.path.join(QgsApplication.qgisSettingsDirPath(), CACHE_DIRNAME, 'cache', *subdirs)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _related_files(path):
+    """
+    データソースを構成するファイルを返す
+
+    ディレクトリ（.gdbなど）の場合は配下のすべてのファイル、ファイルの場合はそのファイルと、
+    同名で拡張子の異なる付随ファイル（シェープファイルの属性の.dbfなど）・GeoPackageのWALファイル。
+    """
+    if os.path.isdir(path):
+        files = [path]
+        for dirpath, _, filenames in os.walk(path):
+            files.extend(os.path.join(dirpath, filename) for filename in filenames)
+        return files
+    stem = os.path.splitext(path)[0]
+    files = [path, path + '-wal']
+    files.extend(stem + extension for extension in SIDECAR_EXTENSIONS)
+    files.extend(stem + extension.upper() for extension in SIDECAR_EXTENSIONS)
+    return files
+
+
+def _files_version(path):
+    """データソースを構成するファイルの最新の更新日時と合計サイズ"""
+    mtimes = []
+    size = 0
+    for filename in _related_files(path):
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            continue
+        mtimes.append(stat.st_mtime)
+        size += stat.st_size
+    return max(mtimes), size
+
+
+def _clear_signature(layer_id):
+    _signatures.pop(layer_id, None)
+
+
+def _forget_layer(layer_id):
+    _signatures.pop(layer_id, None)
+    _watched_layers.discard(layer_id)
+
+
+def _compute_signature(layer):
+    uri = QgsProviderRegistry.instance().decodeUri(layer.providerType(), layer.source())
+    path = uri.get('path')
+    if not path or not os.path.exists(path):
+        return None
+    return '|'.join([
+        layer.source(),
+        repr(_files_version(path)),
+        str(layer.featureCount()),
+        layer.crs().authid(),
+    ])
+
+
+def source_signature(layer, refresh=False):
+    """
+    レイヤのデータソースを識別する文字列を返す
+
+    データソースのパス・ファイル（付随ファイルを含む）の更新日時とサイズ・地物数から作成するため、
+    ファイルが更新されると値が変わる。
+    ファイルに保存されていないレイヤや、未保存の編集があるレイヤはNoneを返す。
+    ディレクトリのデータソース（.gdbなど）は配下のファイルをすべて確認するため、
+    レイヤの識別文字列はレイヤのデータが変更される（dataChanged・dataSourceChanged）まで再利用し、
+    選択変更のたびにファイルを確認しない。
+    集計の実行時など、外部でのファイルの更新を確認する場合はrefreshをTrueにする
+    （LayerSnapshotは常に確認する）。
+
+    Args:
+        layer(QgsVectorLayer | LayerSnapshot): 対象レイヤ
+        refresh(bool): 再利用せずにファイルを確認する場合はTrue
+
+    Returns:
+        str: データソースの識別文字列
+    """
+    if layer.isModified():
+        return None
+    if not isinstance(layer, QgsMapLayer):
+        return _compute_signature(layer)
+
+    layer_id = layer.id()
+    if not refresh and layer_id in _signatures:
+        return _signatures[layer_id]
+    if layer_id not in _watched_layers:
+        _watched_layers.add(layer_id)
+        layer.dataChanged.connect(lambda layer_id=layer_id: _clear_signature(layer_id))
+        layer.dataSourceChanged.connect(lambda layer_id=layer_id: _clear_signature(layer_id))
+        layer.afterCommitChanges.connect(lambda layer_id=layer_id: _clear_signature(layer_id))
+        layer.willBeDeleted.connect(lambda layer_id=layer_id: _forget_layer(layer_id))
+    signature = _compute_signature(layer)
+    _signatures[layer_id] = signature
+    return signature
+
+
+def cache_path(key, subdir, suffix):
+    """
+    キーに対応するキャッシュファイルのパスを返す
+
+    Args:
+        key(str): キャッシュのキー（データソースの文字列など）
+        subdir(str): キャッシュの種類ごとのサブディレクトリ
+        suffix(str): ファイルの拡張子
+
+    Returns:
+        str: キャッシュファイルのパス
+    """
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir(subdir), digest + suffix)
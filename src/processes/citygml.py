@@ -0,0 +1,257 @@
+import glob
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from xml.etree import ElementTree
+
+from PyQt5.QtCore import *
+from qgis.core import *
+
+from . import building_points
+
+# 3D都市モデル（CityGML）の座標参照系（JGD2011 緯度経度）
+CITYGML_CRS = 'EPSG:6668'
+OUTPUT_LAYER_NAME = 'bldg'
+# 1回に書き込む地物数
+BATCH_SIZE = 5000
+# 並列に読み込むタイル数
+MAX_WORKERS = max(1, min(4, os.cpu_count() or 1))
+
+# 建物ポイントのフィールド（bldg.gdbと同じフィールド名, 型）
+FIELDS = [
+    ('gml_id', QVariant.String),
+    (building_points.BUILDING_ID_FIELD, QVariant.String),
+    (building_points.YEAR_FIELD, QVariant.Int),
+    (building_points.STOREYS_FIELD, QVariant.Int),
+    (building_points.FLOOR_AREA_FIELD, QVariant.Double),
+    (building_points.STRUCTURE_FIELD, QVariant.Int),
+]
+
+# 建物の属性（CityGMLの要素のローカル名 -> フィールド名, 型変換）
+# i-URの属性（uro:）はバージョンにより親要素が異なるため、ローカル名のみで判定する
+ATTRIBUTE_ELEMENTS = {
+    'buildingID': (building_points.BUILDING_ID_FIELD, str),
+    'yearOfConstruction': (building_points.YEAR_FIELD, int),
+    'storeysAboveGround': (building_points.STOREYS_FIELD, int),
+    'totalFloorArea': (building_points.FLOOR_AREA_FIELD, float),
+    'buildingStructureType': (building_points.STRUCTURE_FIELD, int),
+}
+# 代表点の算出に使用するジオメトリの要素（優先順）
+FOOTPRINT_ELEMENTS = ['lod0FootPrint', 'lod0RoofEdge', 'lod1Solid', 'lod2Solid']
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _ring_centroid(coordinates, dimension):
+    """
+    gml:posListの座標列（緯度, 経度[, 高さ]）から、リングの面積・重心・平均の高さを求める
+
+    Returns:
+        area(float): 面積（符号なし、経緯度の単位）
+        x(float): 重心の経度
+        y(float): 重心の緯度
+        z(float): 平均の高さ（2次元の場合は0）
+    """
+    # 桁落ちを防ぐため、最初の頂点からの相対座標で計算する
+    lat0 = coordinates[0]
+    lon0 = coordinates[1]
+    lats = [lat - lat0 for lat in coordinates[0::dimension]]
+    lons = [lon - lon0 for lon in coordinates[1::dimension]]
+    heights = coordinates[2::dimension] if dimension > 2 else [0.0]
+    z = sum(heights) / len(heights)
+    twice_area = 0.0
+    cx = 0.0
+    cy = 0.0
+    for i in range(len(lons) - 1):
+        cross = lons[i] * lats[i + 1] - lons[i + 1] * lats[i]
+        twice_area += cross
+        cx += (lons[i] + lons[i + 1]) * cross
+        cy += (lats[i] + lats[i + 1]) * cross
+    if twice_area == 0:
+        return 0.0, lon0 + sum(lons) / len(lons), lat0 + sum(lats) / len(lats), z
+    return abs(twice_area) / 2, lon0 + cx / (3 * twice_area), lat0 + cy / (3 * twice_area), z
+
+
+class _BuildingReader:
+    """
+    bldg:Building要素の開始から終了までのイベントを受け取り、属性と代表点を取り出す
+
+    代表点は、優先順の最も高いLODのジオメトリのうち、最も低い位置にある面（LOD1の場合は底面）の
+    重心とする。
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.footprint = None
+        self.footprint_rank = len(FOOTPRINT_ELEMENTS)
+        self.geometry_rank = None
+        self.dimension = 3
+
+    def start(self, name, element):
+        if name in FOOTPRINT_ELEMENTS:
+            self.geometry_rank = FOOTPRINT_ELEMENTS.index(name)
+        elif name == 'posList' and element.get('srsDimension'):
+            self.dimension = int(element.get('srsDimension'))
+
+    def end(self, name, element):
+        if name in ATTRIBUTE_ELEMENTS:
+            fieldname, convert = ATTRIBUTE_ELEMENTS[name]
+            if fieldname not in self.values and element.text:
+                try:
+                    self.values[fieldname] = convert(float(element.text) if convert is int else element.text.strip())
+                except ValueError:
+                    pass
+        elif name in FOOTPRINT_ELEMENTS:
+            self.geometry_rank = None
+        elif name == 'posList' and self.geometry_rank is not None and self.geometry_rank <= self.footprint_rank:
+            coordinates = [float(value) for value in element.text.split()]
+            if len(coordinates) >= 3 * self.dimension:
+                area, x, y, z = _ring_centroid(coordinates, self.dimension)
+                # 優先順の高いLOD、同じLODでは低い面、同じ高さでは広い面を代表とする
+                candidate = (self.geometry_rank, z, -area)
+                if self.footprint is None or candidate < self.footprint[0]:
+                    self.footprint = (candidate, x, y)
+                    self.footprint_rank = self.geometry_rank
+
+
+def iter_buildings(path):
+    """
+    CityGMLのタイルから建物を1件ずつ読み込む
+
+    ElementTree.iterparseで要素を順に読み込み、読み終えた要素は破棄するため、
+    タイル全体をDOMとして読み込むことはない。
+
+    Args:
+        path(str): CityGMLファイルのパス
+
+    Returns:
+        generator: (gml:id, 属性の辞書, 経度, 緯度)
+    """
+    root = None
+    reader = None
+    depth = 0
+    for event, element in ElementTree.iterparse(path, events=('start', 'end')):
+        name = _local_name(element.tag)
+        if root is None:
+            root = element
+        if event == 'start':
+            if reader is None and name == 'Building':
+                reader = _BuildingReader()
+                gml_id = next((value for key, value in element.attrib.items() if _local_name(key) == 'id'), None)
+                depth = 0
+            elif reader is not None:
+                depth += 1
+                reader.start(name, element)
+            continue
+
+        if reader is None:
+            if name == 'cityObjectMember':
+                # 読み終えた建物の要素をルートから切り離す
+                root.clear()
+            continue
+        if depth > 0:
+            reader.end(name, element)
+            depth -= 1
+            continue
+
+        if reader.footprint is not None:
+            _, x, y = reader.footprint
+            yield gml_id, reader.values, x, y
+        reader = None
+        element.clear()
+
+
+def output_fields():
+    fields = QgsFields()
+    for name, field_type in FIELDS:
+        fields.append(QgsField(name, field_type))
+    return fields
+
+
+def _read_tile(path, fields, batches, feedback):
+    """タイルの建物を地物にして、BATCH_SIZE件ずつキューに入れる"""
+    batch = []
+    for gml_id, values, x, y in iter_buildings(path):
+        if feedback is not None and feedback.isCanceled():
+            return
+        feature = QgsFeature(fields)
+        feature.setAttributes([gml_id] + [values.get(name, NULL) for name, _ in FIELDS[1:]])
+        feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
+        batch.append(feature)
+        if len(batch) >= BATCH_SIZE:
+            batches.put(batch)
+            batch = []
+    if batch:
+        batches.put(batch)
+
+
+def citygml_files(path):
+    """フォルダ配下のCityGMLファイル（*.gml）を返す（ファイルを指定した場合はそのファイル）"""
+    if os.path.isfile(path):
+        return [path]
+    return sorted(glob.glob(os.path.join(path, '**', '*.gml'), recursive=True))
+
+
+def ingest(paths, output_path, feedback=None, max_workers=MAX_WORKERS):
+    """
+    CityGMLのタイルから建物ポイントを作成し、GeoPackageに書き込む
+
+    タイルは複数のスレッドで並列に読み込み、書き込みは呼び出し元のスレッドでまとめて行う。
+    読み込んだ地物は上限のあるキューで受け渡すため、書き込みが追いつかない場合は読み込みが待機し、
+    使用するメモリはタイル数によらず一定となる。
+
+    Args:
+        paths(list): CityGMLファイルのパス
+        output_path(str): 出力するGeoPackageのパス
+        feedback(QgsFeedback): 進捗の通知先（省略可）
+        max_workers(int): 並列に読み込むタイル数
+
+    Returns:
+        int: 書き込んだ建物数
+    """
+    fields = output_fields()
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = 'GPKG'
+    options.layerName = OUTPUT_LAYER_NAME
+    writer = QgsVectorFileWriter.create(
+        output_path,
+        fields,
+        QgsWkbTypes.Point,
+        QgsCoordinateReferenceSystem(CITYGML_CRS),
+        QgsProject.instance().transformContext(),
+        options
+    )
+    if writer.hasError() != QgsVectorFileWriter.NoError:
+        raise QgsProcessingException(f'GeoPackageを作成できませんでした: {writer.errorMessage()}')
+
+    batches = queue.Queue(maxsize=max_workers * 2)
+    count = 0
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_read_tile, path, fields, batches, feedback) for path in paths]
+            done = 0
+            while done < len(futures):
+                try:
+                    batch = batches.get(timeout=0.1)
+                except queue.Empty:
+                    done = sum(future.done() for future in futures)
+                    if feedback is not None:
+                        feedback.setProgress(done * 100.0 / len(futures))
+                    continue
+                if feedback is None or not feedback.isCanceled():
+                    writer.addFeatures(batch, QgsFeatureSink.FastInsert)
+                    count += len(batch)
+            # 全タイルの読み込み後にキューに残った地物を書き込む
+            while not batches.empty():
+                batch = batches.get()
+                if feedback is None or not feedback.isCanceled():
+                    writer.addFeatures(batch, QgsFeatureSink.FastInsert)
+                    count += len(batch)
+            for future in futures:
+                # 読み込み中の例外を呼び出し元に伝える
+                future.result()
+    finally:
+        del writer
+    return count
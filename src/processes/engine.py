@@ -0,0 +1,619 @@
+from collections import namedtuple
+
+import numpy as np
+from PyQt5.QtCore import *
+from qgis.core import *
+
+from . import building_store, geometry_repair, spatial_index
+
+# 集計に使用する建物ポイントのフィールド
+BUILDING_FIELDS = ['T_Area', 'Flam_out', 'Noflam_out', 'Bld_Str', 'Cdst_Dmg', 'Hdst_Dmg', 'Prob_Burn', 'All_Out']
+
+# シナリオごとに値が異なる建物ポイントのフィールド（Bld_Str以外）
+SCENARIO_FIELDS = [name for name in BUILDING_FIELDS if name != 'Bld_Str']
+# シナリオ別のフィールド名の区切り（例：Cdst_Dmg__津波あり）
+SCENARIO_SEPARATOR = '__'
+# 区切りのないフィールド（T_Area等）のシナリオ
+BASE_SCENARIO = ''
+# 集計結果レイヤに記録するシナリオの一覧のプロパティ名
+SCENARIOS_PROPERTY = 'disaster_waste/scenarios'
+
+# 構造区分（Bld_Strの値）
+WOODEN = 601
+NON_WOODEN = 610
+# Bld_Strが0より大きい建物（構造区分を問わない）
+ANY_STRUCTURE = 'any'
+
+
+class BuildingMeasure(namedtuple('BuildingMeasure', ['name', 'field_type', 'precision', 'source', 'structure'])):
+    """
+    建物ポイントの集計項目の定義
+
+    name: 集計結果のフィールド名
+    field_type, precision: 集計結果のフィールドの型と精度
+    source: 合計する建物ポイントのフィールド名（Noneの場合は棟数）
+    structure: 対象とする構造区分（Bld_Strの値、ANY_STRUCTURE、またはNoneの場合は条件なし）
+    """
+
+
+# 建物ポイントの集計項目
+# 構造区分を条件とする項目は、Bld_StrがNULLの建物を含まない
+BUILDING_MEASURE_DEFINITIONS = [
+    BuildingMeasure('建物棟数（木造）', QVariant.LongLong, 0, None, WOODEN),
+    BuildingMeasure('建物棟数（非木造）', QVariant.LongLong, 0, None, NON_WOODEN),
+    BuildingMeasure('建物棟数（合計）', QVariant.LongLong, 0, None, ANY_STRUCTURE),
+    BuildingMeasure('建物被害想定（木造：全壊）', QVariant.Double, 1, 'Cdst_Dmg', WOODEN),
+    BuildingMeasure('建物被害想定（木造：半壊）', QVariant.Double, 1, 'Hdst_Dmg', WOODEN),
+    BuildingMeasure('建物被害想定（木造：焼失）', QVariant.Double, 1, 'Prob_Burn', WOODEN),
+    BuildingMeasure('建物被害想定（非木造：全壊）', QVariant.Double, 1, 'Cdst_Dmg', NON_WOODEN),
+    BuildingMeasure('建物被害想定（非木造：半壊）', QVariant.Double, 1, 'Hdst_Dmg', NON_WOODEN),
+    BuildingMeasure('建物被害想定（非木造：焼失）', QVariant.Double, 1, 'Prob_Burn', NON_WOODEN),
+    BuildingMeasure('建物被害想定（合計：全壊）', QVariant.Double, 1, 'Cdst_Dmg', None),
+    BuildingMeasure('建物被害想定（合計：半壊）', QVariant.Double, 1, 'Hdst_Dmg', None),
+    BuildingMeasure('建物被害想定（合計：焼失）', QVariant.Double, 1, 'Prob_Burn', None),
+    BuildingMeasure('災害廃棄物の発生量（可燃系）', QVariant.Double, 1, 'Flam_out', None),
+    BuildingMeasure('災害廃棄物の発生量（不燃系）', QVariant.Double, 1, 'Noflam_out', None),
+    BuildingMeasure('災害廃棄物の発生量（合計）', QVariant.Double, 1, 'All_Out', None),
+    BuildingMeasure('仮置場必要面積', QVariant.Double, 1, 'T_Area', None),
+]
+
+# 建物ポイントの集計項目（フィールド名, 型, 精度）
+BUILDING_MEASURES = [(measure.name, measure.field_type, measure.precision) for measure in BUILDING_MEASURE_DEFINITIONS]
+
+# 仮置場ポイントの集計項目（フィールド名, 型, 精度）
+TMP_STORAGE_MEASURES = [
+    ('仮置場名称', QVariant.String, 0),
+    ('仮置場概略有効面積', QVariant.Double, 1),
+]
+
+
+def scenario_fieldname(name, scenario):
+    """シナリオ別の建物ポイントのフィールド名を返す"""
+    if scenario == BASE_SCENARIO:
+        return name
+    return f'{name}{SCENARIO_SEPARATOR}{scenario}'
+
+
+def scenario_label(scenario):
+    """シナリオの表示名を返す"""
+    return scenario if scenario != BASE_SCENARIO else '基本'
+
+
+def building_scenarios(building_layer):
+    """
+    建物ポイントのフィールドからシナリオの一覧を返す
+
+    SCENARIO_FIELDSのすべてのフィールドがそろっているシナリオのみを返す。
+    区切りのないフィールドがそろっている場合は、BASE_SCENARIOを先頭とする。
+
+    Args:
+        building_layer(QgsVectorLayer): 建物ポイント
+
+    Returns:
+        list: シナリオ名
+    """
+    fieldnames = set(building_layer.fields().names())
+    suffixes = sorted({
+        name.split(SCENARIO_SEPARATOR, 1)[1] for name in fieldnames
+        if SCENARIO_SEPARATOR in name and name.split(SCENARIO_SEPARATOR, 1)[0] in SCENARIO_FIELDS
+    })
+    return [
+        scenario for scenario in [BASE_SCENARIO] + suffixes
+        if all(scenario_fieldname(name, scenario) in fieldnames for name in SCENARIO_FIELDS)
+    ]
+
+
+def scenario_building_fields(scenarios):
+    """シナリオの集計に必要な建物ポイントのフィールド名を返す"""
+    return ['Bld_Str'] + [scenario_fieldname(name, scenario) for scenario in scenarios for name in SCENARIO_FIELDS]
+
+
+def has_building_fields(building_layer):
+    """建物ポイントが集計に必要なフィールドを持っているか（1つ以上のシナリオのフィールドがそろっているか）"""
+    return 'Bld_Str' in building_layer.fields().names() and bool(building_scenarios(building_layer))
+
+
+def scenario_measure_name(name, scenario, scenarios):
+    """
+    集計結果レイヤにおけるシナリオ別の集計項目のフィールド名を返す
+
+    先頭のシナリオは集計項目名をそのまま使用し、2番目以降のシナリオは「シナリオ名：集計項目名」とする。
+    """
+    if not scenarios or scenario == scenarios[0]:
+        return name
+    return f'{scenario_label(scenario)}：{name}'
+
+
+def result_scenarios(aggregated_layer):
+    """
+    集計結果レイヤのシナリオの一覧を返す
+
+    Args:
+        aggregated_layer(QgsVectorLayer | QgsFeatureSource): 集計結果
+
+    Returns:
+        list: シナリオ名
+    """
+    if isinstance(aggregated_layer, QgsMapLayer) and aggregated_layer.customProperty(SCENARIOS_PROPERTY):
+        return [str(scenario) for scenario in aggregated_layer.customProperty(SCENARIOS_PROPERTY)]
+    # ファイルに出力した集計結果等、プロパティがない場合はフィールド名から求める
+    suffix = '：' + BUILDING_MEASURES[0][0]
+    return [BASE_SCENARIO] + [
+        name[:-len(suffix)] for name in aggregated_layer.fields().names() if name.endswith(suffix)
+    ]
+
+
+def measure_index(name):
+    """BUILDING_MEASURESにおける集計項目の位置を返す"""
+    return [measure[0] for measure in BUILDING_MEASURES].index(name)
+
+
+class PolygonLocator:
+    """
+    ポイントがどの集計ポリゴンに含まれるかを判定する
+
+    集計ポリゴンの空間インデックスと準備済みジオメトリを保持し、
+    qgis:intersection と同様に境界上のポイントも含めて判定する。
+    key_fieldにNoneを指定した場合は地物IDをキーとする。
+    repairにTrueを指定した場合は不正なジオメトリを修復してから判定する。
+    """
+
+    def __init__(self, polygon_layer, key_field='id', request=None, repair=False):
+        self.crs = polygon_layer.crs()
+        self.keys = []
+        self.geometries = []
+        self._index = QgsSpatialIndex()
+        self._engines = {}
+        self.bboxes = []
+        self.extent = QgsRectangle()
+        self.extent.setMinimal()
+
+        if request is None:
+            request = QgsFeatureRequest()
+        for feature in polygon_layer.getFeatures(request):
+            if repair:
+                geometry = geometry_repair.repaired_geometry(feature)
+            else:
+                geometry = feature.geometry()
+            if geometry.isEmpty():
+                continue
+            key = feature.id() if key_field is None else feature[key_field]
+            engine = QgsGeometry.createGeometryEngine(geometry.constGet())
+            engine.prepareGeometry()
+            self._engines[feature.id()] = (key, engine)
+            self._index.addFeature(feature.id(), geometry.boundingBox())
+            self.bboxes.append(geometry.boundingBox())
+            self.extent.combineExtentWith(geometry.boundingBox())
+            self.keys.append(key)
+            self.geometries.append(geometry)
+
+    def locate(self, geometry):
+        """
+        ジオメトリと交差する集計ポリゴンのキーを返す
+
+        Args:
+            geometry(QgsGeometry): 判定するジオメトリ
+
+        Returns:
+            list: 交差する集計ポリゴンのキー
+        """
+        keys = []
+        for fid in self._index.intersects(geometry.boundingBox()):
+            key, engine = self._engines[fid]
+            if engine.intersects(geometry.constGet()):
+                keys.append(key)
+        return keys
+
+    def request(self, layer, attributes):
+        """
+        集計ポリゴンの範囲内の地物を、集計ポリゴンの座標系で取得するリクエストを返す
+
+        レイヤの空間インデックスが利用できる場合は、集計ポリゴンごとの範囲に含まれる
+        候補地物のIDのみを取得対象とする
+
+        Args:
+            layer(QgsVectorLayer): 取得対象のレイヤ
+            attributes(list): 取得するフィールド名
+
+        Returns:
+            QgsFeatureRequest
+        """
+        request = QgsFeatureRequest()
+        request.setDestinationCrs(self.crs, QgsProject.instance().transformContext())
+        request.setSubsetOfAttributes(attributes, layer.fields())
+
+        index = spatial_index.point_index(layer)
+        if index is None:
+            request.setFilterRect(self.extent)
+            return request
+
+        transform = QgsCoordinateTransform(self.crs, layer.crs(), QgsProject.instance())
+        rects = [transform.transformBoundingBox(bbox) for bbox in self.bboxes]
+        request.setFilterFids(index.candidates(rects))
+        return request
+
+
+def _number(value):
+    """NULLを除いた数値を返す（NULLの場合はNone）"""
+    if value is None or value == NULL:
+        return None
+    return value
+
+
+class MeasureEvaluator:
+    """
+    建物ポイントの集計項目をまとめて計算する
+
+    建物ポイントは集計ポリゴンのキーとBld_Strの値ごとのグループに振り分け、
+    グループごとに棟数と集計項目が参照するフィールドの合計のみを求める。
+    集計項目の値は、最後にグループの合計を構造区分の条件に応じて足し合わせて求める。
+    集計項目を追加する場合は、BUILDING_MEASURE_DEFINITIONSに定義を追加すればよい。
+    複数のシナリオを指定した場合は、グループへの振り分けを1回で行い、シナリオ別のフィールドをまとめて合計する。
+    """
+
+    def __init__(self, measures=BUILDING_MEASURE_DEFINITIONS, scenarios=(BASE_SCENARIO,)):
+        self.measures = measures
+        self.scenarios = list(scenarios)
+        # 合計するフィールド（シナリオ別のフィールド名）
+        sources = sorted({measure.source for measure in measures if measure.source is not None})
+        self.fields = [scenario_fieldname(name, scenario) for scenario in self.scenarios for name in sources]
+        self._field_indexes = {name: i for i, name in enumerate(self.fields)}
+        # キー -> Bld_Strの値（NULLはNone） -> [棟数, フィールドごとの合計]
+        self._groups = {}
+
+    def _group(self, key, bld_str):
+        key_groups = self._groups.setdefault(key, {})
+        group = key_groups.get(bld_str)
+        if group is None:
+            group = key_groups[bld_str] = [0, [0] * len(self.fields)]
+        return group
+
+    def add(self, key, feature):
+        """
+        建物ポイント1件を集計する
+
+        Args:
+            key: 集計ポリゴンのキー
+            feature(QgsFeature): 建物ポイント
+        """
+        group = self._group(key, _number(feature['Bld_Str']))
+        group[0] += 1
+        sums = group[1]
+        for i, name in enumerate(self.fields):
+            value = _number(feature[name])
+            if value is not None:
+                sums[i] += value
+
+    def add_columns(self, key, columns):
+        """
+        建物ポイントの属性の配列をまとめて集計する
+
+        Args:
+            key: 集計ポリゴンのキー
+            columns(dict): フィールド名をキーとした属性の配列（NULLはNaN）
+        """
+        bld_str = np.asarray(columns['Bld_Str'])
+        is_null = np.isnan(bld_str)
+        values = [np.asarray(columns[name]) for name in self.fields]
+
+        if is_null.any():
+            group = self._group(key, None)
+            group[0] += int(is_null.sum())
+            for i, column in enumerate(values):
+                group[1][i] += float(np.nansum(column[is_null]))
+
+        classes, inverse = np.unique(bld_str[~is_null], return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(classes))
+        sums = [
+            np.bincount(inverse, weights=np.nan_to_num(column[~is_null]), minlength=len(classes))
+            for column in values
+        ]
+        for j, bld in enumerate(classes):
+            group = self._group(key, float(bld))
+            group[0] += int(counts[j])
+            for i in range(len(self.fields)):
+                group[1][i] += float(sums[i][j])
+
+    @staticmethod
+    def _matches(structure, bld_str):
+        if structure is None:
+            return True
+        if bld_str is None:
+            return False
+        if structure == ANY_STRUCTURE:
+            return bld_str > 0
+        return bld_str == structure
+
+    def results(self, scenario=None):
+        """
+        集計値を返す
+
+        Args:
+            scenario(str): シナリオ（省略時は先頭のシナリオ）
+
+        Returns:
+            dict: 集計ポリゴンのキーをキーとした、measuresと同じ並びの合計値
+        """
+        if scenario is None:
+            scenario = self.scenarios[0]
+        results = {}
+        for key, key_groups in self._groups.items():
+            values = []
+            for measure in self.measures:
+                total = 0
+                for bld_str, (count, sums) in key_groups.items():
+                    if not self._matches(measure.structure, bld_str):
+                        continue
+                    if measure.source is None:
+                        total += count
+                    else:
+                        total += sums[self._field_indexes[scenario_fieldname(measure.source, scenario)]]
+                values.append(total)
+            results[key] = values
+        return results
+
+    def scenario_results(self):
+        """シナリオ名をキーとしたresultsの戻り値を返す"""
+        return {scenario: self.results(scenario) for scenario in self.scenarios}
+
+
+def _iterate(layer, request, feedback):
+    """
+    リクエストに合致する地物を返す（feedbackが指定されている場合は進捗の更新とキャンセルの確認を行う）
+    """
+    if feedback is None:
+        yield from layer.getFeatures(request)
+        return
+
+    fids = request.filterFids()
+    total = len(fids) if fids else layer.featureCount()
+    step = 100.0 / total if total > 0 else 0
+    for current, feature in enumerate(layer.getFeatures(request)):
+        if feedback.isCanceled():
+            return
+        if current % 1000 == 0:
+            feedback.setProgress(min(current * step, 100))
+        yield feature
+    feedback.setProgress(100)
+
+
+def points_in_polygon(xs, ys, geometry):
+    """
+    ポイントがポリゴンに含まれるかを配列でまとめて判定する（境界上のポイントも含む）
+
+    全パート・全リングの辺について交差数の偶奇で判定するため、穴のあるポリゴンにも対応する。
+
+    Args:
+        xs(numpy.ndarray): X座標
+        ys(numpy.ndarray): Y座標
+        geometry(QgsGeometry): ポリゴン（ポイントと同じ座標系）
+
+    Returns:
+        numpy.ndarray: 判定結果（bool）
+    """
+    inside = np.zeros(len(xs), dtype=bool)
+    on_edge = np.zeros(len(xs), dtype=bool)
+    polygons = geometry.asMultiPolygon() if geometry.isMultipart() else [geometry.asPolygon()]
+    for polygon in polygons:
+        for ring in polygon:
+            vertices = np.array([(point.x(), point.y()) for point in ring], dtype=np.float64)
+            for (x1, y1), (x2, y2) in zip(vertices[:-1], vertices[1:]):
+                crosses = (y1 > ys) != (y2 > ys)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    x_cross = x1 + (ys - y1) * (x2 - x1) / (y2 - y1)
+                inside ^= crosses & (xs < x_cross)
+
+                # 辺上のポイント（外積が0で、辺の範囲内にある）
+                cross = (x2 - x1) * (ys - y1) - (y2 - y1) * (xs - x1)
+                tolerance = 1e-9 * max(abs(x2 - x1) + abs(y2 - y1), 1.0)
+                on_edge |= (
+                    (np.abs(cross) <= tolerance)
+                    & (xs >= min(x1, x2)) & (xs <= max(x1, x2))
+                    & (ys >= min(y1, y2)) & (ys <= max(y1, y2))
+                )
+    return inside | on_edge
+
+
+def aggregate_buildings_columnar(store, locator, feedback=None, scenarios=(BASE_SCENARIO,)):
+    """
+    建物ポイントのキャッシュ（BuildingStore）から、集計ポリゴンごとの集計値を配列演算で求める
+
+    Args:
+        store(BuildingStore): 建物ポイントのキャッシュ
+        locator(PolygonLocator): 集計ポリゴンの判定器
+        feedback(QgsFeedback): 進捗の通知先（省略可）
+        scenarios(list): シナリオ
+
+    Returns:
+        MeasureEvaluator: 集計済みの評価器
+    """
+    transform = QgsCoordinateTransform(locator.crs, store.crs, QgsProject.instance())
+    evaluator = MeasureEvaluator(scenarios=scenarios)
+    total = len(locator.keys)
+    for current, (key, geometry) in enumerate(zip(locator.keys, locator.geometries)):
+        if feedback is not None:
+            if feedback.isCanceled():
+                return evaluator
+            feedback.setProgress(current * 100.0 / total)
+
+        geometry = QgsGeometry(geometry)
+        geometry.transform(transform)
+        positions = store.query(geometry.boundingBox())
+        if len(positions) == 0:
+            continue
+        positions = positions[points_in_polygon(store.index.xs[positions], store.index.ys[positions], geometry)]
+        if len(positions) == 0:
+            continue
+
+        evaluator.add_columns(key, {name: column[positions] for name, column in store.columns.items()})
+    if feedback is not None:
+        feedback.setProgress(100)
+    return evaluator
+
+
+def aggregate_building_scenarios(building_layer, locator, scenarios, feedback=None):
+    """
+    建物ポイントを1回走査し、シナリオごと・集計ポリゴンごとの集計値を求める
+
+    建物ポイントの読み込みと集計ポリゴンの判定はシナリオ数によらず1回のみ行う。
+
+    Args:
+        building_layer(QgsVectorLayer): 建物ポイント
+        locator(PolygonLocator): 集計ポリゴンの判定器
+        scenarios(list): シナリオ（building_scenariosの戻り値）
+        feedback(QgsFeedback): 進捗の通知先（省略可）
+
+    Returns:
+        dict: シナリオ名をキーとした、aggregate_buildingsの戻り値と同じ形式の集計値
+    """
+    fieldnames = scenario_building_fields(scenarios)
+
+    # 建物ポイントのキャッシュを使用する設定の場合は、キャッシュから配列演算で集計する
+    if building_store.enabled():
+        store = building_store.building_store(building_layer, fieldnames)
+        if store is not None:
+            return aggregate_buildings_columnar(store, locator, feedback, scenarios).scenario_results()
+
+    evaluator = MeasureEvaluator(scenarios=scenarios)
+    request = locator.request(building_layer, fieldnames)
+    for feature in _iterate(building_layer, request, feedback):
+        for key in locator.locate(feature.geometry()):
+            evaluator.add(key, feature)
+    return evaluator.scenario_results()
+
+
+def aggregate_buildings(building_layer, locator, feedback=None):
+    """
+    建物ポイントを1回走査し、集計ポリゴンごとの集計値を求める（先頭のシナリオのみ）
+
+    Args:
+        building_layer(QgsVectorLayer): 建物ポイント
+        locator(PolygonLocator): 集計ポリゴンの判定器
+        feedback(QgsFeedback): 進捗の通知先（省略可）
+
+    Returns:
+        dict: 集計ポリゴンのキーをキーとした、BUILDING_MEASURESと同じ並びの合計値
+    """
+    scenario = building_scenarios(building_layer)[0]
+    return aggregate_building_scenarios(building_layer, locator, [scenario], feedback)[scenario]
+
+
+def aggregate_tmp_storages(
+        tmp_storage_layer,
+        tmp_storage_name_fieldname,
+        tmp_storage_area_fieldname,
+        locator,
+        feedback=None
+        ):
+    """
+    仮置場ポイントを1回走査し、集計ポリゴンごとの名称と概略有効面積を求める
+
+    Args:
+        tmp_storage_layer(QgsVectorLayer): 仮置場ポイント
+        tmp_storage_name_fieldname(str): 仮置場名称のフィールド名
+        tmp_storage_area_fieldname(str): 概略有効面積のフィールド名
+        locator(PolygonLocator): 集計ポリゴンの判定器
+        feedback(QgsFeedback): 進捗の通知先（省略可）
+
+    Returns:
+        dict: 集計ポリゴンのキーをキーとした[仮置場名称（カンマ区切り）, 概略有効面積の合計]
+    """
+    names = {}
+    areas = {}
+    request = locator.request(tmp_storage_layer, [tmp_storage_name_fieldname, tmp_storage_area_fieldname])
+    for feature in _iterate(tmp_storage_layer, request, feedback):
+        keys = locator.locate(feature.geometry())
+        if not keys:
+            continue
+        name = _number(feature[tmp_storage_name_fieldname])
+        area = _number(feature[tmp_storage_area_fieldname])
+        for key in keys:
+            key_names = names.setdefault(key, [])
+            areas.setdefault(key, 0)
+            if name is not None:
+                key_names.append(str(name))
+            if area is not None:
+                areas[key] += area
+    return {key: [','.join(names[key]), areas[key]] for key in names}
+
+
+def result_fields(aggregate_name_field, scenarios=None):
+    """
+    集計結果レイヤのフィールドを返す
+
+    2番目以降のシナリオの集計項目は、仮置場の項目の後ろにシナリオごとに並べる。
+
+    Args:
+        aggregate_name_field(str): 集計ポリゴンの名称フィールド
+        scenarios(list): シナリオ（省略時は1シナリオ）
+
+    Returns:
+        QgsFields
+    """
+    scenarios = scenarios or [BASE_SCENARIO]
+    measures = BUILDING_MEASURES + TMP_STORAGE_MEASURES
+    for scenario in scenarios[1:]:
+        measures = measures + [
+            (scenario_measure_name(name, scenario, scenarios), field_type, precision)
+            for name, field_type, precision in BUILDING_MEASURES
+        ]
+
+    fields = QgsFields()
+    fields.append(QgsField(aggregate_name_field, QVariant.String))
+    fields.append(QgsField("面積", QVariant.Double, len=20, prec=1))
+    for name, field_type, precision in measures:
+        length = 0 if field_type == QVariant.String else 20
+        fields.append(QgsField(name, field_type, len=length, prec=precision))
+    return fields
+
+
+def create_result_layer(aggregate_polygon, aggregate_name_field, building_sums, tmp_storage_sums, scenario_sums=None):
+    """
+    集計値から集計結果レイヤを作成する
+
+    集計値のない集計ポリゴンの項目はNULLとする。
+    小数の項目は地物の作成時に小数第1位に端数処理する。
+
+    Args:
+        aggregate_polygon(QgsVectorLayer): 選択地物の一時レイヤ
+        aggregate_name_field(str): 集計ポリゴンの名称フィールド
+        building_sums(dict): aggregate_buildingsの戻り値
+        tmp_storage_sums(dict): aggregate_tmp_storagesの戻り値
+        scenario_sums(dict): 複数シナリオの場合の、シナリオ名をキーとした建物ポイントの集計値（省略可）。
+                             先頭のシナリオの集計値はbuilding_sumsと同じとする
+
+    Returns:
+        QgsVectorLayer: 集計結果のレイヤ
+    """
+    scenarios = list(scenario_sums) if scenario_sums else [BASE_SCENARIO]
+    fields = result_fields(aggregate_name_field, scenarios)
+    vlyr = QgsMemoryProviderUtils.createMemoryLayer(
+        '集計結果', fields, aggregate_polygon.wkbType(), aggregate_polygon.crs())
+    vlyr.setCustomProperty(SCENARIOS_PROPERTY, scenarios)
+
+    # 端数処理を行うフィールドの位置（「面積」と小数の集計項目）
+    round_indexes = [i for i, field in enumerate(fields) if field.type() == QVariant.Double]
+
+    empty_buildings = [NULL] * len(BUILDING_MEASURES)
+    empty_tmp_storages = [NULL] * len(TMP_STORAGE_MEASURES)
+    features = []
+    for ftr in aggregate_polygon.getFeatures():
+        key = ftr['id']
+        attributes = (
+            [ftr[aggregate_name_field], ftr['面積']]
+            + building_sums.get(key, empty_buildings)
+            + tmp_storage_sums.get(key, empty_tmp_storages)
+        )
+        for scenario in scenarios[1:]:
+            attributes += scenario_sums[scenario].get(key, empty_buildings)
+        for i in round_indexes:
+            if attributes[i] != NULL:
+                attributes[i] = round(attributes[i], 1)
+        qgs_feature = QgsFeature(fields)
+        qgs_feature.setAttributes(attributes)
+        qgs_feature.setGeometry(ftr.geometry())
+        features.append(qgs_feature)
+    vlyr.dataProvider().addFeatures(features)
+    vlyr.updateExtents()
+
+    return vlyr
@@ -0,0 +1,259 @@
+import os
+import re
+from collections import namedtuple
+
+from PyQt5.QtCore import *
+from qgis.core import *
+
+from . import engine
+from .task import LayerSnapshot
+
+# 1回に書き込む地物数
+CHUNK_SIZE = 2000
+# ファイル名に使用できない文字
+INVALID_FILENAME_CHARS = r'[\\/:*?"<>|]'
+
+# 実行中のタスク（完了前にPythonのオブジェクトが破棄されないよう保持する）
+_running_tasks = set()
+
+
+class ExportFormat(namedtuple('ExportFormat', ['key', 'label', 'driver', 'extension', 'encoding', 'geometry', 'multi_layer'])):
+    """
+    出力形式
+
+    key: 識別子
+    label: 画面に表示する名称
+    driver: OGRのドライバ名
+    extension: ファイルの拡張子
+    encoding: 文字コード
+    geometry: ジオメトリを出力するか
+    multi_layer: 1つのファイルに複数のレイヤを出力できるか
+    """
+
+
+FORMATS = [
+    ExportFormat('csv_sjis', 'CSV（Shift_JIS）', 'CSV', '.csv', 'shift-jis', False, False),
+    ExportFormat('csv_utf8', 'CSV（UTF-8）', 'CSV', '.csv', 'UTF-8', False, False),
+    ExportFormat('gpkg', 'GeoPackage', 'GPKG', '.gpkg', 'UTF-8', True, True),
+    ExportFormat('fgb', 'FlatGeobuf', 'FlatGeobuf', '.fgb', 'UTF-8', True, False),
+    ExportFormat('parquet', 'GeoParquet', 'Parquet', '.parquet', 'UTF-8', True, False),
+]
+
+
+def available_formats():
+    """
+    QGIS（GDAL）で出力できる形式を返す
+
+    GeoParquetはGDAL 3.5以降でParquetドライバが有効な場合のみ出力できる。
+
+    Returns:
+        list: ExportFormat
+    """
+    drivers = {driver.driverName for driver in QgsVectorFileWriter.ogrDriverList()}
+    return [export_format for export_format in FORMATS if export_format.driver in drivers]
+
+
+def format_by_key(key):
+    return next(export_format for export_format in FORMATS if export_format.key == key)
+
+
+def safe_filename(name):
+    """レイヤ名をファイル名に使用できる文字列にする"""
+    return re.sub(INVALID_FILENAME_CHARS, '_', name).strip() or 'layer'
+
+
+def unique_names(names):
+    """同名のものに連番をつけて、重複しない名前にする"""
+    result = []
+    used = set()
+    for name in names:
+        candidate = name
+        number = 2
+        while candidate in used:
+            candidate = f'{name}_{number}'
+            number += 1
+        used.add(candidate)
+        result.append(candidate)
+    return result
+
+
+def write_features(source, path, export_format, layer_name=None, feedback=None, append=False,
+                   chunk_size=CHUNK_SIZE):
+    """
+    レイヤ（またはLayerSnapshot）の地物をCHUNK_SIZE件ずつ読み込みながらファイルに書き込む
+
+    地物を一度にメモリへ読み込んだり、出力用のレイヤを作成したりしないため、
+    地物数によらず使用するメモリは一定となる。
+    ファイルがすでに存在する場合は上書きする（複数レイヤを出力できる形式でappendがTrueの場合は、
+    レイヤを追加し、同名のレイヤのみ上書きする）。
+
+    Args:
+        source(QgsVectorLayer | LayerSnapshot): 出力する地物の読み込み元
+        path(str): 出力先のパス
+        export_format(ExportFormat): 出力形式
+        layer_name(str): 複数レイヤを出力できる形式のレイヤ名（省略時はsourceのレイヤ名）
+        feedback(QgsFeedback): 進捗の通知先（省略可）
+        append(bool): 既存のファイルにレイヤを追加する場合はTrue
+        chunk_size(int): 1回に書き込む地物数
+
+    Returns:
+        int: 書き込んだ地物数
+    """
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = export_format.driver
+    options.fileEncoding = export_format.encoding
+    if export_format.multi_layer:
+        options.layerName = layer_name or source.name()
+        if append and os.path.exists(path):
+            options.actionOnExistingFile = QgsVectorFileWriter.CreateOrOverwriteLayer
+    wkb_type = source.wkbType() if export_format.geometry else QgsWkbTypes.NoGeometry
+    writer = QgsVectorFileWriter.create(
+        path,
+        source.fields(),
+        wkb_type,
+        source.crs(),
+        QgsProject.instance().transformContext(),
+        options
+    )
+    if writer.hasError() != QgsVectorFileWriter.NoError:
+        raise QgsProcessingException(f'{path}を作成できませんでした: {writer.errorMessage()}')
+
+    request = QgsFeatureRequest()
+    if not export_format.geometry:
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+    total = source.featureCount()
+    count = 0
+    chunk = []
+    try:
+        for feature in source.getFeatures(request):
+            if feedback is not None and feedback.isCanceled():
+                break
+            chunk.append(feature)
+            if len(chunk) >= chunk_size:
+                writer.addFeatures(chunk, QgsFeatureSink.FastInsert)
+                count += len(chunk)
+                chunk = []
+                if feedback is not None and total > 0:
+                    feedback.setProgress(count * 100.0 / total)
+        if chunk and not (feedback is not None and feedback.isCanceled()):
+            writer.addFeatures(chunk, QgsFeatureSink.FastInsert)
+            count += len(chunk)
+    finally:
+        del writer
+    return count
+
+
+def output_paths(names, output_path, export_format):
+    """
+    出力するレイヤごとの出力先のパスを返す
+
+    複数レイヤを出力できる形式、または1レイヤのみの場合はoutput_pathをファイルとし、
+    それ以外の場合はoutput_pathをフォルダとしてレイヤ名のファイルに出力する。
+
+    Args:
+        names(list): レイヤ名
+        output_path(str): 出力先のファイルまたはフォルダのパス
+        export_format(ExportFormat): 出力形式
+
+    Returns:
+        list: レイヤごとの出力先のパス
+    """
+    if export_format.multi_layer or len(names) == 1:
+        path = output_path
+        if not path.lower().endswith(export_format.extension):
+            path += export_format.extension
+        return [path] * len(names)
+
+    return [
+        os.path.join(output_path, filename + export_format.extension)
+        for filename in unique_names([safe_filename(name) for name in names])
+    ]
+
+
+class ExportTask(QgsTask):
+    """
+    複数のレイヤ（集計結果・集計サマリー等）をバックグラウンドでファイルに出力するタスク
+
+    レイヤはメインスレッドでLayerSnapshotにしておき、バックグラウンドスレッドで
+    地物を読み込みながら書き込む。
+    """
+
+    def __init__(self, layers, output_path, export_format, on_finished=None):
+        """
+        Args:
+            layers(list): (レイヤ, 出力するレイヤ名) のリスト
+            output_path(str): 出力先のファイルまたはフォルダのパス（output_pathsを参照）
+            export_format(ExportFormat): 出力形式
+            on_finished(callable): 出力後に出力したファイルのパスのリスト（失敗した場合はNone）と
+                                   エラーメッセージを渡して呼び出す関数（省略可）
+        """
+        super().__init__(f'{export_format.label}出力', QgsTask.CanCancel)
+        names = unique_names([name for _, name in layers])
+        self.sources = [(LayerSnapshot(layer), name) for (layer, _), name in zip(layers, names)]
+        self.export_format = export_format
+        self.paths = output_paths(names, output_path, export_format)
+        self.on_finished = on_finished
+        self.exception = None
+        # 出力中のレイヤの位置（全体の進捗の計算に使用する）
+        self.current = 0
+        self.feedback = QgsFeedback()
+        self.feedback.progressChanged.connect(
+            lambda progress: self.setProgress((self.current + progress / 100) * 100 / len(self.sources)))
+
+    def cancel(self):
+        self.feedback.cancel()
+        super().cancel()
+
+    def run(self):
+        try:
+            if not self.export_format.multi_layer and len(self.sources) > 1:
+                os.makedirs(os.path.dirname(self.paths[0]), exist_ok=True)
+            for i, ((source, name), path) in enumerate(zip(self.sources, self.paths)):
+                self.current = i
+                # 1つのファイルに複数のレイヤを出力する場合は、2つ目以降のレイヤを追加する
+                write_features(source, path, self.export_format, name, self.feedback, append=i > 0)
+                if self.isCanceled():
+                    return False
+            return True
+        except Exception as e:
+            self.exception = e
+            return False
+
+    def finished(self, result):
+        error = ''
+        if self.exception is not None:
+            error = str(self.exception)
+            QgsMessageLog.logMessage(f'ファイル出力でエラーが発生しました: {error}', 'DisasterWastePlugin',
+                                     Qgis.Critical)
+        _running_tasks.discard(self)
+        if self.on_finished is not None:
+            self.on_finished(sorted(set(self.paths)) if result else None, error)
+
+
+def export_layers(layers, output_path, export_format, on_finished=None):
+    """
+    レイヤのファイル出力をバックグラウンドで開始する
+
+    Args:
+        ExportTaskと同じ
+
+    Returns:
+        ExportTask: 開始したタスク
+    """
+    task = ExportTask(layers, output_path, export_format, on_finished)
+    _running_tasks.add(task)
+    QgsApplication.taskManager().addTask(task)
+    return task
+
+
+def result_layers():
+    """
+    プロジェクト内の集計結果のレイヤ（engine.create_result_layerで作成したレイヤ）を返す
+
+    Returns:
+        list: QgsVectorLayer
+    """
+    return [
+        layer for layer in QgsProject.instance().mapLayers().values()
+        if isinstance(layer, QgsVectorLayer) and layer.customProperty(engine.SCENARIOS_PROPERTY)
+    ]
@@ -0,0 +1,100 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from qgis.core import *
+
+# 検証結果を保持する地物数の上限（超えた場合は古いものから破棄する）
+MAX_CACHED_FEATURES = 20000
+
+# (地物ID, ジオメトリのハッシュ) -> (エラーメッセージのリスト, 修復後のジオメトリ)
+_checked_geometries = OrderedDict()
+# 集計処理はバックグラウンドスレッドからも参照するため、排他制御する
+_lock = threading.Lock()
+
+
+def repair_geometry(geometry):
+    """
+    不正なジオメトリを修復する（native:fixgeometriesと同じ処理）
+
+    Args:
+        geometry(QgsGeometry): 集計ポリゴンのジオメトリ
+
+    Returns:
+        QgsGeometry: 修復後のジオメトリ（正しいジオメトリの場合はそのまま）
+    """
+    if geometry.isNull() or geometry.isGeosValid():
+        return geometry
+    return _make_valid(geometry)
+
+
+def _make_valid(geometry):
+    repaired = geometry.makeValid()
+    if QgsWkbTypes.flatType(repaired.wkbType()) in (QgsWkbTypes.Unknown, QgsWkbTypes.GeometryCollection):
+        repaired.convertGeometryCollectionToSubclass(QgsWkbTypes.PolygonGeometry)
+    repaired.convertToMultiType()
+    return repaired
+
+
+def _geometry_key(feature):
+    """地物IDとジオメトリのハッシュからキャッシュのキーを作成する"""
+    wkb = bytes(feature.geometry().asWkb())
+    return feature.id(), hashlib.sha1(wkb).hexdigest()
+
+
+def check_geometry(feature):
+    """
+    地物のジオメトリを検証し、不正な場合は修復する
+
+    結果は地物IDとジオメトリのハッシュをキーとして保持し、
+    同じジオメトリの地物は2回目以降GEOSによる検証・修復を行わない。
+
+    Args:
+        feature(QgsFeature): 集計ポリゴンの地物
+
+    Returns:
+        errors(list): ジオメトリのエラーメッセージ（正しいジオメトリの場合は空）
+        geometry(QgsGeometry): 修復後のジオメトリ（正しいジオメトリの場合はそのまま）
+    """
+    geometry = feature.geometry()
+    if geometry.isNull():
+        return [], geometry
+
+    key = _geometry_key(feature)
+    with _lock:
+        checked = _checked_geometries.get(key)
+        if checked is not None:
+            _checked_geometries.move_to_end(key)
+            return checked
+
+    errors = [error.what() for error in geometry.validateGeometry(QgsGeometry.ValidatorGeos)]
+    checked = (errors, _make_valid(geometry) if errors else geometry)
+
+    with _lock:
+        _checked_geometries[key] = checked
+        while len(_checked_geometries) > MAX_CACHED_FEATURES:
+            _checked_geometries.popitem(last=False)
+    return checked
+
+
+def repaired_geometry(feature):
+    """地物の修復後のジオメトリを返す（check_geometryの結果を再利用する）"""
+    return check_geometry(feature)[1]
+
+
+def invalid_features(features):
+    """
+    不正なジオメトリの地物をまとめて返す
+
+    Args:
+        features(iterable): 集計ポリゴンの地物
+
+    Returns:
+        list: (地物, エラーメッセージのリスト) のリスト
+    """
+    invalid = []
+    for feature in features:
+        errors, _ = check_geometry(feature)
+        if errors:
+            invalid.append((feature, errors))
+    return invalid
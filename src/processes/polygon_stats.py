@@ -0,0 +1,268 @@
+import threading
+
+from qgis.core import *
+
+from . import cache, engine
+
+# 作成済みの集計値テーブル（計算条件 -> PolygonStatistics）
+_statistics_tables = {}
+
+
+class PolygonStatistics:
+    """
+    集計ポリゴンレイヤの全ポリゴンについて、建物ポイント・仮置場ポイントの集計値を保持する
+
+    集計値は地物IDをキーとして保持する。集計ポリゴンの地物が追加・削除された場合や
+    ジオメトリが変更された場合はその地物の集計値を、建物ポイント・仮置場ポイントが
+    変更された場合はすべての集計値を破棄し、次回参照時に計算し直す。
+    """
+
+    def __init__(
+            self,
+            aggregate_layer,
+            building_layer,
+            tmp_storage_layer,
+            tmp_storage_name_fieldname,
+            tmp_storage_area_fieldname,
+    ):
+        self.aggregate_layer = aggregate_layer
+        self.building_layer = building_layer
+        self.tmp_storage_layer = tmp_storage_layer
+        self.tmp_storage_name_fieldname = tmp_storage_name_fieldname
+        self.tmp_storage_area_fieldname = tmp_storage_area_fieldname
+        # 建物ポイントのシナリオ（engine.building_scenarios）
+        self.scenarios = engine.building_scenarios(building_layer)
+        # 地物ID -> シナリオ名 -> BUILDING_MEASURESと同じ並びの合計値
+        self.building = {}
+        # 地物ID -> [仮置場名称（カンマ区切り）, 概略有効面積の合計]
+        self.tmp_storage = {}
+        # 集計値を計算済みの地物ID（集計値がない地物を含む）
+        self.computed = set()
+        # 集計値を破棄するたびに増やす（計算中に破棄された場合に古い集計値を保存しないため）
+        self.generation = 0
+        # 計算中の地物ID（同じ地物の集計値を複数のスレッドで重複して計算しないため）
+        self.pending = set()
+        # 集計処理（バックグラウンドスレッド）と選択中の集計（メインスレッド）から参照するため、排他制御する
+        self._lock = threading.Condition()
+        self.source_versions = self._source_versions()
+
+        self.aggregate_layer.featureAdded.connect(self.invalidate_feature)
+        self.aggregate_layer.featureDeleted.connect(self.invalidate_feature)
+        self.aggregate_layer.geometryChanged.connect(self.invalidate_feature)
+        self.building_layer.dataChanged.connect(self.invalidate)
+        self.tmp_storage_layer.dataChanged.connect(self.invalidate)
+
+    def _source_versions(self, sources=None):
+        _, building_layer, tmp_storage_layer = sources or self.layers()
+        return (
+            cache.source_signature(building_layer),
+            cache.source_signature(tmp_storage_layer),
+        )
+
+    def layers(self):
+        return self.aggregate_layer, self.building_layer, self.tmp_storage_layer
+
+    def invalidate_feature(self, fid, *args):
+        """集計ポリゴン1件の集計値を破棄する"""
+        with self._lock:
+            self.generation += 1
+            self.building.pop(fid, None)
+            self.tmp_storage.pop(fid, None)
+            self.computed.discard(fid)
+
+    def invalidate(self):
+        """すべての集計値を破棄する"""
+        with self._lock:
+            self._invalidate()
+
+    def _invalidate(self):
+        self.generation += 1
+        self.building = {}
+        self.tmp_storage = {}
+        self.computed = set()
+
+    def ensure(self, fids=None, feedback=None, sources=None, wait=True):
+        """
+        未計算の集計ポリゴンの集計値を、建物ポイント・仮置場ポイントの1回の走査でまとめて計算する
+
+        Args:
+            fids(iterable): 対象の地物ID（Noneの場合は集計ポリゴンレイヤの全地物）
+            feedback(QgsProcessingFeedback): 進捗の通知先（省略可）
+            sources(tuple): バックグラウンドで計算する場合の（集計ポリゴン, 建物ポイント, 仮置場ポイント）の
+                            読み込み元（LayerSnapshot）。省略時はレイヤから直接読み込む
+            wait(bool): ほかのスレッドで計算中の地物の完了を待つ場合はTrue
+                        （メインスレッドからはFalseとし、計算中の地物は計算しない）
+
+        Returns:
+            None
+        """
+        aggregate_layer, building_layer, tmp_storage_layer = sources or self.layers()
+
+        # ファイルが外部で更新されていた場合や、シナリオのフィールドが変わった場合は作り直す
+        source_versions = self._source_versions(sources)
+        scenarios = engine.building_scenarios(building_layer)
+        if fids is None:
+            fids = aggregate_layer.allFeatureIds()
+        fids = set(fids)
+
+        with self._lock:
+            if source_versions != self.source_versions or scenarios != self.scenarios:
+                self._invalidate()
+                self.source_versions = source_versions
+                self.scenarios = scenarios
+            # ほかのスレッドで計算中の地物は、その計算の完了を待つ（wait=Falseの場合は待たない）
+            waiting = fids & self.pending if wait else set()
+            missing = fids - self.computed - self.pending
+            self.pending |= missing
+            generation = self.generation
+
+        try:
+            if missing:
+                scenario_sums, tmp_storage_sums = self._compute(
+                    missing, aggregate_layer, building_layer, tmp_storage_layer, scenarios, feedback)
+        finally:
+            with self._lock:
+                self.pending -= missing
+                self._lock.notify_all()
+
+        with self._lock:
+            # キャンセルされた場合や、計算中に集計値が破棄された場合は保存しない
+            if missing and not (feedback is not None and feedback.isCanceled()) and generation == self.generation:
+                for scenario, building_sums in scenario_sums.items():
+                    for fid, values in building_sums.items():
+                        self.building.setdefault(fid, {})[scenario] = values
+                self.tmp_storage.update(tmp_storage_sums)
+                self.computed |= missing
+            while waiting & self.pending:
+                self._lock.wait()
+
+    def _compute(self, fids, aggregate_layer, building_layer, tmp_storage_layer, scenarios, feedback):
+        """地物IDで指定した集計ポリゴンの集計値を計算する（排他制御の外で実行する）"""
+        step_feedback = QgsProcessingMultiStepFeedback(2, feedback) if feedback is not None else None
+        request = QgsFeatureRequest().setFilterFids(list(fids)).setNoAttributes()
+        locator = engine.PolygonLocator(aggregate_layer, key_field=None, request=request, repair=True)
+        # 全シナリオの集計値を建物ポイントの1回の走査で求める
+        scenario_sums = engine.aggregate_building_scenarios(building_layer, locator, scenarios, step_feedback)
+        if step_feedback is not None:
+            step_feedback.setCurrentStep(1)
+        tmp_storage_sums = engine.aggregate_tmp_storages(
+            tmp_storage_layer,
+            self.tmp_storage_name_fieldname,
+            self.tmp_storage_area_fieldname,
+            locator,
+            step_feedback
+        )
+        return scenario_sums, tmp_storage_sums
+
+    def pending_ids(self, fids):
+        """地物IDのうち、ほかのスレッドで集計値を計算中のものを返す"""
+        with self._lock:
+            return set(fids) & self.pending
+
+    def lookup_scenarios(self, fids, feedback=None, sources=None, wait=True):
+        """
+        地物IDで指定した集計ポリゴンの、全シナリオの集計値を返す
+
+        wait=Falseの場合、ほかのスレッドで計算中の地物の集計値は含まれない（pending_idsで確認する）。
+
+        Args:
+            fids(iterable): 対象の地物ID
+            feedback(QgsProcessingFeedback): 進捗の通知先（省略可）
+            sources(tuple): ensureと同じ
+            wait(bool): ensureと同じ
+
+        Returns:
+            scenario_sums(dict): シナリオ名 -> 地物IDをキーとした建物ポイントの集計値
+            tmp_storage_sums(dict): 地物IDをキーとした仮置場ポイントの集計値
+        """
+        fids = list(fids)
+        self.ensure(fids, feedback, sources, wait)
+        # 計算中に集計値が破棄された場合は計算し直す
+        with self._lock:
+            complete = self.computed.issuperset(fids)
+        if not complete and not (feedback is not None and feedback.isCanceled()):
+            self.ensure(fids, feedback, sources, wait)
+        with self._lock:
+            scenario_sums = {
+                scenario: {fid: self.building[fid][scenario] for fid in fids if fid in self.building}
+                for scenario in self.scenarios
+            }
+            tmp_storage_sums = {fid: self.tmp_storage[fid] for fid in fids if fid in self.tmp_storage}
+        return scenario_sums, tmp_storage_sums
+
+    def lookup(self, fids, feedback=None, sources=None, wait=True):
+        """
+        地物IDで指定した集計ポリゴンの集計値を返す（先頭のシナリオのみ）
+
+        Args:
+            fids(iterable): 対象の地物ID
+            feedback(QgsProcessingFeedback): 進捗の通知先（省略可）
+            sources(tuple): ensureと同じ
+            wait(bool): ensureと同じ
+
+        Returns:
+            building_sums(dict): 地物IDをキーとした建物ポイントの集計値
+            tmp_storage_sums(dict): 地物IDをキーとした仮置場ポイントの集計値
+        """
+        scenario_sums, tmp_storage_sums = self.lookup_scenarios(fids, feedback, sources, wait)
+        return scenario_sums[self.scenarios[0]], tmp_storage_sums
+
+    def disconnect(self):
+        for signal in (
+                self.aggregate_layer.featureAdded,
+                self.aggregate_layer.featureDeleted,
+                self.aggregate_layer.geometryChanged,
+        ):
+            signal.disconnect(self.invalidate_feature)
+        self.building_layer.dataChanged.disconnect(self.invalidate)
+        self.tmp_storage_layer.dataChanged.disconnect(self.invalidate)
+
+
+def polygon_statistics(
+        aggregate_layer,
+        building_layer,
+        tmp_storage_layer,
+        tmp_storage_name_fieldname,
+        tmp_storage_area_fieldname,
+):
+    """
+    計算条件に対応する集計値テーブルを返す（なければ作成する）
+
+    Args:
+        aggregate_layer(QgsVectorLayer): 集計ポリゴン
+        building_layer(QgsVectorLayer): 建物ポイント
+        tmp_storage_layer(QgsVectorLayer): 仮置場ポイント
+        tmp_storage_name_fieldname(str): 仮置場名称のフィールド名
+        tmp_storage_area_fieldname(str): 概略有効面積のフィールド名
+
+    Returns:
+        PolygonStatistics
+    """
+    key = (
+        aggregate_layer.id(),
+        building_layer.id(),
+        tmp_storage_layer.id(),
+        tmp_storage_name_fieldname,
+        tmp_storage_area_fieldname,
+    )
+    if key not in _statistics_tables:
+        _statistics_tables[key] = PolygonStatistics(
+            aggregate_layer,
+            building_layer,
+            tmp_storage_layer,
+            tmp_storage_name_fieldname,
+            tmp_storage_area_fieldname,
+        )
+        # いずれかのレイヤが削除されたら集計値テーブルも破棄する
+        for layer in (aggregate_layer, building_layer, tmp_storage_layer):
+            layer.willBeDeleted.connect(lambda key=key: _discard(key))
+    return _statistics_tables[key]
+
+
+def _discard(key):
+    statistics = _statistics_tables.pop(key, None)
+    if statistics is not None:
+        try:
+            statistics.disconnect()
+        except (RuntimeError, TypeError):
+            pass
@@ -8,6 +8,99 @@ from qgis.gui import *
 from qgis.utils import iface
 import processing
 
+import sys
+
+
+def current_memory():
+    """
+    プロセスの現在のメモリ使用量（バイト）を返す
+
+    psutilがない場合は取得できないためNoneを返す。
+
+    Returns:
+        int: メモリ使用量（バイト）
+    """
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def max_memory():
+    """
+    プロセスの起動後のメモリ使用量の最大値（最大常駐セットサイズ、バイト）を返す
+
+    Unix系のみ取得でき、取得できない場合はNoneを返す。
+    起動後の最大値のため、処理ごとのメモリ使用量の計測には使用できない。
+
+    Returns:
+        int: メモリ使用量の最大値（バイト）
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOSはバイト、Linuxはキロバイト単位
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+class PeakMemory:
+    """
+    処理中のメモリ使用量の最大値を記録する
+
+    開始時の使用量を基準とし、sampleを呼び出した時点の使用量の最大値を記録する。
+    psutilがない場合は処理中の使用量を取得できないため、プロセスの起動後の最大値のみを出力する。
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.baseline = current_memory()
+        self.peak = self.baseline
+        self.peak_label = None
+
+    def sample(self, label):
+        """
+        現在のメモリ使用量を記録する
+
+        Args:
+            label(str): 処理段階の名称（最大値となった段階の表示に使用する）
+
+        Returns:
+            None
+        """
+        memory = current_memory()
+        if memory is not None and (self.peak is None or memory > self.peak):
+            self.peak = memory
+            self.peak_label = label
+
+    def report(self, feedback=None):
+        """
+        メモリ使用量の最大値をログ（とfeedback）に出力する
+
+        Returns:
+            str: 出力したメッセージ（取得できない場合はNone）
+        """
+        if self.baseline is not None and self.peak is not None:
+            message = (
+                f'{self.name}: ピークメモリ {self.peak / 1024 ** 2:,.1f}MB'
+                f'（開始時から +{(self.peak - self.baseline) / 1024 ** 2:,.1f}MB'
+                + (f'、{self.peak_label}' if self.peak_label else '') + '）'
+            )
+        else:
+            process_max = max_memory()
+            if process_max is None:
+                return None
+            message = (
+                f'{self.name}: プロセスの最大メモリ {process_max / 1024 ** 2:,.1f}MB'
+                '（処理ごとのメモリ使用量を出力するにはpsutilが必要です）'
+            )
+        QgsMessageLog.logMessage(message, 'DisasterWastePlugin', Qgis.Info)
+        if feedback is not None:
+            feedback.pushInfo(message)
+        return message
+
 
 def intersect(input_lyr: QgsVectorLayer, input_fields: list, overlay_lyr: QgsVectorLayer, overlay_fields: list):
     return processing.run("qgis:intersection",
@@ -0,0 +1,166 @@
+from collections import OrderedDict
+
+from qgis.core import *
+
+from . import cache, engine
+
+# 保持する集計結果の数の上限
+MAX_ENTRIES = 16
+# 保持する集計結果の推定メモリ使用量の上限（バイト）
+MAX_BYTES = 64 * 1024 * 1024
+# 属性1件あたりの推定メモリ使用量（バイト）
+ATTRIBUTE_BYTES = 16
+
+# レイヤID -> 地物の変更回数（dataChangedのたびに増やす）
+_data_versions = {}
+
+
+def _count_change(layer_id):
+    _data_versions[layer_id] = _data_versions.get(layer_id, 0) + 1
+
+
+def data_version(layer):
+    """
+    レイヤのデータの版を返す
+
+    集計の実行時に確認したファイルのデータソース（cache.source_signature）と、プラグインの起動後にレイヤで発生した
+    変更回数を組み合わせるため、メモリレイヤや未保存の編集があるレイヤでも、変更されると値が変わる。
+
+    Args:
+        layer(QgsVectorLayer): 対象レイヤ
+
+    Returns:
+        tuple: データの版
+    """
+    layer_id = layer.id()
+    if layer_id not in _data_versions:
+        _data_versions[layer_id] = 0
+        layer.dataChanged.connect(lambda layer_id=layer_id: _count_change(layer_id))
+        layer.willBeDeleted.connect(lambda layer_id=layer_id: _data_versions.pop(layer_id, None))
+    return (
+        layer_id,
+        cache.source_signature(layer, refresh=True),
+        _data_versions[layer_id],
+        tuple(layer.fields().names()),
+    )
+
+
+def result_key(
+        building_layer,
+        tmp_storage_layer,
+        tmp_storage_name_fieldname,
+        tmp_storage_area_fieldname,
+        aggregate_layer,
+        aggregate_name_field,
+        selected_ids,
+):
+    """
+    集計結果のキャッシュのキーを返す
+
+    選択した地物IDの集合、指定したフィールド、3つの入力レイヤのデータの版から作成する。
+
+    Returns:
+        tuple: キャッシュのキー
+    """
+    return (
+        frozenset(selected_ids),
+        aggregate_name_field,
+        tmp_storage_name_fieldname,
+        tmp_storage_area_fieldname,
+        data_version(aggregate_layer),
+        data_version(building_layer),
+        data_version(tmp_storage_layer),
+    )
+
+
+def _copy_layer(layer):
+    """集計結果レイヤを地物ごと複製する（シナリオのカスタムプロパティも引き継ぐ）"""
+    copied = layer.materialize(QgsFeatureRequest())
+    copied.setName(layer.name())
+    scenarios = layer.customProperty(engine.SCENARIOS_PROPERTY)
+    if scenarios:
+        copied.setCustomProperty(engine.SCENARIOS_PROPERTY, scenarios)
+    return copied
+
+
+def estimate_bytes(layer):
+    """集計結果レイヤの推定メモリ使用量（ジオメトリのWKBの大きさと属性数から求める）"""
+    size = 0
+    attribute_bytes = len(layer.fields()) * ATTRIBUTE_BYTES
+    for feature in layer.getFeatures():
+        size += attribute_bytes
+        if feature.hasGeometry():
+            size += len(feature.geometry().asWkb())
+    return size
+
+
+class ResultCache:
+    """
+    集計結果のLRUキャッシュ
+
+    集計結果レイヤの複製を保持し、取り出す際も複製を返すため、プロジェクトに追加した
+    集計結果レイヤが削除・編集されてもキャッシュには影響しない。
+    件数または推定メモリ使用量が上限を超えた場合は、最も長く使われていない結果から破棄する。
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # キー -> (集計結果レイヤ, 推定メモリ使用量)（古い順）
+        self._entries = OrderedDict()
+        self.total_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        キーに対応する集計結果レイヤの複製を返す
+
+        Args:
+            key(tuple): result_keyの戻り値
+
+        Returns:
+            QgsVectorLayer: 集計結果レイヤ（キャッシュにない場合はNone）
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return _copy_layer(entry[0])
+
+    def put(self, key, aggregated_layer):
+        """
+        集計結果レイヤの複製をキャッシュに追加する
+
+        1件で上限を超える集計結果は保持しない。
+
+        Args:
+            key(tuple): result_keyの戻り値
+            aggregated_layer(QgsVectorLayer): 集計結果レイヤ
+
+        Returns:
+            None
+        """
+        self.discard(key)
+        size = estimate_bytes(aggregated_layer)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (_copy_layer(aggregated_layer), size)
+        self.total_bytes += size
+        while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+
+    def discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+
+    def clear(self):
+        self._entries.clear()
+        self.total_bytes = 0
+
+
+# プラグイン全体で共有する集計結果のキャッシュ
+results = ResultCache()
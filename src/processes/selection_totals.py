@@ -0,0 +1,115 @@
+from qgis.core import *
+
+from . import engine, polygon_stats
+
+
+class SelectionTotals:
+    """
+    選択中の集計ポリゴンの合計値を差分で更新する
+
+    選択に追加・解除されたポリゴンの分だけ合計値を加減算する。
+    ポリゴンごとの集計値は集計値テーブル（PolygonStatistics）から取得するため、
+    一度集計したポリゴンは再度選択されても建物ポイントを読み直さない。
+    """
+
+    REQUIRED_AREA = engine.measure_index('仮置場必要面積')
+    DISASTER_WASTES = engine.measure_index('災害廃棄物の発生量（合計）')
+
+    def __init__(
+            self,
+            aggregate_layer,
+            building_layer,
+            tmp_storage_layer,
+            tmp_storage_name_fieldname,
+            tmp_storage_area_fieldname,
+    ):
+        self.aggregate_layer = aggregate_layer
+        self.building_layer = building_layer
+        self.tmp_storage_layer = tmp_storage_layer
+        self.tmp_storage_name_fieldname = tmp_storage_name_fieldname
+        self.tmp_storage_area_fieldname = tmp_storage_area_fieldname
+        self.statistics = None
+        if (
+            building_layer is not None
+            and tmp_storage_layer is not None
+            and tmp_storage_area_fieldname
+            and engine.has_building_fields(building_layer)
+        ):
+            self.statistics = polygon_stats.polygon_statistics(
+                aggregate_layer,
+                building_layer,
+                tmp_storage_layer,
+                tmp_storage_name_fieldname,
+                tmp_storage_area_fieldname,
+            )
+        # 合計値に加算済みの値（地物ID -> [仮置場必要面積, 災害廃棄物の発生量, 仮置場概略有効面積]）
+        self.contributions = {}
+        self.totals = [0, 0, 0]
+        # 集計処理で集計値を計算中のため、合計値に含めていない選択中の地物ID（次回のupdateで加算する）
+        self.pending = set()
+
+    def config(self):
+        """合計値の計算条件（条件が変わった場合は作り直す必要がある）"""
+        return (
+            self.aggregate_layer,
+            self.building_layer,
+            self.tmp_storage_layer,
+            self.tmp_storage_name_fieldname,
+            self.tmp_storage_area_fieldname,
+        )
+
+    def _contributions(self, fids):
+        """
+        地物IDで指定した集計ポリゴンの集計値を求める
+
+        メインスレッドから呼び出すため、集計処理で計算中の地物の完了は待たずに除外し、pendingに記録する。
+
+        Args:
+            fids(set): 集計ポリゴンの地物ID
+
+        Returns:
+            dict: 地物ID -> [仮置場必要面積, 災害廃棄物の発生量, 仮置場概略有効面積]
+        """
+        if self.statistics is None:
+            return {fid: [0, 0, 0] for fid in fids}
+
+        building_sums, tmp_storage_sums = self.statistics.lookup(fids, wait=False)
+        self.pending = self.statistics.pending_ids(fids)
+        contributions = {}
+        for fid in fids - self.pending:
+            building = building_sums.get(fid)
+            tmp_storage = tmp_storage_sums.get(fid)
+            contributions[fid] = [
+                building[self.REQUIRED_AREA] if building else 0,
+                building[self.DISASTER_WASTES] if building else 0,
+                tmp_storage[1] if tmp_storage else 0,
+            ]
+        return contributions
+
+    def update(self, selected_ids):
+        """
+        選択状態に合わせて合計値を更新する
+
+        Args:
+            selected_ids(iterable): 選択中の地物ID
+
+        Returns:
+            list: [仮置場必要面積, 災害廃棄物の発生量, 仮置場概略有効面積]の合計値
+        """
+        selected_ids = set(selected_ids)
+        added = selected_ids - self.contributions.keys()
+        removed = self.contributions.keys() - selected_ids
+
+        for fid in removed:
+            for i, value in enumerate(self.contributions.pop(fid)):
+                self.totals[i] -= value
+        for fid, values in self._contributions(added).items():
+            self.contributions[fid] = values
+            for i, value in enumerate(values):
+                self.totals[i] += value
+
+        self.pending &= selected_ids
+        # 加減算の誤差が残らないよう、選択がなくなったら0に戻す
+        if not selected_ids:
+            self.totals = [0, 0, 0]
+        return list(self.totals)
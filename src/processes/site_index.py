@@ -0,0 +1,340 @@
+import heapq
+
+from qgis.core import *
+
+from . import allocation, cache, engine
+
+# 集計ポリゴンごとに保持する近い仮置場の数
+NEAREST_COUNT = 5
+# 集計処理で集計値を計算中のため、余裕面積をまだ求められないことを表す値
+PENDING = object()
+
+# 作成済みの仮置場インデックス（計算条件 -> SiteIndex）
+_site_indexes = {}
+
+
+class KDTree:
+    """
+    2次元の点のkd木
+
+    点は作成時の添字で識別する。点の追加・削除はできないため、点が変わった場合は作り直す。
+    """
+
+    def __init__(self, points):
+        self.points = list(points)
+        # ノード: (点の添字, 分割軸, 左の部分木, 右の部分木)
+        self.root = self._build(list(range(len(self.points))), 0)
+
+    def _build(self, indexes, axis):
+        if not indexes:
+            return None
+        indexes.sort(key=lambda i: self.points[i][axis])
+        median = len(indexes) // 2
+        return (
+            indexes[median],
+            axis,
+            self._build(indexes[:median], 1 - axis),
+            self._build(indexes[median + 1:], 1 - axis),
+        )
+
+    def nearest(self, x, y, k=1):
+        """
+        座標に近い点をk件返す
+
+        Args:
+            x(float): X座標
+            y(float): Y座標
+            k(int): 返す点の数
+
+        Returns:
+            list: 距離の近い順の (距離, 点の添字) のリスト
+        """
+        # 見つかった点のうち遠いものから取り出せるよう、距離の2乗を負にして保持する
+        found = []
+
+        def search(node):
+            if node is None:
+                return
+            i, axis, left, right = node
+            px, py = self.points[i]
+            squared = (px - x) ** 2 + (py - y) ** 2
+            if len(found) < k:
+                heapq.heappush(found, (-squared, i))
+            elif squared < -found[0][0]:
+                heapq.heapreplace(found, (-squared, i))
+
+            delta = (x, y)[axis] - self.points[i][axis]
+            near, far = (left, right) if delta < 0 else (right, left)
+            search(near)
+            # 分割面までの距離よりも遠い点しか見つかっていない場合のみ反対側を探す
+            if len(found) < k or delta ** 2 < -found[0][0]:
+                search(far)
+
+        if k > 0:
+            search(self.root)
+        return sorted(((-squared) ** 0.5, i) for squared, i in found)
+
+
+class SiteIndex:
+    """
+    仮置場候補地ポイントのkd木と、集計ポリゴンごとの近い仮置場の一覧を保持する
+
+    仮置場の座標は集計ポリゴンの座標系で保持し、集計ポリゴンとの距離は代表点（重心）からの
+    直線距離とする。近い仮置場の一覧は集計ポリゴンごとに初回参照時に求めて保持するため、
+    選択範囲を変更しても再計算は追加されたポリゴンの分のみとなる。
+    仮置場ポイントが変更された場合はkd木から作り直し、集計ポリゴンの地物が変更された場合は
+    その地物の一覧を破棄する。
+    """
+
+    def __init__(
+            self,
+            aggregate_layer,
+            tmp_storage_layer,
+            tmp_storage_name_fieldname,
+            tmp_storage_area_fieldname,
+    ):
+        self.aggregate_layer = aggregate_layer
+        self.tmp_storage_layer = tmp_storage_layer
+        self.tmp_storage_name_fieldname = tmp_storage_name_fieldname
+        self.tmp_storage_area_fieldname = tmp_storage_area_fieldname
+        # (仮置場名称, 概略有効面積, 座標) のリスト（allocation.read_sites）
+        self.sites = None
+        self.tree = None
+        # 仮置場の添字 -> 仮置場を含む集計ポリゴンの地物ID（含むポリゴンがない場合はNone）
+        self.homes = None
+        # 地物ID -> 代表点から近い順の (距離, 仮置場の添字) のリスト
+        self.nearest_lists = {}
+        self.source_version = None
+
+        self.aggregate_layer.featureAdded.connect(self.invalidate_feature)
+        self.aggregate_layer.featureDeleted.connect(self.invalidate_feature)
+        self.aggregate_layer.geometryChanged.connect(self.invalidate_feature)
+        self.aggregate_layer.crsChanged.connect(self.invalidate)
+        self.tmp_storage_layer.dataChanged.connect(self.invalidate)
+
+    def invalidate_feature(self, fid, *args):
+        """集計ポリゴン1件の一覧と、仮置場を含む集計ポリゴンを破棄する"""
+        self.nearest_lists.pop(fid, None)
+        self.homes = None
+
+    def invalidate(self):
+        """kd木とすべての一覧を破棄する"""
+        self.sites = None
+        self.tree = None
+        self.homes = None
+        self.nearest_lists = {}
+
+    def ensure_tree(self):
+        """仮置場ポイントを読み込み、kd木を作成する（作成済みの場合は何もしない）"""
+        # ファイルが外部で更新されていた場合は作り直す
+        source_version = cache.source_signature(self.tmp_storage_layer)
+        if source_version != self.source_version:
+            self.invalidate()
+            self.source_version = source_version
+        if self.tree is not None:
+            return
+        self.sites = allocation.read_sites(
+            self.tmp_storage_layer,
+            self.tmp_storage_name_fieldname,
+            self.tmp_storage_area_fieldname,
+            self.aggregate_layer.crs(),
+        )
+        self.tree = KDTree((point.x(), point.y()) for _, _, point in self.sites)
+
+    def ensure_homes(self):
+        """仮置場ごとに、仮置場を含む集計ポリゴンを求める"""
+        self.ensure_tree()
+        if self.homes is not None:
+            return
+        homes = {}
+        for i, (_, _, point) in enumerate(self.sites):
+            homes[i] = None
+            point_geometry = QgsGeometry.fromPointXY(point)
+            request = QgsFeatureRequest().setFilterRect(point_geometry.boundingBox()).setNoAttributes()
+            for feature in self.aggregate_layer.getFeatures(request):
+                if feature.geometry().intersects(point_geometry):
+                    homes[i] = feature.id()
+                    break
+        self.homes = homes
+
+    def nearest_lists_for(self, fids):
+        """
+        地物IDで指定した集計ポリゴンの、近い仮置場の一覧を返す（未計算のポリゴンのみ計算する）
+
+        Returns:
+            dict: 地物ID -> 代表点から近い順の (距離, 仮置場の添字) のリスト
+        """
+        self.ensure_tree()
+        missing = [fid for fid in fids if fid not in self.nearest_lists]
+        if missing:
+            request = QgsFeatureRequest().setFilterFids(missing).setNoAttributes()
+            for feature in self.aggregate_layer.getFeatures(request):
+                geometry = feature.geometry()
+                if geometry.isEmpty():
+                    self.nearest_lists[feature.id()] = []
+                    continue
+                centroid = geometry.centroid().asPoint()
+                self.nearest_lists[feature.id()] = self.tree.nearest(centroid.x(), centroid.y(), NEAREST_COUNT)
+        return {fid: self.nearest_lists[fid] for fid in fids if fid in self.nearest_lists}
+
+    def spare_capacities(self, indexes, statistics=None):
+        """
+        仮置場の余裕面積（概略有効面積から、仮置場を含む集計ポリゴンの仮置場必要面積を除いた面積）を返す
+
+        同じ集計ポリゴンに仮置場が複数ある場合は、仮置場必要面積を概略有効面積の比で按分する。
+
+        Args:
+            indexes(iterable): 仮置場の添字
+            statistics(PolygonStatistics): 集計値テーブル（Noneの場合は余裕面積を求めない）
+
+        Returns:
+            dict: 仮置場の添字 -> 余裕面積（求められない場合はNone、集計処理で計算中の場合はPENDING）
+        """
+        indexes = list(indexes)
+        if statistics is None:
+            return {i: None for i in indexes}
+        self.ensure_homes()
+        home_fids = {self.homes[i] for i in indexes if self.homes[i] is not None}
+        # メインスレッドから呼び出すため、集計処理で計算中のポリゴンの完了は待たない
+        building_sums, _ = statistics.lookup(home_fids, wait=False)
+        pending = statistics.pending_ids(home_fids)
+
+        # 集計ポリゴンごとの仮置場の概略有効面積の合計
+        home_capacities = {}
+        for i, home in self.homes.items():
+            if home in home_fids:
+                home_capacities[home] = home_capacities.get(home, 0.0) + self.sites[i][1]
+
+        spares = {}
+        required_area_index = engine.measure_index('仮置場必要面積')
+        for i in indexes:
+            _, capacity, _ = self.sites[i]
+            home = self.homes[i]
+            if home in pending:
+                spares[i] = PENDING
+                continue
+            building = building_sums.get(home) if home is not None else None
+            if not building:
+                spares[i] = capacity
+                continue
+            share = capacity / home_capacities[home] if home_capacities[home] > 0 else 0.0
+            spares[i] = capacity - building[required_area_index] * share
+        return spares
+
+    def nearest_sites(self, fids, count=NEAREST_COUNT, statistics=None):
+        """
+        選択範囲（集計ポリゴンの集合）に近い仮置場を返す
+
+        各ポリゴンの近い仮置場の一覧を合わせたもののうち、いずれかのポリゴンの代表点からの
+        距離が近い順にcount件を返す（各一覧がcount件以上あれば、全仮置場から選んだ場合と一致する）。
+
+        Args:
+            fids(iterable): 選択中の集計ポリゴンの地物ID
+            count(int): 返す仮置場の数（NEAREST_COUNT以下）
+            statistics(PolygonStatistics): 余裕面積の計算に使用する集計値テーブル（省略可）
+
+        Returns:
+            list: 距離の近い順の (仮置場名称, 距離, 概略有効面積, 余裕面積, 選択範囲内か) のリスト
+        """
+        fids = list(fids)
+        distances = {}
+        for nearest in self.nearest_lists_for(fids).values():
+            for distance, i in nearest:
+                if distance < distances.get(i, float('inf')):
+                    distances[i] = distance
+        ranked = sorted((distance, i) for i, distance in distances.items())[:count]
+        if not ranked:
+            return []
+
+        self.ensure_homes()
+        spares = self.spare_capacities([i for _, i in ranked], statistics)
+        selected = set(fids)
+        return [
+            (
+                self.sites[i][0],
+                distance,
+                self.sites[i][1],
+                spares[i],
+                self.homes[i] in selected,
+            )
+            for distance, i in ranked
+        ]
+
+    def disconnect(self):
+        for signal in (
+                self.aggregate_layer.featureAdded,
+                self.aggregate_layer.featureDeleted,
+                self.aggregate_layer.geometryChanged,
+        ):
+            signal.disconnect(self.invalidate_feature)
+        self.aggregate_layer.crsChanged.disconnect(self.invalidate)
+        self.tmp_storage_layer.dataChanged.disconnect(self.invalidate)
+
+
+def site_index(
+        aggregate_layer,
+        tmp_storage_layer,
+        tmp_storage_name_fieldname,
+        tmp_storage_area_fieldname,
+):
+    """
+    計算条件に対応する仮置場インデックスを返す（なければ作成する）
+
+    Args:
+        aggregate_layer(QgsVectorLayer): 集計ポリゴン
+        tmp_storage_layer(QgsVectorLayer): 仮置場ポイント
+        tmp_storage_name_fieldname(str): 仮置場名称のフィールド名
+        tmp_storage_area_fieldname(str): 概略有効面積のフィールド名
+
+    Returns:
+        SiteIndex
+    """
+    key = (
+        aggregate_layer.id(),
+        tmp_storage_layer.id(),
+        tmp_storage_name_fieldname,
+        tmp_storage_area_fieldname,
+    )
+    if key not in _site_indexes:
+        _site_indexes[key] = SiteIndex(
+            aggregate_layer,
+            tmp_storage_layer,
+            tmp_storage_name_fieldname,
+            tmp_storage_area_fieldname,
+        )
+        # いずれかのレイヤが削除されたらインデックスも破棄する
+        for layer in (aggregate_layer, tmp_storage_layer):
+            layer.willBeDeleted.connect(lambda key=key: _discard(key))
+    return _site_indexes[key]
+
+
+def _discard(key):
+    index = _site_indexes.pop(key, None)
+    if index is not None:
+        try:
+            index.disconnect()
+        except (RuntimeError, TypeError):
+            pass
+
+
+def nearest_sites_text(nearest_sites):
+    """
+    近い仮置場の一覧の文字列を作成する
+
+    Args:
+        nearest_sites(list): SiteIndex.nearest_sitesの戻り値
+
+    Returns:
+        str: 近い仮置場の一覧の文字列
+    """
+    if not nearest_sites:
+        return ""
+    lines = ["＜近隣の仮置場候補地＞"]
+    for name, distance, capacity, spare, inside in nearest_sites:
+        if spare is PENDING:
+            spare_text = "計算中"
+        else:
+            spare_text = "-" if spare is None else f"{round(spare, 1):,}㎡"
+        location = "範囲内" if inside else f"{round(distance):,}m"
+        lines.append(f"{name or '（名称なし）'}（{location}）：有効面積 {round(capacity, 1):,}㎡、余裕 {spare_text}")
+    return "\n".join(lines)
@@ -0,0 +1,233 @@
+import math
+import os
+
+import numpy as np
+from qgis.core import *
+
+from . import cache
+
+INDEX_SUBDIR = 'spatial_index'
+# 1セルあたりの平均ポイント数の目安
+POINTS_PER_CELL = 64
+
+# セッション内で読み込んだインデックス（データソース -> PointIndex）
+_loaded_indexes = {}
+
+
+class PointIndex:
+    """
+    ポイントレイヤの格子型空間インデックス
+
+    地物ごとにバウンディングボックスの中心座標を保持し、セル番号順に並べて格納する。
+    中心座標からバウンディングボックスの端までの最大距離（radius）だけ検索範囲を広げることで、
+    ポイント以外のジオメトリでも候補の取りこぼしが起きないようにしている。
+    座標はレイヤの座標系のまま保持する。
+    """
+
+    def __init__(self, fids, xs, ys, cells, origin, cell_size, shape, radius, signature=''):
+        self.signature = signature
+        self.fids = fids
+        self.xs = xs
+        self.ys = ys
+        self.cells = cells
+        self.origin = origin
+        self.cell_size = cell_size
+        self.shape = shape
+        self.radius = radius
+
+    @classmethod
+    def build(cls, layer, signature=''):
+        """
+        レイヤの全地物を1回走査してインデックスを作成する
+
+        Args:
+            layer(QgsVectorLayer): ポイントレイヤ
+            signature(str): データソースの識別文字列
+
+        Returns:
+            PointIndex
+        """
+        request = QgsFeatureRequest().setNoAttributes()
+        fids = []
+        xs = []
+        ys = []
+        radius = 0.0
+        for feature in layer.getFeatures(request):
+            geometry = feature.geometry()
+            if geometry.isEmpty():
+                continue
+            bbox = geometry.boundingBox()
+            center = bbox.center()
+            fids.append(feature.id())
+            xs.append(center.x())
+            ys.append(center.y())
+            radius = max(radius, bbox.width() / 2, bbox.height() / 2)
+
+        index, _ = cls.from_points(fids, xs, ys, radius, signature)
+        return index
+
+    @classmethod
+    def from_points(cls, fids, xs, ys, radius=0.0, signature=''):
+        """
+        座標の配列からインデックスを作成する
+
+        Args:
+            fids(list): 地物ID
+            xs(list): X座標
+            ys(list): Y座標
+            radius(float): 中心座標からバウンディングボックスの端までの最大距離
+            signature(str): データソースの識別文字列
+
+        Returns:
+            index(PointIndex): インデックス
+            order(numpy.ndarray): 入力の並びからインデックスの並びへの並べ替え（入力側の位置）
+        """
+        fids = np.asarray(fids, dtype=np.int64)
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+
+        if len(fids) == 0:
+            origin = (0.0, 0.0)
+            cell_size = 1.0
+            shape = (1, 1)
+        else:
+            xmin, ymin = float(xs.min()), float(ys.min())
+            width = max(float(xs.max()) - xmin, 1.0)
+            height = max(float(ys.max()) - ymin, 1.0)
+            cell_count = max(len(fids) // POINTS_PER_CELL, 1)
+            cell_size = max(math.sqrt(width * height / cell_count), 1e-6)
+            origin = (xmin, ymin)
+            shape = (int(width // cell_size) + 1, int(height // cell_size) + 1)
+
+        index = cls(fids, xs, ys, None, origin, cell_size, shape, radius, signature)
+        cells = index._cell_ids(xs, ys)
+        order = np.argsort(cells, kind='stable')
+        index.fids = fids[order]
+        index.xs = xs[order]
+        index.ys = ys[order]
+        index.cells = cells[order]
+        return index, order
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data['fids'],
+                data['xs'],
+                data['ys'],
+                data['cells'],
+                tuple(data['origin']),
+                float(data['cell_size']),
+                tuple(int(v) for v in data['shape']),
+                float(data['radius']),
+                str(data['signature']),
+            )
+
+    def save(self, path):
+        # 書き込み途中のファイルを読み込まないよう、一時ファイルに保存してから置き換える
+        tmp_path = path + '.tmp.npz'
+        np.savez(
+            tmp_path,
+            fids=self.fids,
+            xs=self.xs,
+            ys=self.ys,
+            cells=self.cells,
+            origin=np.asarray(self.origin),
+            cell_size=np.asarray(self.cell_size),
+            shape=np.asarray(self.shape),
+            radius=np.asarray(self.radius),
+            signature=np.asarray(self.signature),
+        )
+        os.replace(tmp_path, path)
+
+    def _cell_ids(self, xs, ys):
+        nx, ny = self.shape
+        ix = np.clip(((xs - self.origin[0]) // self.cell_size).astype(np.int64), 0, nx - 1)
+        iy = np.clip(((ys - self.origin[1]) // self.cell_size).astype(np.int64), 0, ny - 1)
+        return iy * nx + ix
+
+    def query(self, rect):
+        """
+        矩形範囲内の候補地物の位置（格納順の添字）を返す
+
+        Args:
+            rect(QgsRectangle): 検索範囲（レイヤの座標系）
+
+        Returns:
+            numpy.ndarray: 候補地物の添字
+        """
+        xmin = rect.xMinimum() - self.radius
+        xmax = rect.xMaximum() + self.radius
+        ymin = rect.yMinimum() - self.radius
+        ymax = rect.yMaximum() + self.radius
+
+        nx, ny = self.shape
+        ix0, ix1 = [int(min(max((v - self.origin[0]) // self.cell_size, 0), nx - 1)) for v in (xmin, xmax)]
+        iy0, iy1 = [int(min(max((v - self.origin[1]) // self.cell_size, 0), ny - 1)) for v in (ymin, ymax)]
+
+        # 行ごとにセル番号が連続するため、二分探索で範囲を切り出す
+        starts = np.searchsorted(self.cells, np.arange(iy0, iy1 + 1) * nx + ix0, side='left')
+        ends = np.searchsorted(self.cells, np.arange(iy0, iy1 + 1) * nx + ix1, side='right')
+        if len(starts) == 0:
+            return np.empty(0, dtype=np.int64)
+        positions = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+
+        xs = self.xs[positions]
+        ys = self.ys[positions]
+        inside = (xs >= xmin) & (xs <= xmax) & (ys >= ymin) & (ys <= ymax)
+        return positions[inside]
+
+    def candidates(self, rects):
+        """
+        複数の矩形範囲のいずれかに含まれる候補地物のIDを返す
+
+        Args:
+            rects(list): 検索範囲（QgsRectangle, レイヤの座標系）のリスト
+
+        Returns:
+            list: 地物ID
+        """
+        if not rects:
+            return []
+        positions = np.unique(np.concatenate([self.query(rect) for rect in rects]))
+        return self.fids[positions].tolist()
+
+
+def point_index(layer):
+    """
+    レイヤの空間インデックスを返す
+
+    セッション内で読み込み済みであればそれを返し、なければキャッシュファイルから読み込む。
+    キャッシュファイルもない場合はインデックスを作成してキャッシュファイルに保存する。
+    データソースを識別できないレイヤ（メモリレイヤや編集中のレイヤ）はNoneを返す。
+
+    Args:
+        layer(QgsVectorLayer): ポイントレイヤ
+
+    Returns:
+        PointIndex
+    """
+    signature = cache.source_signature(layer)
+    if signature is None:
+        return None
+    loaded_index = _loaded_indexes.get(layer.source())
+    if loaded_index is not None and loaded_index.signature == signature:
+        return loaded_index
+
+    # キャッシュファイルはデータソースごとに1つとし、識別文字列が一致しない場合は作り直す
+    path = cache.cache_path(layer.source(), INDEX_SUBDIR, '.npz')
+    index = None
+    if os.path.exists(path):
+        try:
+            index = PointIndex.load(path)
+        except (OSError, KeyError, ValueError):
+            index = None
+    if index is None or index.signature != signature:
+        index = PointIndex.build(layer, signature)
+        try:
+            index.save(path)
+        except OSError as e:
+            QgsMessageLog.logMessage(f'空間インデックスを保存できませんでした: {e}', 'DisasterWastePlugin', Qgis.Warning)
+
+    _loaded_indexes[layer.source()] = index
+    return index
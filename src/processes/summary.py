@@ -0,0 +1,283 @@
+from PyQt5.QtCore import *
+from qgis.core import *
+
+from . import engine
+
+# 集計サマリーの数値項目（集計サマリーのフィールド名, 集計結果のフィールド名, 型, 精度）
+SUMMARY_MEASURES = [('範囲内面積', '面積', QVariant.Double, 1)] + [
+    (name, name, field_type, 1) for name, field_type, _ in engine.BUILDING_MEASURES
+]
+# シナリオごとに値が異なる集計サマリーの項目
+SCENARIO_MEASURES = [name for name, _, _ in engine.BUILDING_MEASURES]
+# シナリオの比較に表示する項目（集計サマリーのフィールド名, 単位）
+COMPARISON_MEASURES = [
+    ('建物被害想定（合計：全壊）', '棟'),
+    ('建物被害想定（合計：半壊）', '棟'),
+    ('建物被害想定（合計：焼失）', '棟'),
+    ('災害廃棄物の発生量（合計）', 't'),
+    ('仮置場必要面積', '㎡'),
+]
+
+
+def _value(value):
+    """NULLを0として返す"""
+    if value is None or value == NULL:
+        return 0
+    return value
+
+
+def summarize(aggregated_layer, aggregate_name_field, scenario=None):
+    """
+    集計結果レイヤの値を合計して集計サマリーを作成する
+
+    Args:
+        aggregated_layer(QgsVectorLayer): 集計レイヤ
+        aggregate_name_field(str): 集計ポリゴンの名称フィールド
+        scenario(str): シナリオ（省略時は先頭のシナリオ）
+
+    Returns:
+        dict: 集計サマリーのフィールド名をキーとした値
+    """
+    request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+    return summarize_features(
+        aggregated_layer.getFeatures(request),
+        aggregate_name_field,
+        engine.result_scenarios(aggregated_layer),
+        scenario
+    )
+
+
+def summarize_features(features, aggregate_name_field, scenarios, scenario=None):
+    """
+    集計結果の地物の値を合計して集計サマリーを作成する
+
+    Args:
+        features(iterable): 集計結果の地物
+        aggregate_name_field(str): 集計ポリゴンの名称フィールド
+        scenarios(list): 集計結果のシナリオ（engine.result_scenarios）
+        scenario(str): シナリオ（省略時は先頭のシナリオ）
+
+    Returns:
+        dict: 集計サマリーのフィールド名をキーとした値
+    """
+    if scenario is None:
+        scenario = scenarios[0]
+    sources = {
+        name: engine.scenario_measure_name(source, scenario, scenarios) if name in SCENARIO_MEASURES else source
+        for name, source, _, _ in SUMMARY_MEASURES
+    }
+
+    names = []
+    tmp_storage_names = []
+    totals = {name: 0 for name, _, _, _ in SUMMARY_MEASURES}
+    tmp_storage_area = 0
+
+    for feature in features:
+        names.append(str(_value(feature[aggregate_name_field]) or ''))
+        for name, source in sources.items():
+            totals[name] += _value(feature[source])
+        tmp_storage_name = _value(feature['仮置場名称'])
+        if tmp_storage_name:
+            tmp_storage_names.append(tmp_storage_name)
+        tmp_storage_area += _value(feature['仮置場概略有効面積'])
+
+    summary = {aggregate_name_field: '、'.join(names)}
+    summary.update(totals)
+    summary['仮置場名称'] = '、'.join(tmp_storage_names)
+    summary['仮置場概略有効面積'] = tmp_storage_area
+    return summary
+
+
+def summarize_scenarios(aggregated_layer, aggregate_name_field):
+    """
+    集計結果レイヤのシナリオごとに集計サマリーを作成する
+
+    Returns:
+        list: (シナリオ名, 集計サマリー) のリスト（集計結果レイヤのシナリオの順）
+    """
+    return [
+        (scenario, summarize(aggregated_layer, aggregate_name_field, scenario))
+        for scenario in engine.result_scenarios(aggregated_layer)
+    ]
+
+
+def feature_summaries(feature, aggregate_name_field, scenarios):
+    """
+    集計結果の地物1件の、シナリオごとの集計サマリーを作成する（割当て先ごとの出力用）
+
+    Returns:
+        list: (シナリオ名, 集計サマリー) のリスト
+    """
+    return [
+        (scenario, summarize_features([feature], aggregate_name_field, scenarios, scenario))
+        for scenario in scenarios
+    ]
+
+
+def summaries_text(summaries, aggregate_name_field):
+    """
+    summarize_scenariosの戻り値から集計サマリーの文字列を作成する
+
+    複数シナリオの場合は、シナリオの比較を先頭に表示し、その後に先頭のシナリオの集計サマリーを表示する。
+
+    Args:
+        summaries(list): (シナリオ名, 集計サマリー) のリスト
+        aggregate_name_field(str): 集計ポリゴンの名称フィールド
+
+    Returns:
+        str: 集計サマリーの文字列
+    """
+    scenario, summary = summaries[0]
+    text = summary_text(summary, aggregate_name_field)
+    if len(summaries) > 1:
+        text = (
+            scenario_comparison_text(summaries)
+            + f"\n\n（以下は「{engine.scenario_label(scenario)}」の集計サマリー）\n"
+            + text
+        )
+    return text
+
+
+def usage_percentage(summary):
+    """
+    仮置場の使用率を返す
+
+    Args:
+        summary(dict): 集計サマリー
+
+    Returns:
+        int | str: 使用率（計算できない場合は" - "）
+    """
+    if summary['仮置場必要面積'] == 0 or summary['仮置場概略有効面積'] == 0:
+        return " - "
+    return round(summary['仮置場必要面積'] / summary['仮置場概略有効面積'] * 100)
+
+
+def summary_text(summary, aggregate_name_field):
+    """
+    集計サマリーの文字列を作成する
+
+    Args:
+        summary(dict): 集計サマリー
+        aggregate_name_field(str): 集計ポリゴンの名称フィールド
+
+    Returns:
+        str: 集計サマリーの文字列
+    """
+    def count(name):
+        return "{:,}".format(summary[name])
+
+    def amount(name):
+        return "{:,}".format(round(summary[name], 1))
+
+    return f"""＜建物棟数＞
+合計：{count("建物棟数（合計）")}棟（木造：{count("建物棟数（木造）")}棟、非木造：{count("建物棟数（非木造）")}棟）
+
+＜範囲内面積＞
+{amount("範囲内面積")}㎡
+
+＜建物被害想定棟数＞
+全壊：{amount("建物被害想定（合計：全壊）")}棟（木造：{amount("建物被害想定（木造：全壊）")}棟、非木造：{amount("建物被害想定（非木造：全壊）")}棟）
+半壊：{amount("建物被害想定（合計：半壊）")}棟（木造：{amount("建物被害想定（木造：半壊）")}棟、非木造：{amount("建物被害想定（非木造：半壊）")}棟）
+焼失：{amount("建物被害想定（合計：焼失）")}棟（木棟：{amount("建物被害想定（木造：焼失）")}棟、非木造：{amount("建物被害想定（非木造：焼失）")}棟）
+
+＜災害廃棄物発生量＞
+合計： {amount("災害廃棄物の発生量（合計）")}t（可燃系：{amount("災害廃棄物の発生量（可燃系）")}t、不燃系：{amount("災害廃棄物の発生量（不燃系）")}t）
+
+＜仮置場必要面積＞
+{amount("仮置場必要面積")}㎡
+
+＜仮置場情報＞
+名称：{summary["仮置場名称"]}
+仮置場概略有効面積：{amount("仮置場概略有効面積")}㎡
+使用率：{usage_percentage(summary)}％
+
+＜集計ポリゴン名称＞
+{summary[aggregate_name_field]}"""
+
+
+def scenario_comparison_text(summaries):
+    """
+    シナリオごとの集計サマリーを並べて比較する文字列を作成する
+
+    Args:
+        summaries(list): summarize_scenariosの戻り値
+
+    Returns:
+        str: シナリオの比較の文字列
+    """
+    lines = ["＜シナリオ比較＞"]
+    for name, unit in COMPARISON_MEASURES:
+        values = "／".join(
+            f'{engine.scenario_label(scenario)} {"{:,}".format(round(summary[name], 1))}{unit}'
+            for scenario, summary in summaries
+        )
+        lines.append(f"{name}：{values}")
+    usages = "／".join(
+        f'{engine.scenario_label(scenario)} {usage_percentage(summary)}％' for scenario, summary in summaries
+    )
+    lines.append(f"仮置場の使用率：{usages}")
+    return "\n".join(lines)
+
+
+def summary_fields(aggregate_name_field):
+    """
+    集計サマリーレイヤのフィールドを返す
+
+    Args:
+        aggregate_name_field(str): 集計ポリゴンの名称フィールド
+
+    Returns:
+        QgsFields
+    """
+    fields = QgsFields()
+    fields.append(QgsField(aggregate_name_field, QVariant.String))
+    for name, _, field_type, precision in SUMMARY_MEASURES:
+        fields.append(QgsField(name, field_type, len=0, prec=precision))
+    fields.append(QgsField('仮置場名称', QVariant.String))
+    fields.append(QgsField('仮置場概略有効面積', QVariant.Double, len=0, prec=0))
+    return fields
+
+
+def create_summary_layer(summary, aggregate_name_field):
+    """
+    集計サマリーから1行の集計サマリーレイヤを作成する（CSV出力用）
+
+    Args:
+        summary(dict): 集計サマリー
+        aggregate_name_field(str): 集計ポリゴンの名称フィールド
+
+    Returns:
+        QgsVectorLayer: 集計サマリーレイヤ
+    """
+    return create_scenario_summary_layer([(None, summary)], aggregate_name_field)
+
+
+def create_scenario_summary_layer(summaries, aggregate_name_field):
+    """
+    シナリオごとの集計サマリーを1行ずつ並べた集計サマリーレイヤを作成する（CSV出力用）
+
+    シナリオが2つ以上の場合は、先頭に「シナリオ」フィールドを追加する。
+
+    Args:
+        summaries(list): summarize_scenariosの戻り値
+        aggregate_name_field(str): 集計ポリゴンの名称フィールド
+
+    Returns:
+        QgsVectorLayer: 集計サマリーレイヤ
+    """
+    fields = QgsFields()
+    if len(summaries) > 1:
+        fields.append(QgsField('シナリオ', QVariant.String))
+    for field in summary_fields(aggregate_name_field):
+        fields.append(field)
+
+    vlyr = QgsMemoryProviderUtils.createMemoryLayer('集計サマリー', fields, QgsWkbTypes.NoGeometry)
+    features = []
+    for scenario, summary in summaries:
+        feature = QgsFeature(fields)
+        values = dict(summary, シナリオ=engine.scenario_label(scenario))
+        feature.setAttributes([values[field.name()] for field in fields])
+        features.append(feature)
+    vlyr.dataProvider().addFeatures(features)
+    return vlyr
@@ -0,0 +1,177 @@
+from PyQt5.QtCore import *
+from qgis.core import *
+
+from . import aggregate, polygon_stats, processing
+
+
+class LayerSnapshot:
+    """
+    バックグラウンドスレッドから地物を読み込むためのレイヤのスナップショット
+
+    メインスレッドで作成し、レイヤの代わりに集計処理へ渡す。
+    地物はQgsVectorLayerFeatureSourceから読み込み、その他の情報は作成時の値を返す。
+    """
+
+    def __init__(self, layer):
+        self._feature_source = QgsVectorLayerFeatureSource(layer)
+        self._name = layer.name()
+        self._fields = layer.fields()
+        self._crs = layer.crs()
+        self._source = layer.source()
+        self._provider_type = layer.providerType()
+        self._is_modified = layer.isModified()
+        self._feature_count = layer.featureCount()
+        self._wkb_type = layer.wkbType()
+        self._feature_ids = None
+
+    def getFeatures(self, request=None):
+        return self._feature_source.getFeatures(request if request is not None else QgsFeatureRequest())
+
+    def allFeatureIds(self):
+        if self._feature_ids is None:
+            self._feature_ids = [
+                feature.id() for feature in self.getFeatures(QgsFeatureRequest().setNoAttributes().setFlags(
+                    QgsFeatureRequest.NoGeometry))
+            ]
+        return self._feature_ids
+
+    def name(self):
+        return self._name
+
+    def fields(self):
+        return self._fields
+
+    def crs(self):
+        return self._crs
+
+    def source(self):
+        return self._source
+
+    def providerType(self):
+        return self._provider_type
+
+    def isModified(self):
+        return self._is_modified
+
+    def featureCount(self):
+        return self._feature_count
+
+    def wkbType(self):
+        return self._wkb_type
+
+
+class AggregateTask(QgsTask):
+    """
+    集計処理をバックグラウンドで実行するタスク
+
+    集計ポリゴンのジオメトリ修復、建物ポイント・仮置場ポイントの集計、集計結果レイヤの作成を
+    バックグラウンドスレッドで行い、完了後にメインスレッドでon_finishedを呼び出す。
+    """
+
+    # 処理段階ごとの進捗の範囲（開始, 終了）
+    STAGES = {
+        'repair': (0, 10),
+        'aggregate': (10, 90),
+        'result': (90, 100),
+    }
+
+    def __init__(
+            self,
+            building_layer,
+            tmp_storage_layer,
+            tmp_storage_name_fieldname,
+            tmp_storage_area_fieldname,
+            aggregate_layer,
+            aggregate_name_field,
+            selected_ids,
+            on_finished,
+    ):
+        super().__init__('災害廃棄物集計', QgsTask.CanCancel)
+        self.aggregate_layer = aggregate_layer
+        self.aggregate_name_field = aggregate_name_field
+        self.tmp_storage_layer = tmp_storage_layer
+        self.tmp_storage_name_fieldname = tmp_storage_name_fieldname
+        self.tmp_storage_area_fieldname = tmp_storage_area_fieldname
+        self.building_layer = building_layer
+        self.selected_ids = list(selected_ids)
+        self.on_finished = on_finished
+        self.aggregated_layer = None
+        self.exception = None
+        self.memory = None
+
+        # レイヤのシグナルを受け取れるよう、集計値テーブルはメインスレッドで取得しておく
+        polygon_stats.polygon_statistics(
+            aggregate_layer,
+            building_layer,
+            tmp_storage_layer,
+            tmp_storage_name_fieldname,
+            tmp_storage_area_fieldname
+        )
+        self.sources = (
+            LayerSnapshot(aggregate_layer),
+            LayerSnapshot(building_layer),
+            LayerSnapshot(tmp_storage_layer),
+        )
+        self.feedback = QgsProcessingFeedback()
+        self.feedback.progressChanged.connect(lambda progress: self._set_stage_progress('aggregate', progress))
+
+    def _set_stage_progress(self, stage, progress):
+        start, end = self.STAGES[stage]
+        self.setProgress(start + (end - start) * progress / 100)
+
+    def cancel(self):
+        self.feedback.cancel()
+        super().cancel()
+
+    def run(self):
+        try:
+            # 処理段階ごとにメモリ使用量を記録し、完了時に最大値を出力する
+            self.memory = processing.PeakMemory('集計処理')
+            aggregate_source = self.sources[0]
+
+            # 集計ポリゴンのジオメトリ修復
+            self._set_stage_progress('repair', 0)
+            request = QgsFeatureRequest().setFilterFids(self.selected_ids)
+            aggregate_polygon = aggregate.create_aggregate_polygon(
+                aggregate_source.getFeatures(request),
+                aggregate_source.crs(),
+                self.aggregate_name_field
+            )
+            self.memory.sample('ジオメトリ修復')
+            if self.isCanceled():
+                return False
+
+            # 建物ポイント・仮置場ポイントの集計
+            self._set_stage_progress('aggregate', 0)
+            aggregated_layer = aggregate.compute_aggregate(
+                self.aggregate_layer,
+                aggregate_polygon,
+                self.aggregate_name_field,
+                self.tmp_storage_layer,
+                self.tmp_storage_name_fieldname,
+                self.tmp_storage_area_fieldname,
+                self.building_layer,
+                feedback=self.feedback,
+                sources=self.sources
+            )
+            self.memory.sample('建物ポイント・仮置場ポイントの集計')
+            if self.isCanceled():
+                return False
+
+            # 集計結果レイヤをメインスレッドで使えるようにする
+            self._set_stage_progress('result', 0)
+            aggregated_layer.moveToThread(QgsApplication.instance().thread())
+            self.aggregated_layer = aggregated_layer
+            self._set_stage_progress('result', 100)
+            return True
+        except Exception as e:
+            self.exception = e
+            return False
+
+    def finished(self, result):
+        if self.memory is not None:
+            self.memory.report()
+        if self.exception is not None:
+            QgsMessageLog.logMessage(f'集計処理でエラーが発生しました: {self.exception}', 'DisasterWastePlugin',
+                                     Qgis.Critical)
+        self.on_finished(self.aggregated_layer if result else None)
@@ -0,0 +1,114 @@
+from qgis.core import *
+
+from ..processes import aggregate, engine
+
+
+class AggregateAlgorithm(QgsProcessingAlgorithm):
+    """集計ポリゴンごとに災害廃棄物発生量・仮置場必要面積・仮置場概略有効面積を集計する"""
+
+    BUILDING = 'BUILDING'
+    TMP_STORAGE = 'TMP_STORAGE'
+    TMP_STORAGE_NAME_FIELD = 'TMP_STORAGE_NAME_FIELD'
+    TMP_STORAGE_AREA_FIELD = 'TMP_STORAGE_AREA_FIELD'
+    AGGREGATE = 'AGGREGATE'
+    AGGREGATE_NAME_FIELD = 'AGGREGATE_NAME_FIELD'
+    OUTPUT = 'OUTPUT'
+
+    def name(self):
+        return 'aggregate'
+
+    def displayName(self):
+        return '災害廃棄物集計'
+
+    def shortHelpString(self):
+        return ('集計ポリゴン（選択地物のみも指定可）ごとに建物ポイントと仮置場候補地ポイントを集計し、'
+                '「集計結果」と同じ形式のレイヤを出力します。')
+
+    def createInstance(self):
+        return AggregateAlgorithm()
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(QgsProcessingParameterVectorLayer(
+            self.BUILDING, '建物ポイント', [QgsProcessing.TypeVectorPoint]))
+        self.addParameter(QgsProcessingParameterVectorLayer(
+            self.TMP_STORAGE, '仮置場候補地ポイント', [QgsProcessing.TypeVectorPoint]))
+        self.addParameter(QgsProcessingParameterField(
+            self.TMP_STORAGE_NAME_FIELD, '仮置場候補地の名称フィールド',
+            parentLayerParameterName=self.TMP_STORAGE, type=QgsProcessingParameterField.String))
+        self.addParameter(QgsProcessingParameterField(
+            self.TMP_STORAGE_AREA_FIELD, '仮置場候補地の概略有効面積フィールド',
+            parentLayerParameterName=self.TMP_STORAGE, type=QgsProcessingParameterField.Numeric))
+        self.addParameter(QgsProcessingParameterFeatureSource(
+            self.AGGREGATE, '集計ポリゴン', [QgsProcessing.TypeVectorPolygon]))
+        self.addParameter(QgsProcessingParameterField(
+            self.AGGREGATE_NAME_FIELD, '集計ポリゴンの名称フィールド',
+            parentLayerParameterName=self.AGGREGATE, type=QgsProcessingParameterField.String))
+        self.addParameter(QgsProcessingParameterFeatureSink(
+            self.OUTPUT, '集計結果', QgsProcessing.TypeVectorPolygon))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        building_layer = self.parameterAsVectorLayer(parameters, self.BUILDING, context)
+        tmp_storage_layer = self.parameterAsVectorLayer(parameters, self.TMP_STORAGE, context)
+        tmp_storage_name_fieldname = self.parameterAsString(parameters, self.TMP_STORAGE_NAME_FIELD, context)
+        tmp_storage_area_fieldname = self.parameterAsString(parameters, self.TMP_STORAGE_AREA_FIELD, context)
+        aggregate_source = self.parameterAsSource(parameters, self.AGGREGATE, context)
+        aggregate_name_field = self.parameterAsString(parameters, self.AGGREGATE_NAME_FIELD, context)
+
+        if not engine.has_building_fields(building_layer):
+            raise QgsProcessingException(
+                f'建物ポイントに集計に必要なフィールド（{", ".join(engine.BUILDING_FIELDS)}）がありません。')
+        if not aggregate_source.sourceCrs().isValid() or aggregate_source.sourceCrs().isGeographic():
+            raise QgsProcessingException('集計ポリゴンの座標参照系が不正です。平面直角座標系に変換してください。')
+
+        multi_feedback = QgsProcessingMultiStepFeedback(3, feedback)
+
+        # 集計ポリゴンのジオメトリを修復して集計用の一時レイヤを作成
+        aggregate_polygon = aggregate.create_aggregate_polygon(
+            aggregate_source.getFeatures(),
+            aggregate_source.sourceCrs(),
+            aggregate_name_field
+        )
+        locator = engine.PolygonLocator(aggregate_polygon)
+
+        # 建物ポイントに複数シナリオのフィールドがある場合は、全シナリオを1回の走査で集計する
+        scenarios = engine.building_scenarios(building_layer)
+        feedback.pushInfo(f'建物ポイントを集計しています（シナリオ：{"、".join(map(engine.scenario_label, scenarios))}）')
+        scenario_sums = engine.aggregate_building_scenarios(building_layer, locator, scenarios, multi_feedback)
+        if feedback.isCanceled():
+            return {}
+
+        multi_feedback.setCurrentStep(1)
+        feedback.pushInfo('仮置場候補地ポイントを集計しています')
+        tmp_storage_sums = engine.aggregate_tmp_storages(
+            tmp_storage_layer,
+            tmp_storage_name_fieldname,
+            tmp_storage_area_fieldname,
+            locator,
+            multi_feedback
+        )
+        if feedback.isCanceled():
+            return {}
+
+        multi_feedback.setCurrentStep(2)
+        aggregated_layer = engine.create_result_layer(
+            aggregate_polygon,
+            aggregate_name_field,
+            scenario_sums[scenarios[0]],
+            tmp_storage_sums,
+            scenario_sums if len(scenarios) > 1 else None
+        )
+
+        sink, dest_id = self.parameterAsSink(
+            parameters,
+            self.OUTPUT,
+            context,
+            aggregated_layer.fields(),
+            aggregated_layer.wkbType(),
+            aggregated_layer.crs()
+        )
+        if sink is None:
+            raise QgsProcessingException(self.invalidSinkError(parameters, self.OUTPUT))
+        sink.addFeatures(aggregated_layer.getFeatures(), QgsFeatureSink.FastInsert)
+        multi_feedback.setProgress(100)
+
+        return {self.OUTPUT: dest_id}
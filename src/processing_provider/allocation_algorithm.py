@@ -0,0 +1,96 @@
+from qgis.core import *
+
+from ..processes import allocation, engine
+
+
+class AllocationAlgorithm(QgsProcessingAlgorithm):
+    """集計ポリゴンを仮置場の概略有効面積の制約のもとで仮置場に自動で割り当てる"""
+
+    BUILDING = 'BUILDING'
+    TMP_STORAGE = 'TMP_STORAGE'
+    TMP_STORAGE_NAME_FIELD = 'TMP_STORAGE_NAME_FIELD'
+    TMP_STORAGE_AREA_FIELD = 'TMP_STORAGE_AREA_FIELD'
+    AGGREGATE = 'AGGREGATE'
+    AGGREGATE_NAME_FIELD = 'AGGREGATE_NAME_FIELD'
+    OBJECTIVE = 'OBJECTIVE'
+    OUTPUT = 'OUTPUT'
+
+    OBJECTIVE_NAMES = ['距離を優先（最も近い仮置場に割り当てる）', '使用率を優先（使用率が最も低くなる仮置場に割り当てる）']
+
+    def name(self):
+        return 'allocate'
+
+    def displayName(self):
+        return '仮置場自動割当て'
+
+    def shortHelpString(self):
+        return ('集計ポリゴンの全地物を、仮置場の概略有効面積に収まるよう、仮置場のある集計ポリゴンから'
+                '近い順に隣接するポリゴンを割り当てます（各仮置場の割当ては連続したポリゴンのまとまりになります）。'
+                '容量が不足する場合は、隣接する仮置場のうち距離または使用率を優先して割り当てます。'
+                '仮置場ごとに割り当てたポリゴンを結合し、「集計結果」と同じ形式のレイヤを出力します。')
+
+    def createInstance(self):
+        return AllocationAlgorithm()
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(QgsProcessingParameterVectorLayer(
+            self.BUILDING, '建物ポイント', [QgsProcessing.TypeVectorPoint]))
+        self.addParameter(QgsProcessingParameterVectorLayer(
+            self.TMP_STORAGE, '仮置場候補地ポイント', [QgsProcessing.TypeVectorPoint]))
+        self.addParameter(QgsProcessingParameterField(
+            self.TMP_STORAGE_NAME_FIELD, '仮置場候補地の名称フィールド',
+            parentLayerParameterName=self.TMP_STORAGE, type=QgsProcessingParameterField.String))
+        self.addParameter(QgsProcessingParameterField(
+            self.TMP_STORAGE_AREA_FIELD, '仮置場候補地の概略有効面積フィールド',
+            parentLayerParameterName=self.TMP_STORAGE, type=QgsProcessingParameterField.Numeric))
+        self.addParameter(QgsProcessingParameterVectorLayer(
+            self.AGGREGATE, '集計ポリゴン', [QgsProcessing.TypeVectorPolygon]))
+        self.addParameter(QgsProcessingParameterField(
+            self.AGGREGATE_NAME_FIELD, '集計ポリゴンの名称フィールド',
+            parentLayerParameterName=self.AGGREGATE, type=QgsProcessingParameterField.String))
+        self.addParameter(QgsProcessingParameterEnum(
+            self.OBJECTIVE, '容量が不足する場合の割当て', self.OBJECTIVE_NAMES, defaultValue=0))
+        self.addParameter(QgsProcessingParameterFeatureSink(
+            self.OUTPUT, allocation.RESULT_LAYER_NAME, QgsProcessing.TypeVectorPolygon))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        building_layer = self.parameterAsVectorLayer(parameters, self.BUILDING, context)
+        tmp_storage_layer = self.parameterAsVectorLayer(parameters, self.TMP_STORAGE, context)
+        tmp_storage_name_fieldname = self.parameterAsString(parameters, self.TMP_STORAGE_NAME_FIELD, context)
+        tmp_storage_area_fieldname = self.parameterAsString(parameters, self.TMP_STORAGE_AREA_FIELD, context)
+        aggregate_layer = self.parameterAsVectorLayer(parameters, self.AGGREGATE, context)
+        aggregate_name_field = self.parameterAsString(parameters, self.AGGREGATE_NAME_FIELD, context)
+        objective = allocation.OBJECTIVES[self.parameterAsEnum(parameters, self.OBJECTIVE, context)]
+
+        if not engine.has_building_fields(building_layer):
+            raise QgsProcessingException(
+                f'建物ポイントに集計に必要なフィールド（{", ".join(engine.BUILDING_FIELDS)}）がありません。')
+        if not aggregate_layer.crs().isValid() or aggregate_layer.crs().isGeographic():
+            raise QgsProcessingException('集計ポリゴンの座標参照系が不正です。平面直角座標系に変換してください。')
+
+        allocation_layer = allocation.create_allocation_layer(
+            aggregate_layer,
+            aggregate_name_field,
+            building_layer,
+            tmp_storage_layer,
+            tmp_storage_name_fieldname,
+            tmp_storage_area_fieldname,
+            objective,
+            feedback
+        )
+        if allocation_layer is None or feedback.isCanceled():
+            return {}
+
+        sink, dest_id = self.parameterAsSink(
+            parameters,
+            self.OUTPUT,
+            context,
+            allocation_layer.fields(),
+            allocation_layer.wkbType(),
+            allocation_layer.crs()
+        )
+        if sink is None:
+            raise QgsProcessingException(self.invalidSinkError(parameters, self.OUTPUT))
+        sink.addFeatures(allocation_layer.getFeatures(), QgsFeatureSink.FastInsert)
+
+        return {self.OUTPUT: dest_id}
@@ -0,0 +1,126 @@
+from qgis.core import *
+
+from ..processes import building_points
+
+
+class BuildingPointsAlgorithm(QgsProcessingAlgorithm):
+    """3D都市モデルの建物と災害外力データから、集計に使用する建物ポイントを作成する"""
+
+    BUILDING = 'BUILDING'
+    ID_FIELD = 'ID_FIELD'
+    YEAR_FIELD = 'YEAR_FIELD'
+    STOREYS_FIELD = 'STOREYS_FIELD'
+    FLOOR_AREA_FIELD = 'FLOOR_AREA_FIELD'
+    STRUCTURE_FIELD = 'STRUCTURE_FIELD'
+    COEFFICIENTS = 'COEFFICIENTS'
+    OUTPUT = 'OUTPUT'
+
+    def name(self):
+        return 'buildingpoints'
+
+    def displayName(self):
+        return '建物ポイント作成'
+
+    def shortHelpString(self):
+        return ('3D都市モデルの建物（bldg.gdb等）に災害外力データ（地震動・液状化・急傾斜地・津波・火災）を'
+                '空間結合し、災害廃棄物発生量等算定シートと同じ計算で建物ごとの被害率・災害廃棄物発生量・'
+                '仮置場必要面積を求めて、集計に使用する建物ポイントを出力します。'
+                '算定シート（xlsx）を指定した場合は、算定条件をシートから読み込みます。')
+
+    def createInstance(self):
+        return BuildingPointsAlgorithm()
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(QgsProcessingParameterVectorLayer(
+            self.BUILDING, '3D都市モデルの建物', [QgsProcessing.TypeVector]))
+        for name, description, default in (
+                (self.ID_FIELD, '建物IDフィールド', building_points.BUILDING_ID_FIELD),
+                (self.YEAR_FIELD, '建築年フィールド', building_points.YEAR_FIELD),
+                (self.STOREYS_FIELD, '地上階数フィールド', building_points.STOREYS_FIELD),
+                (self.FLOOR_AREA_FIELD, '延床面積フィールド', building_points.FLOOR_AREA_FIELD),
+                (self.STRUCTURE_FIELD, '構造種別フィールド', building_points.STRUCTURE_FIELD),
+        ):
+            self.addParameter(QgsProcessingParameterField(
+                name, description, defaultValue=default, parentLayerParameterName=self.BUILDING))
+        for key, description, fieldname, _ in building_points.HAZARDS:
+            self.addParameter(QgsProcessingParameterVectorLayer(
+                key.upper(), description, [QgsProcessing.TypeVectorPolygon], optional=True))
+            self.addParameter(QgsProcessingParameterField(
+                key.upper() + '_FIELD', f'{description}のフィールド', defaultValue=fieldname,
+                parentLayerParameterName=key.upper(), optional=True))
+        self.addParameter(QgsProcessingParameterFile(
+            self.COEFFICIENTS, '災害廃棄物発生量等算定シート（算定条件）', extension='xlsx', optional=True))
+        self.addParameter(QgsProcessingParameterFeatureSink(
+            self.OUTPUT, '建物ポイント', QgsProcessing.TypeVectorPoint))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        building_layer = self.parameterAsVectorLayer(parameters, self.BUILDING, context)
+        coefficients_path = self.parameterAsFile(parameters, self.COEFFICIENTS, context)
+
+        coefficients = building_points.DEFAULT_COEFFICIENTS
+        if coefficients_path:
+            try:
+                coefficients = building_points.load_coefficients(coefficients_path)
+            except (OSError, KeyError, ValueError) as e:
+                raise QgsProcessingException(f'算定シートを読み込めませんでした: {e}')
+
+        hazard_layers = []
+        for key, description, _, default in building_points.HAZARDS:
+            layer = self.parameterAsVectorLayer(parameters, key.upper(), context)
+            if layer is None:
+                continue
+            fieldname = self.parameterAsString(parameters, key.upper() + '_FIELD', context)
+            if layer.fields().indexOf(fieldname) < 0:
+                raise QgsProcessingException(f'{description}のフィールドを指定してください。')
+            hazard_layers.append((key, description, layer, fieldname, default))
+
+        multi_feedback = QgsProcessingMultiStepFeedback(len(hazard_layers) + 2, feedback)
+
+        feedback.pushInfo('建物を読み込んでいます')
+        buildings = building_points.read_buildings(
+            building_layer,
+            self.parameterAsString(parameters, self.ID_FIELD, context),
+            self.parameterAsString(parameters, self.YEAR_FIELD, context),
+            self.parameterAsString(parameters, self.STOREYS_FIELD, context),
+            self.parameterAsString(parameters, self.FLOOR_AREA_FIELD, context),
+            self.parameterAsString(parameters, self.STRUCTURE_FIELD, context),
+            multi_feedback
+        )
+        if buildings is None or feedback.isCanceled():
+            return {}
+
+        hazards = {}
+        for step, (key, description, layer, fieldname, default) in enumerate(hazard_layers, start=1):
+            multi_feedback.setCurrentStep(step)
+            feedback.pushInfo(f'{description}を空間結合しています')
+            hazards[key] = building_points.join_hazard(
+                buildings, building_layer.crs(), layer, fieldname, default, multi_feedback)
+            if feedback.isCanceled():
+                return {}
+
+        multi_feedback.setCurrentStep(len(hazard_layers) + 1)
+        feedback.pushInfo('災害廃棄物発生量と仮置場必要面積を計算しています')
+        results = building_points.estimate(buildings, hazards, coefficients)
+
+        fields = building_points.output_fields()
+        sink, dest_id = self.parameterAsSink(
+            parameters,
+            self.OUTPUT,
+            context,
+            fields,
+            QgsWkbTypes.Point,
+            building_layer.crs()
+        )
+        if sink is None:
+            raise QgsProcessingException(self.invalidSinkError(parameters, self.OUTPUT))
+
+        total = len(buildings['ids'])
+        for current, feature in enumerate(building_points.building_point_features(buildings, results, fields)):
+            if current % 1000 == 0:
+                if feedback.isCanceled():
+                    return {}
+                multi_feedback.setProgress(current * 100.0 / total if total > 0 else 0)
+            sink.addFeature(feature, QgsFeatureSink.FastInsert)
+        multi_feedback.setProgress(100)
+
+        return {self.OUTPUT: dest_id}
@@ -0,0 +1,44 @@
+from qgis.core import *
+
+from ..processes import citygml
+
+
+class CityGmlAlgorithm(QgsProcessingAlgorithm):
+    """3D都市モデル（CityGML）の建物を読み込み、建物の属性と代表点をGeoPackageに出力する"""
+
+    INPUT = 'INPUT'
+    OUTPUT = 'OUTPUT'
+
+    def name(self):
+        return 'citygml'
+
+    def displayName(self):
+        return 'CityGML建物読込'
+
+    def shortHelpString(self):
+        return ('3D都市モデル（CityGML）のタイルを格納したフォルダ（またはファイル）から建物を読み込み、'
+                '建物ID・建築年・地上階数・延床面積・構造種別と代表点をGeoPackageに出力します。'
+                '出力は「建物ポイント作成」の入力に使用できます。')
+
+    def createInstance(self):
+        return CityGmlAlgorithm()
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(QgsProcessingParameterFile(
+            self.INPUT, 'CityGMLのフォルダ', behavior=QgsProcessingParameterFile.Folder))
+        self.addParameter(QgsProcessingParameterFileDestination(
+            self.OUTPUT, '建物（GeoPackage）', 'GeoPackage (*.gpkg)'))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        paths = citygml.citygml_files(self.parameterAsFile(parameters, self.INPUT, context))
+        output_path = self.parameterAsFileOutput(parameters, self.OUTPUT, context)
+        if not paths:
+            raise QgsProcessingException('CityGMLファイル（*.gml）がありません。')
+
+        feedback.pushInfo(f'{len(paths)}個のタイルを読み込んでいます')
+        count = citygml.ingest(paths, output_path, feedback)
+        if feedback.isCanceled():
+            return {}
+        feedback.pushInfo(f'{count}棟の建物を出力しました')
+
+        return {self.OUTPUT: output_path}
@@ -0,0 +1,29 @@
+from qgis.core import *
+
+from .aggregate_algorithm import AggregateAlgorithm
+from .allocation_algorithm import AllocationAlgorithm
+from .building_points_algorithm import BuildingPointsAlgorithm
+from .citygml_algorithm import CityGmlAlgorithm
+from .summary_algorithm import SummaryAlgorithm
+from .symbology_algorithm import SymbologyAlgorithm
+
+
+class DisasterWasteProvider(QgsProcessingProvider):
+    """災害廃棄物プラグインのProcessingプロバイダ"""
+
+    def loadAlgorithms(self):
+        self.addAlgorithm(AggregateAlgorithm())
+        self.addAlgorithm(AllocationAlgorithm())
+        self.addAlgorithm(BuildingPointsAlgorithm())
+        self.addAlgorithm(CityGmlAlgorithm())
+        self.addAlgorithm(SummaryAlgorithm())
+        self.addAlgorithm(SymbologyAlgorithm())
+
+    def id(self):
+        return 'disasterwaste'
+
+    def name(self):
+        return '災害廃棄物プラグイン'
+
+    def longName(self):
+        return self.name()
@@ -0,0 +1,54 @@
+from qgis.core import *
+
+from ..processes import summary
+
+
+class SummaryAlgorithm(QgsProcessingAlgorithm):
+    """集計結果レイヤから集計サマリーを作成する"""
+
+    INPUT = 'INPUT'
+    AGGREGATE_NAME_FIELD = 'AGGREGATE_NAME_FIELD'
+    OUTPUT = 'OUTPUT'
+    SUMMARY_TEXT = 'SUMMARY_TEXT'
+
+    def name(self):
+        return 'summary'
+
+    def displayName(self):
+        return '集計サマリー'
+
+    def shortHelpString(self):
+        return '「災害廃棄物集計」の集計結果レイヤを合計し、1行の集計サマリーテーブルとサマリーの文字列を出力します。'
+
+    def createInstance(self):
+        return SummaryAlgorithm()
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(QgsProcessingParameterFeatureSource(
+            self.INPUT, '集計結果', [QgsProcessing.TypeVectorPolygon]))
+        self.addParameter(QgsProcessingParameterField(
+            self.AGGREGATE_NAME_FIELD, '集計ポリゴンの名称フィールド',
+            parentLayerParameterName=self.INPUT, type=QgsProcessingParameterField.String))
+        self.addParameter(QgsProcessingParameterFeatureSink(
+            self.OUTPUT, '集計サマリー', QgsProcessing.TypeVector))
+        self.addOutput(QgsProcessingOutputString(self.SUMMARY_TEXT, '集計サマリーの文字列'))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        source = self.parameterAsSource(parameters, self.INPUT, context)
+        aggregate_name_field = self.parameterAsString(parameters, self.AGGREGATE_NAME_FIELD, context)
+
+        aggregated_summary = summary.summarize(source, aggregate_name_field)
+        fields = summary.summary_fields(aggregate_name_field)
+
+        sink, dest_id = self.parameterAsSink(
+            parameters, self.OUTPUT, context, fields, QgsWkbTypes.NoGeometry, QgsCoordinateReferenceSystem())
+        if sink is None:
+            raise QgsProcessingException(self.invalidSinkError(parameters, self.OUTPUT))
+        feature = QgsFeature(fields)
+        feature.setAttributes([aggregated_summary[field.name()] for field in fields])
+        sink.addFeature(feature, QgsFeatureSink.FastInsert)
+
+        aggregated_summary_text = summary.summary_text(aggregated_summary, aggregate_name_field)
+        feedback.pushInfo(aggregated_summary_text)
+
+        return {self.OUTPUT: dest_id, self.SUMMARY_TEXT: aggregated_summary_text}
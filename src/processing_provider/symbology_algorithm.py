@@ -0,0 +1,50 @@
+from qgis.core import *
+
+from ..processes import aggregate
+
+
+class SymbologyAlgorithm(QgsProcessingAlgorithm):
+    """集計結果レイヤを仮置場必要面積で色分けする"""
+
+    INPUT = 'INPUT'
+    SAVE_STYLE = 'SAVE_STYLE'
+    OUTPUT = 'OUTPUT'
+
+    def name(self):
+        return 'symbology'
+
+    def displayName(self):
+        return '集計結果の色分け'
+
+    def shortHelpString(self):
+        return ('集計結果レイヤに仮置場必要面積の段階区分のスタイルを設定します。'
+                '「既定のスタイルとして保存」を指定すると、データソースと同じ場所にスタイルファイルを保存します。')
+
+    def createInstance(self):
+        return SymbologyAlgorithm()
+
+    def flags(self):
+        # レイヤのレンダラを変更するため、メインスレッドで実行する
+        return super().flags() | QgsProcessingAlgorithm.FlagNoThreading
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(QgsProcessingParameterVectorLayer(
+            self.INPUT, '集計結果', [QgsProcessing.TypeVectorPolygon]))
+        self.addParameter(QgsProcessingParameterBoolean(
+            self.SAVE_STYLE, '既定のスタイルとして保存', defaultValue=False))
+        self.addOutput(QgsProcessingOutputVectorLayer(self.OUTPUT, '色分けした集計結果'))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        layer = self.parameterAsVectorLayer(parameters, self.INPUT, context)
+        if layer.fields().indexOf('仮置場必要面積') == -1:
+            raise QgsProcessingException('集計結果レイヤに「仮置場必要面積」フィールドがありません。')
+
+        aggregate.apply_symbology(layer)
+        layer.triggerRepaint()
+
+        if self.parameterAsBoolean(parameters, self.SAVE_STYLE, context):
+            message, saved = layer.saveDefaultStyle()
+            if not saved:
+                raise QgsProcessingException(f'スタイルを保存できませんでした: {message}')
+
+        return {self.OUTPUT: layer.id()}
@@ -0,0 +1,168 @@
+from PyQt5.QtCore import *
+from qgis.core import *
+
+
+class FeatureTableModel(QAbstractTableModel):
+    """
+    地物の属性をフィールドごとの列（リスト）で保持するテーブルモデル
+
+    QTableViewは表示中の行のみdataを問い合わせるため、行数が多くても描画コストは増えない。
+    行ごとに地物IDを保持し、行から地物を特定できるようにしている。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._fieldnames = []
+        self._columns = []
+        self._fids = []
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._fids)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._fieldnames)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self._fieldnames[section]
+        return section + 1
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        value = self._columns[index.column()][index.row()]
+        if role == Qt.DisplayRole:
+            # NULLの場合は空白とする
+            if value is None or value == NULL:
+                return None
+            return str(value)
+        if role == Qt.TextAlignmentRole:
+            # intとfloatの場合は右揃え
+            if isinstance(value, (int, float)):
+                return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def set_fieldnames(self, fieldnames):
+        """列（フィールド名）を設定し、行をすべて削除する"""
+        self.beginResetModel()
+        self._fieldnames = list(fieldnames)
+        self._columns = [[] for _ in self._fieldnames]
+        self._fids = []
+        self.endResetModel()
+
+    def set_features(self, fieldnames, features):
+        """
+        列を設定し、地物の属性で行を置き換える
+
+        Args:
+            fieldnames(list): 表示するフィールド名
+            features(iterable): 地物
+
+        Returns:
+            None
+        """
+        self.beginResetModel()
+        self._fieldnames = list(fieldnames)
+        self._columns = [[] for _ in self._fieldnames]
+        self._fids = []
+        for feature in features:
+            self._append(feature)
+        self.endResetModel()
+
+    def _append(self, feature):
+        self._fids.append(feature.id())
+        for column, fieldname in zip(self._columns, self._fieldnames):
+            column.append(feature.attribute(fieldname))
+
+    def add_features(self, features):
+        """
+        地物を末尾の行に追加する
+
+        Args:
+            features(list): 地物
+
+        Returns:
+            None
+        """
+        if not features:
+            return
+        row = len(self._fids)
+        self.beginInsertRows(QModelIndex(), row, row + len(features) - 1)
+        for feature in features:
+            self._append(feature)
+        self.endInsertRows()
+
+    def remove_fids(self, fids):
+        """
+        地物IDを指定して行を削除する
+
+        Args:
+            fids(set): 削除する地物ID
+
+        Returns:
+            None
+        """
+        rows = [row for row, fid in enumerate(self._fids) if fid in fids]
+        # 後ろの行から、連続する行をまとめて削除する
+        end = None
+        for i in range(len(rows) - 1, -1, -1):
+            if end is None:
+                end = rows[i]
+            if i > 0 and rows[i - 1] == rows[i] - 1:
+                continue
+            start = rows[i]
+            self.beginRemoveRows(QModelIndex(), start, end)
+            del self._fids[start:end + 1]
+            for column in self._columns:
+                del column[start:end + 1]
+            self.endRemoveRows()
+            end = None
+
+    def clear(self):
+        """行をすべて削除する"""
+        self.set_fieldnames(self._fieldnames)
+
+    def fid(self, row):
+        """行の地物IDを返す"""
+        return self._fids[row]
+
+    def fieldnames(self):
+        return list(self._fieldnames)
+
+    def fids(self):
+        return list(self._fids)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if not 0 <= column < len(self._columns):
+            return
+        values = self._columns[column]
+
+        def sort_key(row):
+            value = values[row]
+            # NULLは常に末尾に並べる
+            if value is None or value == NULL:
+                return (1, 0)
+            if isinstance(value, (int, float)):
+                return (0, value)
+            return (0, str(value))
+
+        rows = range(len(self._fids))
+        non_null = [row for row in rows if sort_key(row)[0] == 0]
+        null = [row for row in rows if sort_key(row)[0] == 1]
+        try:
+            non_null.sort(key=lambda row: sort_key(row)[1], reverse=order == Qt.DescendingOrder)
+        except TypeError:
+            # 数値と文字列が混在する場合は文字列として並べる
+            non_null.sort(key=lambda row: str(values[row]), reverse=order == Qt.DescendingOrder)
+        order_rows = non_null + null
+
+        self.layoutAboutToBeChanged.emit()
+        self._fids = [self._fids[row] for row in order_rows]
+        self._columns = [[column_values[row] for row in order_rows] for column_values in self._columns]
+        self.layoutChanged.emit()
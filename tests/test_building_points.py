@@ -0,0 +1,76 @@
+"""
+building_points.estimate を災害廃棄物発生量等算定シートの計算結果と比較する
+
+期待値は doc/worksheet_EstimatingDisasterWaste.xlsx の算定条件（既定値）のまま、
+「算定用データ貼り付け」シートに各建物を貼り付けたときの「集計」シートの値。
+"""
+import os
+import sys
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('qgis.core')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from processes import building_points  # noqa: E402
+
+WORKSHEET = os.path.join(ROOT, 'doc', 'worksheet_EstimatingDisasterWaste.xlsx')
+
+# 算定用データ貼り付けシートの入力
+# （建築年, 階数, 延べ床面積, 構造, 計測震度, 震度階コード, 液状化危険度, 崩壊危険度ランク, 浸水深, 焼失確率）
+BUILDINGS = [
+    (1975, 2, 120.0, 601, 6.2, 6, 2, 'A', 1.0, 0.1),
+    (1955, 1, 80.0, 601, 5.8, 5, 3, 'B', 2.5, 0.0),
+    (1990, 5, 1500.0, 610, 6.8, 6, 1, 'A', 0.8, 0.3),
+    (2000, 2, 200.0, 611, 6.5, 6, 2, 'A', 3.0, 0.2),
+]
+
+# 集計シートの値（All_Out, T_Area, Cdst_Dmg, Hdst_Dmg）
+EXPECTED = [
+    (80.06976969853835, 22.988339524900358, 0.2968495290487003, 1.5537945446397756),
+    (61.68580061890987, 18.045018866213415, 1.0516903522728147, 0.4668609879089486),
+    (1269.1247545594747, 366.6453808057259, 0.15167250457438122, 1.2508213302638707),
+    (0.0, 6.902453613566788, 0.030864, 0.1021696),
+]
+
+
+def _inputs():
+    columns = list(zip(*BUILDINGS))
+    buildings = {
+        'ids': [str(i) for i in range(len(BUILDINGS))],
+        'x': np.zeros(len(BUILDINGS)),
+        'y': np.zeros(len(BUILDINGS)),
+        'year': np.asarray(columns[0], dtype=np.float64),
+        'storeys': np.asarray(columns[1], dtype=np.float64),
+        'floor_area': np.asarray(columns[2], dtype=np.float64),
+        'structure': np.asarray(columns[3], dtype=np.int64),
+    }
+    hazards = {
+        'intensity': np.asarray(columns[4], dtype=np.float64),
+        'intensity_class': np.asarray(columns[5], dtype=np.float64),
+        'liquefaction': np.asarray(columns[6], dtype=np.float64),
+        'slope': np.asarray(columns[7], dtype=object),
+        'tsunami': np.asarray(columns[8], dtype=np.float64),
+        'fire': np.asarray(columns[9], dtype=np.float64),
+    }
+    return buildings, hazards
+
+
+def test_estimate_matches_worksheet():
+    buildings, hazards = _inputs()
+    results = building_points.estimate(buildings, hazards)
+    for i, (all_out, t_area, cdst_dmg, hdst_dmg) in enumerate(EXPECTED):
+        # 正規分布の累積分布関数は近似式のため、相対誤差1e-6まで許容する
+        assert results['All_Out'][i] == pytest.approx(all_out, rel=1e-6, abs=1e-9)
+        assert results['T_Area'][i] == pytest.approx(t_area, rel=1e-6)
+        assert results['Cdst_Dmg'][i] == pytest.approx(cdst_dmg, rel=1e-6)
+        assert results['Hdst_Dmg'][i] == pytest.approx(hdst_dmg, rel=1e-6)
+
+
+def test_load_coefficients_reads_worksheet_defaults():
+    coefficients = building_points.load_coefficients(WORKSHEET)
+    for name, values in building_points.DEFAULT_COEFFICIENTS.items():
+        assert coefficients[name] == pytest.approx(values), name